@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+# Optional per-site activity stage.
+# Fetches the site_url documents listed in all-site-status.xml and keeps recent activity values
+# in fixed-size NumPy ring buffers, one per site. Requires numpy.
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import requests
+from app.aurorawatchuk import ACCEPT_ENCODING, AWUK_HEADERS, parse_xml, read_body
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SCRIPT_VERSION = "activity 1.0.0"
+
+# One day of samples at the AWUK cadence of one value per minute.
+DEFAULT_CAPACITY = 1440
+
+
+def parse_site_activity(content):
+    # Parses a per-site activity document.
+    # Returns (times, values, thresholds) where times and values are NumPy arrays in document order
+    # and thresholds maps status_id to the lower threshold value for that status.
+    # Returns None if the content is not valid xml.
+    try:
+        root = parse_xml(content)
+    except Exception as e:
+        print(f"Exception occurred creating element tree from site activity: {e}")
+        return None
+    thresholds = {}
+    for t in root.iter("lower_threshold"):
+        try:
+            thresholds[t.get("status_id")] = float(t.text)
+        except (TypeError, ValueError):
+            continue
+    times = []
+    values = []
+    for a in root.iter("activity"):
+        try:
+            t = datetime.strptime(
+                a.findtext("datetime").strip(), "%Y-%m-%dT%H:%M:%S%z"
+            ).timestamp()
+            v = float(a.findtext("value"))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        times.append(t)
+        values.append(v)
+    return (
+        np.asarray(times, dtype=np.float64),
+        np.asarray(values, dtype=np.float64),
+        thresholds,
+    )
+
+
+class ActivityBuffer:
+    # Fixed-size ring buffer of (time, value) samples for one site.
+    # Memory use is constant, old samples are overwritten once the buffer is full.
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._head = 0  # Index the next sample will be written to.
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def last_time(self):
+        if self._count == 0:
+            return None
+        return self._times[(self._head - 1) % self.capacity]
+
+    def extend(self, times, values):
+        # Appends samples newer than the last stored sample. Returns the number appended.
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if self._count:
+            newer = times > self.last_time
+            times = times[newer]
+            values = values[newer]
+        n = len(times)
+        if n == 0:
+            return 0
+        if n > self.capacity:
+            times = times[-self.capacity :]
+            values = values[-self.capacity :]
+        m = len(times)
+        idx = (self._head + np.arange(m)) % self.capacity
+        self._times[idx] = times
+        self._values[idx] = values
+        self._head = (self._head + m) % self.capacity
+        self._count = min(self._count + m, self.capacity)
+        return m
+
+    def ordered(self):
+        # Returns (times, values) oldest first.
+        if self._count < self.capacity:
+            return self._times[: self._count], self._values[: self._count]
+        return (
+            np.concatenate((self._times[self._head :], self._times[: self._head])),
+            np.concatenate((self._values[self._head :], self._values[: self._head])),
+        )
+
+    def window(self, seconds):
+        # Returns (times, values) for samples within seconds of the latest sample.
+        times, values = self.ordered()
+        if len(times) == 0:
+            return times, values
+        start = np.searchsorted(times, times[-1] - seconds, side="left")
+        return times[start:], values[start:]
+
+    def rolling_mean(self, n):
+        # Returns the mean of each run of n consecutive samples.
+        values = self.ordered()[1]
+        if len(values) < n:
+            return np.empty(0)
+        c = np.cumsum(np.concatenate(([0.0], values)))
+        return (c[n:] - c[:-n]) / n
+
+    def rolling_max(self, n):
+        # Returns the maximum of each run of n consecutive samples.
+        values = self.ordered()[1]
+        if len(values) < n:
+            return np.empty(0)
+        return np.lib.stride_tricks.sliding_window_view(values, n).max(axis=1)
+
+    def rate_of_change(self):
+        # Returns the rate of change between consecutive samples, in units per hour.
+        times, values = self.ordered()
+        if len(times) < 2:
+            return np.empty(0)
+        return np.diff(values) / np.diff(times) * 3600
+
+    def summary(self, seconds=3600):
+        # Returns latest value, mean, max and least-squares slope (units per hour) over the window.
+        # Returns None if there are no samples.
+        times, values = self.window(seconds)
+        if len(values) == 0:
+            return None
+        slope = 0.0
+        if len(values) > 1 and times[-1] > times[0]:
+            slope = float(np.polyfit(times - times[-1], values, 1)[0] * 3600)
+        return {
+            "time": float(times[-1]),
+            "latest": float(values[-1]),
+            "mean": float(values.mean()),
+            "max": float(values.max()),
+            "slope": slope,
+        }
+
+
+class ActivityFeed:
+    # Fetches per-site activity documents concurrently and keeps a ring buffer per site.
+    # Conditional requests are used so unchanged documents cost a 304 rather than a full download.
+    # start_refresh() fetches in the background and apply() stores what it fetched, so a check
+    # never waits on slow sites. Buffers are only touched by the thread calling apply().
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, max_workers=8, timeout=10):
+        if np is None:
+            raise RuntimeError("numpy is required for site activity. Install with pip.")
+        self.capacity = capacity
+        self.timeout = timeout
+        self.buffers = {}
+        self.thresholds = {}
+        self._validators = {}  # site_url -> headers for the next conditional request.
+        self._session = requests.Session()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._background = ThreadPoolExecutor(max_workers=1)
+        self._pending = None  # Future of the background fetch, if any.
+
+    def _fetch(self, site_url):
+        # Returns document content, or None if unchanged or the fetch failed.
+        headers = {**AWUK_HEADERS, "Accept-Encoding": ACCEPT_ENCODING}
+        headers.update(self._validators.get(site_url, {}))
+        try:
+            response = self._session.get(
+                site_url, headers=headers, timeout=self.timeout, stream=True
+            )
+            try:
+                if response.status_code == 304:
+                    return None
+                if response.status_code != 200:
+                    print(f"Site activity {site_url} returned HTTP {response.status_code}.")
+                    return None
+                content = read_body(response, "activity")[0]
+            finally:
+                response.close()
+        except Exception as e:
+            print(f"Exception occurred fetching site activity {site_url}: {e}")
+            return None
+        validators = {}
+        if response.headers.get("ETag"):
+            validators["If-None-Match"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = response.headers["Last-Modified"]
+        self._validators[site_url] = validators
+        return content
+
+    def _fetch_all(self, status_ids):
+        # Returns [(site_id, parsed activity)] for every site that returned new activity.
+        sites = [s for s in status_ids or [] if s.get("site_url")]
+        contents = self._pool.map(lambda s: self._fetch(s["site_url"]), sites)
+        results = []
+        for site, content in zip(sites, contents):
+            if content is None:
+                continue
+            parsed = parse_site_activity(content)
+            if parsed is not None:
+                results.append((site["site_id"], parsed))
+        return results
+
+    def _store(self, results):
+        added = 0
+        for site_id, (times, values, thresholds) in results:
+            buffer = self.buffers.get(site_id)
+            if buffer is None:
+                buffer = self.buffers[site_id] = ActivityBuffer(self.capacity)
+            added += buffer.extend(times, values)
+            self.thresholds[site_id] = thresholds
+        return added
+
+    def refresh(self, status_ids):
+        # Fetches activity for every site in a get_status_ids() result, waiting for it.
+        # Returns the number of new samples stored.
+        return self._store(self._fetch_all(status_ids))
+
+    def start_refresh(self, status_ids):
+        # Starts fetching activity for every site in the background, unless the last fetch is still
+        # running or not yet applied. Returns True if started.
+        if self._pending is not None:
+            return False
+        self._pending = self._background.submit(self._fetch_all, status_ids)
+        return True
+
+    def apply(self):
+        # Stores the activity from a background fetch that has finished. Returns the number of new
+        # samples stored, 0 if none has finished.
+        if self._pending is None or not self._pending.done():
+            return 0
+        pending, self._pending = self._pending, None
+        try:
+            return self._store(pending.result())
+        except Exception as e:
+            print(f"Exception occurred refreshing site activity: {e}")
+            return 0
+
+    def summaries(self, seconds=3600):
+        # Returns {site_id: summary} for every site with samples.
+        result = {}
+        for site_id, buffer in self.buffers.items():
+            s = buffer.summary(seconds)
+            if s is not None:
+                result[site_id] = s
+        return result
+
+    def close(self):
+        self._background.shutdown(wait=False)
+        self._pool.shutdown(wait=False)
+        self._session.close()
+
+
+def format_summary(summary):
+    # Short human readable description of an ActivityBuffer.summary() for alert messages.
+    return f"Activity {summary['latest']:.0f} nT, hour max {summary['max']:.0f} nT, trend {summary['slope']:+.0f} nT/h."
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --site-activity option of app.aurorawatchuk_alerts, or import: from app.activity import ActivityFeed."
+    )
+
+
+if __name__ == "__main__":
+    main()
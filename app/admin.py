@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+# Local admin interface over a Unix socket.
+# One command per connection, a line each way, the reply is json {"ok": ..., "result" or "error": ...}:
+#   state          the alert state.
+#   sites          site list from the last parsed snapshot.
+#   stats          cache, pool and queue statistics and per-stage timings of the last cycle.
+#   check          wake the check loop for an immediate check.
+#   pause [secs]   stop sending alerts, until resumed or for secs seconds.
+#   resume         send alerts again.
+# Commands run on the server's threads and only read snapshots or set flags, so a slow client
+# never holds up the check loop. The socket is only accessible to the user running the service.
+# From a shell: python -m app.admin /path/to/admin.sock stats
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+
+SCRIPT_VERSION = "admin 1.0.0"
+
+# A client has this long to send its command.
+CLIENT_TIMEOUT = 5
+
+# Longest command line accepted.
+MAX_COMMAND = 1024
+
+
+class AdminHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.request.settimeout(CLIENT_TIMEOUT)
+        try:
+            line = self.rfile.readline(MAX_COMMAND)
+        except OSError:
+            return
+        words = line.decode(errors="replace").split()
+        if not words:
+            reply = {"ok": False, "error": "No command."}
+        elif words[0] not in self.server.commands:
+            reply = {
+                "ok": False,
+                "error": f"Unknown command {words[0]}. Commands: {', '.join(sorted(self.server.commands))}.",
+            }
+        else:
+            try:
+                reply = {"ok": True, "result": self.server.commands[words[0]](*words[1:])}
+            except (TypeError, ValueError) as e:
+                reply = {"ok": False, "error": str(e)}
+        try:
+            self.wfile.write(json.dumps(reply, default=str).encode() + b"\n")
+        except OSError:
+            pass
+
+
+class AdminServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, commands):
+        # commands is {name: callable}, called with the words after the name and returning
+        # something json serialisable. TypeError or ValueError from a command is sent as the error.
+        _remove_stale(path)
+        self.commands = commands
+        # Created owner only, no window where another user could connect.
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, AdminHandler)
+        finally:
+            os.umask(umask)
+        self.path = path
+
+    def start(self):
+        # Serves on a background thread.
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        print(f"Admin interface listening on {self.path}")
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale(path):
+    # Removes a socket left behind by an instance that has exited.
+    # Raises RuntimeError if an instance is still listening, ValueError if path is not a socket.
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(f"{path} exists and is not a socket.")
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(path)
+        return
+    raise RuntimeError(f"Another instance is listening on {path}.")
+
+
+def request(path, command, timeout=CLIENT_TIMEOUT):
+    # Sends command to the admin socket at path and returns the decoded reply.
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(command.encode() + b"\n")
+        with s.makefile("rb") as f:
+            return json.loads(f.readline())
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python -m app.admin SOCKET COMMAND [ARGS]")
+        print(
+            "Enable with the --admin-socket option of app.aurorawatchuk_alerts, or import: from app.admin import AdminServer."
+        )
+        return
+    reply = request(sys.argv[1], " ".join(sys.argv[2:]))
+    if reply["ok"]:
+        print(json.dumps(reply["result"], indent=2))
+    else:
+        print(reply["error"])
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+# Deduplicated, compressed archive of raw all-site-status.xml bodies, for audits and replay.
+# Each distinct body is stored once. Successive bodies differ by little more than the update time,
+# so each is compressed against the one stored before it as a preset dictionary, with zstd when
+# available and zlib otherwise, which takes a typical body down to a few tens of bytes. Every
+# KEYFRAME bodies one is compressed on its own, so reading any body decompresses at most KEYFRAME.
+# A time index records the runs of polls that saw each body, so an unchanged body polled all day
+# is one row.
+#
+# Export a time range as files: python -m app.archive ARCHIVE --start 2026-01-01 --export DIR
+
+import argparse
+from collections import OrderedDict
+from datetime import datetime, timezone
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+
+try:
+    from compression import zstd  # Python 3.14+.
+except ImportError:
+    zstd = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SCRIPT_VERSION = "archive 1.0.0"
+
+# A body compressed on its own every this many bodies.
+KEYFRAME = 64
+
+# Decompressed bodies kept in memory, enough for sequential reads to decompress each body once.
+CACHE_SIZE = 128
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bodies (
+    id INTEGER PRIMARY KEY,
+    hash INTEGER NOT NULL,
+    base INTEGER,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen (
+    first INTEGER PRIMARY KEY,
+    last INTEGER NOT NULL,
+    body INTEGER NOT NULL
+);
+"""
+
+
+def default_codec():
+    return "zstd" if zstd is not None or zstandard is not None else "zlib"
+
+
+def _short_hash(content):
+    # First 4 bytes of the sha256 as an integer, stored in 4 bytes rather than 32.
+    # Bodies are compared in full before one is treated as a duplicate, so a collision costs a
+    # comparison, never a lost body.
+    return int.from_bytes(hashlib.sha256(content).digest()[:4], "big", signed=True)
+
+
+def _compress(codec, data, base):
+    if codec == "zlib":
+        obj = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS, 9, zlib.Z_DEFAULT_STRATEGY, base or b"")
+        return obj.compress(data) + obj.flush()
+    if zstd is not None:
+        zstd_dict = zstd.ZstdDict(base, is_raw=True) if base else None
+        return zstd.compress(data, level=19, zstd_dict=zstd_dict)
+    dict_data = (
+        zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        if base
+        else None
+    )
+    return zstandard.ZstdCompressor(level=19, dict_data=dict_data).compress(data)
+
+
+def _decompress(codec, data, base):
+    if codec == "zlib":
+        obj = zlib.decompressobj(-zlib.MAX_WBITS, base or b"")
+        return obj.decompress(data) + obj.flush()
+    if zstd is not None:
+        zstd_dict = zstd.ZstdDict(base, is_raw=True) if base else None
+        return zstd.decompress(data, zstd_dict=zstd_dict)
+    dict_data = (
+        zstandard.ZstdCompressionDict(base, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        if base
+        else None
+    )
+    return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+
+
+class Archive:
+    def __init__(self, path, codec=None):
+        # Opens, creating if necessary, the archive at path. codec is "zstd" or "zlib" for a new
+        # archive, by default zstd when installed. An existing archive keeps its codec.
+        # Raises RuntimeError if the archive's codec isn't available.
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'codec'").fetchone()
+        self.codec = row[0] if row is not None else codec or default_codec()
+        if self.codec not in ("zstd", "zlib"):
+            raise RuntimeError(f"Archive codec {self.codec} not supported.")
+        if self.codec == "zstd" and zstd is None and zstandard is None:
+            raise RuntimeError("Archive is zstd compressed, install zstandard to use it.")
+        if row is None:
+            with self.conn:
+                self.conn.execute("INSERT INTO meta VALUES ('codec', ?)", (self.codec,))
+        # Short hash -> body ids, loaded once rather than indexed on disk.
+        self._hashes = {}
+        for body_id, short in self.conn.execute("SELECT id, hash FROM bodies"):
+            self._hashes.setdefault(short, []).append(body_id)
+        self._cache = OrderedDict()
+        last = self.conn.execute(
+            "SELECT first, body FROM seen ORDER BY first DESC LIMIT 1"
+        ).fetchone()
+        self._run = tuple(last) if last else None  # (first, body) of the latest run.
+        last = self.conn.execute(
+            "SELECT id, base FROM bodies ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        self._last_body = last[0] if last else None
+        # Bodies since the last keyframe.
+        self._since_keyframe = 0
+        for (base,) in self.conn.execute("SELECT base FROM bodies ORDER BY id DESC"):
+            if base is None:
+                break
+            self._since_keyframe += 1
+
+    def add(self, content, now=None):
+        # Records content as seen at now. Returns True if the body wasn't already stored.
+        now = int(time.time() if now is None else now)
+        short = _short_hash(content)
+        body_id = next(
+            (b for b in self._hashes.get(short, ()) if self.get(b) == content), None
+        )
+        new = body_id is None
+        with self.conn:
+            if new:
+                base = None
+                if self._last_body is not None and self._since_keyframe < KEYFRAME - 1:
+                    base = self._last_body
+                data = _compress(self.codec, content, self.get(base) if base else None)
+                body_id = self.conn.execute(
+                    "INSERT INTO bodies (hash, base, size, data) VALUES (?, ?, ?, ?)",
+                    (short, base, len(content), data),
+                ).lastrowid
+                self._hashes.setdefault(short, []).append(body_id)
+                self._remember(body_id, content)
+                self._last_body = body_id
+                self._since_keyframe = 0 if base is None else self._since_keyframe + 1
+            if self._run is not None and self._run[1] == body_id:
+                self.conn.execute(
+                    "UPDATE seen SET last = ? WHERE first = ?", (now, self._run[0])
+                )
+            else:
+                # Two polls in the same second keep the later body.
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO seen VALUES (?, ?, ?)", (now, now, body_id)
+                )
+                self._run = (now, body_id)
+        return new
+
+    def get(self, body_id):
+        # Returns the body with this id, decompressing back to the last keyframe or cached body.
+        if body_id in self._cache:
+            self._cache.move_to_end(body_id)
+            return self._cache[body_id]
+        chain = []
+        base = body_id
+        while base is not None and base not in self._cache:
+            base_of, data = self.conn.execute(
+                "SELECT base, data FROM bodies WHERE id = ?", (base,)
+            ).fetchone()
+            chain.append((base, data))
+            base = base_of
+        content = self._cache[base] if base is not None else None
+        for chain_id, data in reversed(chain):
+            content = _decompress(self.codec, data, content)
+            self._remember(chain_id, content)
+        return content
+
+    def _remember(self, body_id, content):
+        self._cache[body_id] = content
+        self._cache.move_to_end(body_id)
+        while len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def iter_range(self, start=None, end=None):
+        # Yields (first, last, content) for each run of polls that started in start <= time < end,
+        # in time order, led by the run in effect at start: the last to start at or before it, even
+        # if it was last seen before start. Bodies are decompressed as they are reached, not all up
+        # front.
+        if start is not None:
+            row = self.conn.execute(
+                "SELECT first FROM seen WHERE first <= ? ORDER BY first DESC LIMIT 1",
+                (start,),
+            ).fetchone()
+            if row is not None:
+                start = row[0]
+        query = "SELECT first, last, body FROM seen"
+        clauses = []
+        params = []
+        if start is not None:
+            clauses.append("first >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("first < ?")
+            params.append(end)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY first"
+        for first, last, body_id in self.conn.execute(query, params):
+            yield first, last, self.get(body_id)
+
+    def at(self, when):
+        # Returns the body seen at, or last seen before, time when. None if nothing was seen by then.
+        for first, last, content in self.iter_range(when, when + 1):
+            return content
+        return None
+
+    def stats(self):
+        bodies, raw, stored = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM bodies"
+        ).fetchone()
+        runs, polls_from, polls_to = self.conn.execute(
+            "SELECT COUNT(*), MIN(first), MAX(last) FROM seen"
+        ).fetchone()
+        pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "codec": self.codec,
+            "bodies": bodies,
+            "runs": runs,
+            "first": polls_from,
+            "last": polls_to,
+            "body_bytes": raw,
+            "stored_bytes": stored,
+            "file_bytes": pages * page_size,
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def _time(text):
+    # ISO 8601 date or time, UTC unless it says otherwise, as a unix time.
+    t = datetime.fromisoformat(text)
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return t.timestamp()
+
+
+def argparser():
+    parser = argparse.ArgumentParser(
+        description="Show statistics for, or export bodies from, an all-site-status.xml archive."
+    )
+    parser.add_argument("archive", help="Path to the archive")
+    parser.add_argument("--start", help="Start of the time range, ISO 8601, UTC by default", type=_time)
+    parser.add_argument("--end", help="End of the time range, ISO 8601, UTC by default", type=_time)
+    parser.add_argument(
+        "--export",
+        help="Write each body seen in the range to this directory, named by the time it was first seen",
+        default=None,
+    )
+    parser.add_argument("-v", "--version", action="version", version=SCRIPT_VERSION)
+    return parser.parse_args()
+
+
+def main():
+    args = argparser()
+    if not os.path.exists(args.archive):
+        raise ValueError(f"No archive at {args.archive}.")
+    archive = Archive(args.archive)
+    if args.export is None:
+        stats = archive.stats()
+        print(
+            f"{stats['bodies']} bodies in {stats['runs']} runs, {stats['body_bytes']} bytes stored as {stats['stored_bytes']} ({stats['codec']}), file {stats['file_bytes']} bytes."
+        )
+    else:
+        os.makedirs(args.export, exist_ok=True)
+        written = 0
+        for first, last, content in archive.iter_range(args.start, args.end):
+            with open(os.path.join(args.export, f"{first}.xml"), "wb") as f:
+                f.write(content)
+            written += 1
+        print(f"Exported {written} bodies to {args.export}.")
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
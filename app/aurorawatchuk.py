@@ -1,38 +1,267 @@
 #!/usr/bin/env python3
 
+from datetime import datetime
+import hashlib
+import threading
+import time
+import zlib
 import requests
 from lxml import etree
+from app.metrics import METRICS
+
+# Optional content codings, offered to AWUK when installed.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    from compression import zstd  # Python 3.14+.
+except ImportError:
+    zstd = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 SCRIPT_VERSION = "aurorawatchuk 1.0.0"
 
 AWUK_URL = "https://aurorawatch-api.lancs.ac.uk/0.2.5/status/all-site-status.xml"
 
+# AWUK request that referer is used to identify clients accessing their API.
+AWUK_HEADERS = {"referer": "https://github.com/cowgoesmoo69/aurorawatchuk_alerts"}
 
-def get_status_ids(reduced_sensitivity):
-    # Retrieves the all-site-status.xml file from AWUK and returns status_id values.
-    # If reduced_sensitivity is specified, return all sites, otherwise just return 'alerting site'.
-    # See AuroraWatch UK API docs for more info.
-    # Fetch xml file.
+# Names of statuses 0 to 3, as returned by process_status_ids(), for messages.
+STATUS_TEXT = ["GREEN", "YELLOW", "AMBER", "RED"]
+
+# Shared so status fetches reuse a pooled connection, see app.connections.Warmer.
+SESSION = requests.Session()
+
+# Bytes read from the network at a time.
+CHUNK_SIZE = 16384
+
+# Limits on what upstream can make us read and parse, whatever it sends.
+# all-site-status.xml is a few kB and a day of per-site activity well under 1 MB.
+MAX_BODY_SIZE = 2 * 1024 * 1024
+MAX_DEPTH = 16
+# Seconds allowed to read a whole body. The request timeout only bounds each read,
+# so a server trickling bytes could otherwise hold the check loop indefinitely.
+MAX_READ_TIME = 30
+
+METRICS.describe("fetch_requests_total", "counter", "Successful fetches from AWUK.")
+METRICS.describe("fetch_wire_bytes_total", "counter", "Response body bytes received from AWUK, as sent.")
+METRICS.describe("fetch_body_bytes_total", "counter", "Response body bytes after decompression.")
+METRICS.describe("fetch_last_wire_bytes", "gauge", "Body bytes received by the last fetch, as sent.")
+METRICS.describe("fetch_last_body_bytes", "gauge", "Body bytes of the last fetch after decompression.")
+
+
+class _Decoder:
+    # Incremental decoder with the same interface over each content coding.
+    # decompress(data, limit) returns at most limit bytes where the coding allows output to be capped,
+    # so a small compressed chunk can't expand into a huge buffer before the size check.
+
+    def __init__(self, decompress, flush=None, capped=False):
+        self._decompress = decompress
+        self._capped = capped
+        self.flush = flush or (lambda: b"")
+
+    def decompress(self, data, limit):
+        if self._capped:
+            return self._decompress(data, limit)
+        return self._decompress(data)
+
+
+class _DeflateDecoder:
+    # deflate should be zlib wrapped, but some servers send a raw deflate stream.
+
+    def __init__(self):
+        self._obj = zlib.decompressobj()
+        self._first = True
+
+    def decompress(self, data, limit):
+        if self._first and data:
+            self._first = False
+            try:
+                return self._obj.decompress(data, limit)
+            except zlib.error:
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._obj.decompress(data, limit)
+
+    def flush(self):
+        return self._obj.flush()
+
+
+def _decoder(encoding):
+    # Returns a decoder for a Content-Encoding value, or None if it isn't supported.
+    if encoding in ("", "identity"):
+        return _Decoder(lambda data: data)
+    if encoding in ("gzip", "x-gzip"):
+        obj = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        return _Decoder(obj.decompress, obj.flush, capped=True)
+    if encoding == "deflate":
+        return _DeflateDecoder()
+    if encoding == "br" and brotli is not None:
+        return _Decoder(brotli.Decompressor().process)
+    if encoding == "zstd":
+        if zstd is not None:
+            return _Decoder(zstd.ZstdDecompressor().decompress, capped=True)
+        if zstandard is not None:
+            obj = zstandard.ZstdDecompressor().decompressobj()
+            return _Decoder(obj.decompress, obj.flush)
+    return None
+
+
+def accept_encoding():
+    # Accept-Encoding header value listing every coding that can be decoded, most compact first.
+    encodings = []
+    if zstd is not None or zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings += ["gzip", "deflate"]
+    return ", ".join(encodings)
+
+
+ACCEPT_ENCODING = accept_encoding()
+
+
+def read_body(response, source, max_size=MAX_BODY_SIZE, max_time=MAX_READ_TIME):
+    # Reads a streamed requests response, decompressing it a chunk at a time as it arrives.
+    # Records compressed and decompressed byte counts in METRICS under source.
+    # Raises ValueError if the response uses a content coding that can't be decoded,
+    # or if the body is larger than max_size before or after decompression or takes longer than max_time.
+    encoding = response.headers.get("Content-Encoding", "identity").strip().lower()
+    decoder = _decoder(encoding)
+    if decoder is None:
+        raise ValueError(f"Unsupported Content-Encoding {encoding}.")
+    length = response.headers.get("Content-Length")
+    if length is not None and length.isdigit() and int(length) > max_size:
+        raise ValueError(f"Response of {length} bytes exceeds the {max_size} byte limit.")
+    wire = 0
+    size = 0
+    parts = []
+    deadline = time.monotonic() + max_time
+    for chunk in response.raw.stream(CHUNK_SIZE, decode_content=False):
+        if time.monotonic() > deadline:
+            raise ValueError(f"Response took longer than {max_time}s to read.")
+        wire += len(chunk)
+        # Ask for one byte more than is allowed, getting it means the limit is exceeded.
+        part = decoder.decompress(chunk, max_size - size + 1)
+        size += len(part)
+        if wire > max_size or size > max_size:
+            METRICS.incr("fetch_oversize_total", labels={"source": source})
+            raise ValueError(f"Response exceeds the {max_size} byte limit.")
+        parts.append(part)
+    part = decoder.flush()
+    if size + len(part) > max_size:
+        METRICS.incr("fetch_oversize_total", labels={"source": source})
+        raise ValueError(f"Response exceeds the {max_size} byte limit.")
+    parts.append(part)
+    content = b"".join(parts)
+    labels = {"source": source}
+    METRICS.incr("fetch_requests_total", labels=labels)
+    METRICS.incr("fetch_wire_bytes_total", wire, labels)
+    METRICS.incr("fetch_body_bytes_total", len(content), labels)
+    METRICS.set("fetch_last_wire_bytes", wire, labels)
+    METRICS.set("fetch_last_body_bytes", len(content), labels)
+    return content, wire, encoding
+
+
+def fetch_status_xml():
+    # Retrieves the all-site-status.xml file from AWUK and returns its content.
+    # Returns None if the request failed, including HTTP error responses.
+    # Compression is negotiated and the body decompressed as it is received.
     try:
-        response = requests.get(
+        response = SESSION.get(
             AWUK_URL,
-            # AWUK request that referer is used to identify clients accessing their API.
-            headers={"referer": "https://github.com/cowgoesmoo69/aurorawatchuk_alerts"},
+            headers={**AWUK_HEADERS, "Accept-Encoding": ACCEPT_ENCODING},
             timeout=10,
+            stream=True,
         )
+        try:
+            response.raise_for_status()
+            content, wire, encoding = read_body(response, "status")
+        finally:
+            response.close()
     except Exception as e:
         print(f"Exception occurred fetching AuroraWatch UK all-site-status.xml: {e}")
         return None
-    response.raise_for_status()
+    print(
+        f"Fetched all-site-status.xml: {len(content)} bytes, {wire} bytes received ({encoding})."
+    )
+    return content
+
+
+def get_status_ids(reduced_sensitivity, content=None):
+    # Retrieves the all-site-status.xml file from AWUK and returns status_id values.
+    # If reduced_sensitivity is specified, return all sites, otherwise just return 'alerting site'.
+    # If content is given it is used instead of fetching the file.
+    # See AuroraWatch UK API docs for more info.
+    # Fetch xml file.
+    if content is None:
+        content = fetch_status_xml()
+        if content is None:
+            return None
     # Process xml for status_id values.
+    root = parse_status_xml(content)
+    if root is None:
+        return None
+    return extract_status_ids(root, reduced_sensitivity)
+
+
+# One parser per thread, lxml parsers can be reused but not shared between threads.
+_parsers = threading.local()
+
+
+def xml_parser():
+    # Returns this thread's hardened parser: no entity expansion, no DTD loading, no network access,
+    # and libxml2's limits on text node size and nesting left in place.
+    parser = getattr(_parsers, "parser", None)
+    if parser is None:
+        parser = _parsers.parser = etree.XMLParser(
+            resolve_entities=False,
+            no_network=True,
+            huge_tree=False,
+            load_dtd=False,
+            dtd_validation=False,
+            collect_ids=False,
+            remove_pis=True,
+        )
+    return parser
+
+
+def parse_xml(content, max_size=MAX_BODY_SIZE, max_depth=MAX_DEPTH):
+    # Parses an upstream xml document with the hardened parser and returns its root element.
+    # Raises ValueError if the document is too large, too deeply nested or has a DTD,
+    # and etree.XMLSyntaxError if it is not valid xml.
+    if len(content) > max_size:
+        raise ValueError(f"Document exceeds the {max_size} byte limit.")
+    root = etree.fromstring(content, xml_parser())
+    if root.getroottree().docinfo.internalDTD is not None:
+        raise ValueError("Document type declarations are not allowed.")
+    # Depth first walk with an explicit stack, so the check itself can't recurse too deep.
+    stack = [(root, 1)]
+    while stack:
+        element, depth = stack.pop()
+        if depth > max_depth:
+            raise ValueError(f"Document nesting exceeds {max_depth} levels.")
+        stack.extend((child, depth + 1) for child in element)
+    return root
+
+
+def parse_status_xml(content):
+    # Creates an element tree from all-site-status.xml content.
+    # Returns None if the content is not valid xml.
     try:
-        root = etree.fromstring(response.content)
+        return parse_xml(content)
     except Exception as e:
-        # The response was not valid xml, return None
+        # The content was not valid xml, return None
         print(f"Exception occurred creating element tree from response: {e}")
         return None
 
-    status_ids = []
+
+def extract_status_ids(root, reduced_sensitivity):
+    # Extracts status_id values from an all-site-status.xml element tree.
+    # If reduced_sensitivity is specified, return all sites, otherwise just return 'alerting site'.
     if reduced_sensitivity:
         # Return all sites.
         sites = root.xpath("//site_status")
@@ -59,6 +288,69 @@ def get_status_ids(reduced_sensitivity):
         ]
 
 
+def get_updated(root):
+    # Returns the <updated><datetime> value of an all-site-status.xml element tree as a unix timestamp.
+    # Returns None if the element is missing or the datetime can't be parsed.
+    text = root.findtext("updated/datetime")
+    if text is None:
+        return None
+    try:
+        return datetime.strptime(text.strip(), "%Y-%m-%dT%H:%M:%S%z").timestamp()
+    except ValueError:
+        return None
+
+
+def snapshot_ranks(root):
+    # Returns (normal sensitivity status, reduced sensitivity status) for an element tree.
+    # Either may be None, exactly as get_status() would return for the same document.
+    ranks = []
+    for reduced_sensitivity in (False, True):
+        s_ids = extract_status_ids(root, reduced_sensitivity)
+        ranks.append(process_status_ids(s_ids) if s_ids else None)
+    return tuple(ranks)
+
+
+def parse_snapshot(content, digest=None):
+    # Parses all-site-status.xml content into a record of everything the document says.
+    # Returns a dict with hash, updated, status_normal, status_reduced and sites keys,
+    # sites being a list of dicts as returned by extract_status_ids() plus an 'alerting' flag.
+    # updated is None if the document has no valid <updated> element.
+    # Returns None if the content is not valid xml.
+    root = parse_status_xml(content)
+    if root is None:
+        return None
+    sites = extract_status_ids(root, True)
+    alerting = extract_status_ids(root, False)
+    alerting_id = alerting[0]["site_id"] if alerting else None
+    for site in sites:
+        site["alerting"] = site["site_id"] == alerting_id
+    status_normal, status_reduced = snapshot_ranks(root)
+    return {
+        "hash": digest or hashlib.sha256(content).hexdigest(),
+        "updated": get_updated(root),
+        "status_normal": status_normal,
+        "status_reduced": status_reduced,
+        "sites": sites,
+    }
+
+
+def snapshot_status_ids(record, reduced_sensitivity):
+    # Returns status_id values from a parse_snapshot() record, as get_status_ids() would for the same document.
+    sites = record["sites"]
+    if not reduced_sensitivity:
+        sites = [site for site in sites if site["alerting"]][:1]
+        if not sites:
+            return None
+    return [
+        {
+            "site_id": site["site_id"],
+            "site_url": site["site_url"],
+            "status_id": site["status_id"],
+        }
+        for site in sites
+    ]
+
+
 def process_status_ids(
     status_ids,
 ):
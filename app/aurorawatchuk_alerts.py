@@ -5,14 +5,65 @@
 # to test run `pytest -vv` from the root of the repo.
 
 import argparse
+from collections import deque
+from functools import partial
+import importlib.util
 import os
 import re
+import threading
 import time
-from app.aurorawatchuk import get_status
-from app.pushover import send_alert
+from app.activity import ActivityFeed, format_summary
+from app.admin import AdminServer
+from app.archive import Archive
+from app.aurorawatchuk import (
+    AWUK_URL,
+    SESSION as AWUK_SESSION,
+    STATUS_TEXT,
+    fetch_status_xml,
+    parse_snapshot,
+    process_status_ids,
+    snapshot_status_ids,
+)
+from app.breaker import CircuitBreaker, LastKnownGood
+from app.coalesce import Coalescer, apply_hysteresis
+from app.connections import DNSCache, Warmer, install
+from app.coordination import Coordinator, SQLiteLeaseBackend
+from app.metrics import METRICS, Stopwatch
+from app.proxy import StatusCache, start_proxy
+from app.pushover import PUSHOVER_URL, SESSION as PUSHOVER_SESSION
+from app.receipts import ReceiptTracker
+from app.notify import build_dispatcher
+from app.rules import Masks, SiteIndex, compile_rule
+from app.shards import ShardPool
+from app.sources import POLICIES, Aggregator, Source, kp_source
+from app.shared_cache import SharedFetchCache
+from app.stream import ChangeStream, change_events
+from app.subscribers import load_subscribers
+from app.templates import (
+    COMBINED_DEFAULT,
+    DEFAULT as DEFAULT_FIELDS,
+    LIMITS as MESSAGE_LIMITS,
+    compile_templates,
+    load_templates,
+)
+from app.trend import DEFAULT_WINDOW, activity_eta, should_warn, status_eta
 
 SCRIPT_VERSION = "aurorawatchuk_alerts 2.0.1"
 
+METRICS.describe(
+    "status_data_age_seconds",
+    "histogram",
+    "Age of the AWUK status, from its update time, each time it is checked.",
+)
+
+# Status alerts without --templates.
+DEFAULT_TEMPLATE = compile_templates({})["default"]
+
+# Emergency priority RED alerts are resent this often until acknowledged, and are tagged so
+# outstanding retries can be cancelled when status drops.
+EMERGENCY_RETRY = 60
+EMERGENCY_TAG = "aurorawatchuk_red"
+
 
 def argparser():
     parser = argparse.ArgumentParser(
@@ -22,30 +73,155 @@ def argparser():
         "threshold",
         help="Integer, sets the alert threshold: 1 = yellow; 2 = amber; 3 = red",
     )
+    parser.add_argument(
+        "--admin-socket",
+        help="Serve a local admin interface on this Unix socket, to inspect state and statistics, force a check or pause alerts. See app/admin.py. Default is off",
+        default=None,
+    )
     parser.add_argument(
         "-a",
         "--alert-interval",
         help="Sets a custom alert interval in seconds. Default is one hour",
         default=3600,
     )
+    parser.add_argument(
+        "--archive",
+        help="Keep every distinct status document fetched, compressed, in this SQLite file. See app/archive.py. Default is off",
+        default=None,
+    )
     parser.add_argument(
         "-c",
         "--check-interval",
         help="Sets a custom check interval in seconds. Default is five minutes",
         default=300,
     )
+    parser.add_argument(
+        "--coalesce-window",
+        help="Merge alerts within this many seconds of the last alert sent into one. The first alert of an event and a rise in status are never delayed. Default is off",
+        default=None,
+    )
+    parser.add_argument(
+        "--combine",
+        help=f"How to combine AuroraWatch UK status with --kp: {', '.join(POLICIES)}. See app/sources.py. Default is max",
+        default=None,
+    )
+    parser.add_argument(
+        "--digest-interval",
+        help="Send a low priority digest of the period every this many seconds, unless it was quiet. Default is off",
+        default=None,
+    )
+    parser.add_argument(
+        "--dns-ttl",
+        help="Cache DNS lookups in process for up to this many seconds, respecting record TTLs with dnspython installed. Default is off",
+        default=None,
+    )
+    parser.add_argument(
+        "-e",
+        "--stream-port",
+        help="Publish status change events to local clients as Server-Sent Events on this port. Default is off",
+        default=None,
+    )
+    parser.add_argument(
+        "--emergency",
+        help="Send RED alerts at Pushover emergency priority, repeated until acknowledged, and cancel them when status drops below RED",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-f",
+        "--shared-cache",
+        help="Share fetched status with other instances on this host through this file. Default is off",
+        default=None,
+    )
+    parser.add_argument(
+        "--hysteresis",
+        help="Number of consecutive readings needed before a change of status takes effect. A rise to threshold always takes effect at once. Default is 1",
+        default=None,
+    )
+    parser.add_argument(
+        "-i",
+        "--node-id",
+        help="Name of this node when using --lease. Default is the hostname",
+        default=None,
+    )
+    parser.add_argument(
+        "-k",
+        "--kp",
+        help="Also poll the NOAA planetary K index and combine it with AuroraWatch UK status",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-l",
+        "--lease",
+        help="Run active/standby with other nodes sharing this SQLite file, only the active node fetches and sends alerts. Default is off",
+        default=None,
+    )
+    parser.add_argument(
+        "-n",
+        "--notifiers",
+        help="Route alerts to recipients and backends (Pushover, webhook, SMTP, file) as set out in this json file. See app/notify.py for the format. Default is Pushover only",
+        default=None,
+    )
+    parser.add_argument(
+        "-o",
+        "--outage-alert",
+        help="Alert if AuroraWatch UK has been unreachable for this many seconds. Default is one hour",
+        default=None,
+    )
+    parser.add_argument(
+        "--prewarm",
+        help="Keep connections to AuroraWatch UK and Pushover open, refreshing them shortly before each check, so the first alert after a quiet spell is sent as quickly as any other",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-p",
+        "--proxy-port",
+        help="Serve the latest status to local clients over HTTP on this port. Default is off",
+        default=None,
+    )
     parser.add_argument(
         "-r",
         "--reduced-sensitivity",
         help="Only send alerts when status of all sites is above threshold",
         action="store_true",
     )
+    parser.add_argument(
+        "--rule",
+        help='Alert when this rule matches instead of comparing status with threshold, e.g. "at least 2 sites amber". See app/rules.py for the rule language',
+        default=None,
+    )
+    parser.add_argument(
+        "-s",
+        "--site-activity",
+        help="Fetch per-site activity and include it in alerts. Requires numpy",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--subscribers",
+        help="Also alert every subscriber in this json lines file, each with their own Pushover user key and settings. See app/subscribers.py for the format. Default is off",
+        default=None,
+    )
+    parser.add_argument(
+        "--templates",
+        help="Message templates for alerts, with title, url and sound, in this json file. See app/templates.py for the format. Default is the built in message",
+        default=None,
+    )
     parser.add_argument(
         "-t",
         "--ttl",
         help="Sets a custom alert ttl in seconds. Default is four hours.",
         default=14400,
     )
+    parser.add_argument(
+        "-w",
+        "--warning-horizon",
+        help="Send a low priority heads-up when status is projected to reach threshold within this many seconds. Default is off",
+        default=None,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of processes evaluating --subscribers. Default is one per CPU",
+        default=None,
+    )
     parser.add_argument("-v", "--version", action="version", version=SCRIPT_VERSION)
     return parser.parse_args()
 
@@ -120,13 +296,191 @@ def pre_checks(token, user, args):
     else:
         raise ValueError("TTL must be betwen 1 and 31536000.")
 
+    # Optional features. Only added to config when enabled.
+    # Rule.
+    if getattr(args, "rule", None) is not None:
+        try:
+            compile_rule(args.rule, SiteIndex())
+        except ValueError as e:
+            raise ValueError(f"Rule not valid. {e}")
+        config["rule"] = args.rule
+
+    # Emergency priority.
+    if getattr(args, "emergency", False):
+        config["emergency"] = True
+
+    # Kp source and combining policy.
+    if getattr(args, "kp", False):
+        config["kp"] = True
+    if getattr(args, "combine", None) is not None:
+        if not config.get("kp"):
+            raise ValueError("Combine requires a second source, e.g. --kp.")
+        if args.combine in POLICIES:
+            config["combine"] = args.combine
+        else:
+            raise ValueError(f"Combine must be one of: {', '.join(POLICIES)}.")
+
+    # Site activity.
+    if getattr(args, "site_activity", False):
+        if importlib.util.find_spec("numpy") is None:
+            raise RuntimeError("Site activity requires numpy. Install with pip.")
+        config["site_activity"] = True
+
+    # Proxy and stream ports.
+    for name, text in (("proxy_port", "Proxy port"), ("stream_port", "Stream port")):
+        if getattr(args, name, None) is not None:
+            try:
+                port = int(getattr(args, name))
+            except ValueError:
+                raise TypeError(f"{text} must be an integer.")
+            if port in range(1, (65535 + 1), 1):
+                config[name] = port
+            else:
+                raise ValueError(f"{text} must be between 1 and 65535.")
+
+    # Shared cache.
+    if getattr(args, "shared_cache", None) is not None:
+        directory = os.path.dirname(os.path.abspath(args.shared_cache))
+        if os.path.isdir(directory) and os.access(directory, os.W_OK):
+            config["shared_cache"] = args.shared_cache
+        else:
+            raise ValueError("Shared cache directory must exist and be writable.")
+
+    # Archive.
+    if getattr(args, "archive", None) is not None:
+        directory = os.path.dirname(os.path.abspath(args.archive))
+        if os.path.isdir(directory) and os.access(directory, os.W_OK):
+            config["archive"] = args.archive
+        else:
+            raise ValueError("Archive directory must exist and be writable.")
+
+    # Lease and node id.
+    if getattr(args, "lease", None) is not None:
+        directory = os.path.dirname(os.path.abspath(args.lease))
+        if os.path.isdir(directory) and os.access(directory, os.W_OK):
+            config["lease"] = args.lease
+        else:
+            raise ValueError("Lease directory must exist and be writable.")
+        if getattr(args, "node_id", None) is not None:
+            if re.fullmatch(r"[A-Za-z0-9_.-]{1,64}", args.node_id):
+                config["node_id"] = args.node_id
+            else:
+                raise ValueError(
+                    "Node id must be 1 to 64 characters, only letters, numbers, underscores, hyphens and dots."
+                )
+
+    # Hysteresis.
+    if getattr(args, "hysteresis", None) is not None:
+        try:
+            hysteresis = int(args.hysteresis)
+        except ValueError:
+            raise TypeError("Hysteresis must be an integer.")
+        if hysteresis in range(1, (10 + 1), 1):
+            config["hysteresis"] = hysteresis
+        else:
+            raise ValueError("Hysteresis must be between 1 and 10.")
+
+    # Coalesce window and digest interval.
+    for name, text in (
+        ("coalesce_window", "Coalesce window"),
+        ("digest_interval", "Digest interval"),
+    ):
+        if getattr(args, name, None) is not None:
+            try:
+                value = int(getattr(args, name))
+            except ValueError:
+                raise TypeError(f"{text} must be an integer.")
+            if value > 0:
+                config[name] = value
+            else:
+                raise ValueError(f"{text} must be > 0.")
+
+    # Warning horizon.
+    if getattr(args, "warning_horizon", None) is not None:
+        try:
+            warning_horizon = int(args.warning_horizon)
+        except ValueError:
+            raise TypeError("Warning horizon must be an integer.")
+        if warning_horizon > 0:
+            config["warning_horizon"] = warning_horizon
+        else:
+            raise ValueError("Warning horizon must be > 0.")
+
+    # Notifier routing.
+    if getattr(args, "notifiers", None) is not None:
+        # Building the dispatcher validates the file.
+        build_dispatcher(config["token"], config["user"], args.notifiers).close()
+        config["notifiers"] = args.notifiers
+
+    # Message templates.
+    templates = None
+    if getattr(args, "templates", None) is not None:
+        # Compiling validates the file.
+        templates = load_templates(args.templates)
+        config["templates"] = args.templates
+
+    # Subscribers and workers.
+    if getattr(args, "subscribers", None) is not None:
+        load_subscribers(args.subscribers, templates)
+        config["subscribers"] = args.subscribers
+        if getattr(args, "workers", None) is not None:
+            try:
+                workers = int(args.workers)
+            except ValueError:
+                raise TypeError("Workers must be an integer.")
+            if workers in range(1, (256 + 1), 1):
+                config["workers"] = workers
+            else:
+                raise ValueError("Workers must be between 1 and 256.")
+
+    # Admin socket.
+    if getattr(args, "admin_socket", None) is not None:
+        directory = os.path.dirname(os.path.abspath(args.admin_socket))
+        if not (os.path.isdir(directory) and os.access(directory, os.W_OK)):
+            raise ValueError("Admin socket directory must exist and be writable.")
+        # Limit of sun_path.
+        if len(os.fsencode(args.admin_socket)) > 107:
+            raise ValueError("Admin socket path must be no more than 107 bytes.")
+        config["admin_socket"] = args.admin_socket
+
+    # DNS cache.
+    if getattr(args, "dns_ttl", None) is not None:
+        try:
+            dns_ttl = int(args.dns_ttl)
+        except ValueError:
+            raise TypeError("DNS TTL must be an integer.")
+        if dns_ttl > 0:
+            config["dns_ttl"] = dns_ttl
+        else:
+            raise ValueError("DNS TTL must be > 0.")
+
+    # Connection pre-warming.
+    if getattr(args, "prewarm", False):
+        config["prewarm"] = True
+
+    # Outage alert.
+    if getattr(args, "outage_alert", None) is not None:
+        try:
+            outage_alert = int(args.outage_alert)
+        except ValueError:
+            raise TypeError("Outage alert must be an integer.")
+        if outage_alert > 0:
+            config["outage_alert"] = outage_alert
+        else:
+            raise ValueError("Outage alert must be > 0.")
+
     return config
 
 
 def should_alert(config, state, now=None):
     if state["current_status"] is None:
         return False
-    if state["current_status"] < config["threshold"]:
+    # With a rule, the rule decides whether the threshold has been met.
+    if "rule" in config:
+        below = not state.get("rule_match")
+    else:
+        below = state["current_status"] < config["threshold"]
+    if below:
         state.update(
             {
                 "last_alert_time": 0,
@@ -134,7 +488,7 @@ def should_alert(config, state, now=None):
             }
         )
         return False
-    # current_status >= threshold.
+    # current_status >= threshold, or rule matched.
     if now is None:
         now = time.time()
     if (
@@ -155,8 +509,136 @@ def load_env():
     return t, u
 
 
+def send_message(dispatcher, config, message, priority=None, published=None, **extra):
+    # Sends a message to every recipient. extra is any further Pushover parameters.
+    # published is the upstream update time of the status the message reports, for latency metrics.
+    dispatcher.send(
+        {"message": message, "ttl": config["ttl"], "priority": priority, **extra},
+        published,
+    )
+
+
+def send_status_alert(dispatcher, config, state, status, note="", template=None):
+    # Sends the alert for status. note is appended to the message.
+    # template is a compiled template from app.templates, by default the built in one.
+    fields = (template or DEFAULT_TEMPLATE)[status]
+    message = fields["message"] + note
+    extra = {k: v for k, v in fields.items() if k != "message"}
+    if state.get("sources"):
+        # Combined with other sources, name those giving this status.
+        names = [label for label, rank in state["sources"].items() if rank == status]
+        if names:
+            message += f" Status from {' and '.join(names)}."
+    if state.get("data_age"):
+        message += f" AuroraWatch UK is not responding, status is from {state['data_age'] / 60:.0f} minutes ago."
+    if state.get("activity"):
+        # Report the most active site.
+        busiest = max(state["activity"].values(), key=lambda a: a["max"])
+        message += " " + format_summary(busiest)
+    # Templates are checked against Pushover's limits, notes aren't.
+    message = message[: MESSAGE_LIMITS["message"]]
+    # Send RED alerts as high priority, or emergency priority resent until acknowledged
+    # or the next alert is due.
+    if status == 3 and config.get("emergency"):
+        send_message(
+            dispatcher,
+            config,
+            message,
+            2,
+            state.get("updated"),
+            retry=EMERGENCY_RETRY,
+            expire=min(10800, config["alert_interval"]),
+            tags=EMERGENCY_TAG,
+            **extra,
+        )
+    else:
+        send_message(
+            dispatcher,
+            config,
+            message,
+            1 if status == 3 else None,
+            state.get("updated"),
+            **extra,
+        )
+
+
+def admin_commands(
+    state,
+    latest,
+    wake,
+    watch,
+    dispatcher,
+    breaker,
+    tracker=None,
+    coalescer=None,
+    cache=None,
+    stream=None,
+):
+    # Commands for app.admin.AdminServer. latest holds the last parsed record and subscriber totals,
+    # updated by the loop. Everything returned is a copy or a plain value, read without locking the loop.
+
+    def paused():
+        # One read of paused_until, so paused and paused_until agree even if it changes meanwhile.
+        until = dispatcher.resumes_at()
+        return {
+            "paused": time.time() < until,
+            "paused_until": None if until == float("inf") else until,
+        }
+
+    def stats():
+        result = {
+            "stages": watch.last,
+            "breaker": {"state": breaker.state, "open_for": breaker.open_for()},
+            "send_queue": dispatcher.pending,
+            **paused(),
+            "metrics": METRICS.snapshot(),
+        }
+        if cache is not None:
+            result["proxy"] = {"expires": cache.expires}
+        if stream is not None:
+            result["stream"] = {"clients": len(stream.clients), "dropped": stream.dropped}
+        if coalescer is not None:
+            result["outbox"] = {
+                "held": len(coalescer.pending),
+                "sent": coalescer.sent,
+                "suppressed": coalescer.suppressed,
+            }
+        if tracker is not None:
+            result["receipts"] = tracker.outstanding()
+        if latest["pool"] is not None:
+            result["subscribers"] = latest["pool"]
+        return result
+
+    def check():
+        wake.set()
+        return "Check requested."
+
+    def pause(seconds=None):
+        if seconds is not None:
+            try:
+                seconds = int(seconds)
+            except ValueError:
+                raise ValueError("Pause must be an integer number of seconds.")
+            if seconds <= 0:
+                raise ValueError("Pause must be > 0.")
+        dispatcher.pause(seconds)
+        return paused()
+
+    def resume():
+        dispatcher.resume()
+        return paused()
+
+    return {
+        "state": lambda: dict(state),
+        "sites": lambda: latest["record"]["sites"] if latest["record"] else [],
+        "stats": stats,
+        "check": check,
+        "pause": pause,
+        "resume": resume,
+    }
+
+
 def main():
-    status_text = ["GREEN", "YELLOW", "AMBER", "RED"]
     token, user = load_env()
     # Parse command line arguments.
     arguments = argparser()
@@ -166,22 +648,293 @@ def main():
         "last_alert_status": 0,
         "last_alert_time": 0,
     }
+    if config.get("dns_ttl"):
+        # Replaces socket.getaddrinfo for the whole process.
+        install(DNSCache(config["dns_ttl"]))
+    warmer = None
+    if config.get("prewarm"):
+        # Warms at once, then before each check. Also every check interval when no check is
+        # scheduled, e.g. on a standby node or while the breaker backs off, so idle connections
+        # are kept fresh for whenever the next check comes.
+        warmer = Warmer(
+            [(AWUK_SESSION, AWUK_URL), (PUSHOVER_SESSION, PUSHOVER_URL)],
+            refresh=config["check_interval"],
+        )
+        warmer.start()
+    tracker = None
+    if config.get("emergency"):
+        tracker = ReceiptTracker(config["token"])
+        tracker.start()
+    dispatcher = build_dispatcher(
+        config["token"], config["user"], config.get("notifiers"), tracker
+    )
+    coordinator = None
+    if config.get("lease"):
+        # The lease outlives one check interval by half an interval, so the active node renews in time
+        # and a standby takes over within half an interval of a missed renewal.
+        coordinator = Coordinator(
+            SQLiteLeaseBackend(config["lease"]),
+            config.get("node_id"),
+            config["check_interval"] * 3 // 2,
+        )
+    rule = None
+    if config.get("rule"):
+        site_index = SiteIndex()
+        rule = compile_rule(config["rule"], site_index)
+    shared = None
+    if config.get("shared_cache"):
+        shared = SharedFetchCache(config["shared_cache"], config["check_interval"])
+    feed = None
+    if config.get("site_activity"):
+        feed = ActivityFeed()
+    cache = None
+    if config.get("proxy_port"):
+        cache = StatusCache()
+        start_proxy(cache, config["proxy_port"])
+    stream = None
+    if config.get("stream_port"):
+        stream = ChangeStream()
+        stream.start(config["stream_port"])
+    coalescer = None
+    if config.get("coalesce_window") or config.get("digest_interval"):
+        coalescer = Coalescer(
+            config.get("coalesce_window", 0), config.get("digest_interval", 0)
+        )
+    # Upstream failures open the breaker, fetches then back off from one check interval up to an hour.
+    # Meanwhile the last status fetched stands in for up to an hour.
+    breaker = CircuitBreaker(
+        base_delay=config["check_interval"],
+        max_delay=max(3600, config["check_interval"]),
+        alert_after=config.get("outage_alert", 3600),
+    )
+    last_good = LastKnownGood(max_age=3600)
+    archive = Archive(config["archive"]) if config.get("archive") else None
+    # Rendered once here, every alert after is a lookup. With --kp the status may come from Kp
+    # alone, so the built in default doesn't attribute it to AWUK.
+    default = COMBINED_DEFAULT if config.get("kp") else DEFAULT_FIELDS
+    templates = (
+        load_templates(config["templates"], default)
+        if config.get("templates")
+        else compile_templates({}, default)
+    )
+    pool = None
+    if config.get("subscribers"):
+        pool = ShardPool(
+            load_subscribers(config["subscribers"], templates),
+            config.get("workers"),
+            config["token"],
+            templates=templates,
+        )
+        print(f"{pool.subscribers} subscribers across {pool.workers} workers.")
+    aggregator = None
+    if config.get("kp"):
+        # AWUK is fetched by the loop below and recorded, Kp is polled on its own thread.
+        aggregator = Aggregator(
+            [
+                Source("awuk", max_age=2 * config["check_interval"], label="AuroraWatch UK"),
+                kp_source(),
+            ],
+            config.get("combine", "max"),
+        )
+        aggregator.start()
+    # Set by the admin interface to wake the loop for a check.
+    wake = threading.Event()
+    watch = Stopwatch()
+    latest = {"record": None, "pool": None}
+    if config.get("admin_socket"):
+        AdminServer(
+            config["admin_socket"],
+            admin_commands(
+                state,
+                latest,
+                wake,
+                watch,
+                dispatcher,
+                breaker,
+                tracker,
+                coalescer,
+                cache,
+                stream,
+            ),
+        ).start()
+    # Status and site statuses from the previous cycle, for change events.
+    prev_status = None
+    prev_sites = {}
+    # Recent (time, status) samples for the trend.
+    recent = deque()
     # print(config)
     while True:
-        state["current_status"] = get_status(config["reduced_sensitivity"])
+        if coordinator is not None and not coordinator.is_leader(state):
+            # Standby, leave fetching and alerting to the active node.
+            wake.wait(coordinator.standby_sleep(config["check_interval"]))
+            wake.clear()
+            continue
+        # Subscriber alert state, loaded with the rest on taking over the lease.
+        saved = state.pop("subscribers", None)
+        if saved is not None and pool is not None:
+            pool.load(saved)
+        watch.start()
+        fetch = partial(breaker.call, fetch_status_xml)
+        if shared is not None:
+            # Parsed by whichever instance fetched it.
+            content, record = shared.get(fetch)
+        else:
+            content = fetch()
+            record = parse_snapshot(content) if content is not None else None
+        state["data_age"] = 0
+        if content is not None:
+            last_good.update((content, record))
+            if archive is not None:
+                try:
+                    archive.add(content)
+                except Exception as e:
+                    print(f"Exception occurred archiving all-site-status.xml: {e}")
+        else:
+            good, age = last_good.get()
+            if good is not None:
+                content, record = good
+                state["data_age"] = age
+                print(
+                    f"AuroraWatch UK unavailable, using status from {age / 60:.0f} minutes ago."
+                )
+        if record is not None:
+            latest["record"] = record
+            state["updated"] = record["updated"]
+            if record["updated"] is not None:
+                # Clamped, a clock behind AWUK's would otherwise give negative ages.
+                age = max(0, time.time() - record["updated"])
+                METRICS.observe("status_data_age_seconds", age)
+                print(f"Status published {age:.0f} seconds ago.")
+        watch.lap("fetch")
+        outage = breaker.operator_alert()
+        if outage is not None:
+            if outage == "down":
+                message = f"AuroraWatch UK alerts: AuroraWatch UK has not responded for {breaker.open_for() / 60:.0f} minutes, alerts may be missed."
+            else:
+                message = "AuroraWatch UK alerts: AuroraWatch UK is responding again."
+            send_message(dispatcher, config, message)
+        s_ids = (
+            snapshot_status_ids(record, config["reduced_sensitivity"])
+            if record is not None
+            else None
+        )
+        state["current_status"] = process_status_ids(s_ids) if s_ids else None
         print(f"Current status: {state['current_status']}")
+        if aggregator is not None:
+            aggregator.record(
+                "awuk", state["current_status"], time.time() - state["data_age"]
+            )
+            state["current_status"] = aggregator.status()
+            # For alerts to say where their status came from.
+            state["sources"] = aggregator.fresh()
+            readings = ", ".join(
+                f"{name} {rank} ({age / 60:.0f} min old)"
+                for name, (rank, age) in aggregator.readings().items()
+            )
+            print(f"Combined status: {state['current_status']} from {readings}.")
+        watch.lap("status")
+        if rule is not None:
+            state["rule_match"] = record is not None and rule(
+                Masks(site_index, record["sites"]), time.time()
+            )
+        if cache is not None and content is not None:
+            cache.update(
+                content,
+                record,
+                state["current_status"],
+                time.time() + config["check_interval"],
+                time.time() - state["data_age"],
+            )
+        if stream is not None and record is not None:
+            sites = {site["site_id"]: site["status_id"] for site in record["sites"]}
+            for event_type, data in change_events(
+                prev_status, state["current_status"], prev_sites, sites
+            ):
+                stream.publish(event_type, data)
+            prev_sites = sites
+            prev_status = state["current_status"]
+        watch.lap("publish")
+        if pool is not None and record is not None:
+            statuses = (record["status_normal"], record["status_reduced"])
+            if aggregator is not None:
+                # Combined with the other sources, as for the main recipient.
+                statuses = tuple(aggregator.status(override={"awuk": s}) for s in statuses)
+            totals = pool.cycle(*statuses, paused=dispatcher.paused())
+            latest["pool"] = totals
+            print(
+                f"Subscribers: {totals['evaluated']} evaluated, {totals['alerts']} alerts, {totals['queued']} queued in {totals['seconds'] * 1000:.0f} ms."
+            )
+            watch.lap("subscribers")
+        if feed is not None:
+            # Sites are fetched in the background, alerts carry the activity fetched by the time
+            # of the check rather than wait for slow sites.
+            feed.apply()
+            feed.start_refresh(s_ids)
+            state["activity"] = feed.summaries()
+            watch.lap("activity")
+        if config.get("hysteresis"):
+            state["current_status"] = apply_hysteresis(
+                config, state, state["current_status"]
+            )
+        if config.get("warning_horizon"):
+            now = time.time()
+            if state["current_status"] is not None:
+                recent.append((now, state["current_status"]))
+            while recent and recent[0][0] < now - DEFAULT_WINDOW:
+                recent.popleft()
+            # Prefer activity values when available, they move well before the status colour does.
+            eta = None
+            if feed is not None:
+                eta = activity_eta(
+                    feed, s_ids, STATUS_TEXT[config["threshold"]].lower()
+                )
+            if eta is None:
+                eta = status_eta(recent, config["threshold"])
+            if should_warn(config, state, eta, now):
+                send_message(
+                    dispatcher,
+                    config,
+                    f"AuroraWatch UK heads-up: status projected to reach {STATUS_TEXT[config['threshold']]} within {max(1, round(eta / 60))} minutes.",
+                    -1,
+                )
         if should_alert(config, state):
-            args = {
-                "token": config["token"],
-                "user": config["user"],
-                "message": f"AuroraWatch UK Status: {status_text[state['current_status']]}.",
-                "ttl": config["ttl"],
-            }
-            # Send RED alerts as high priority.
-            if state["current_status"] == 3:
-                args["priority"] = 1
-            send_alert(**args)
-        time.sleep(config["check_interval"])
+            if coalescer is not None:
+                alerts = coalescer.offer(state["current_status"])
+            else:
+                alerts = [(state["current_status"], "")]
+            for status, note in alerts:
+                send_status_alert(dispatcher, config, state, status, note, templates["default"])
+        if (
+            tracker is not None
+            and state["current_status"] is not None
+            and state["current_status"] < 3
+            and tracker.outstanding(EMERGENCY_TAG)
+        ):
+            # RED is over, stop the emergency retries.
+            tracker.cancel(EMERGENCY_TAG)
+        if coalescer is not None:
+            if state["last_alert_time"] == 0:
+                # Below threshold, the event is over.
+                coalescer.discard()
+            for status, note in coalescer.flush():
+                send_status_alert(dispatcher, config, state, status, note, templates["default"])
+            coalescer.record(state["current_status"])
+            digest = coalescer.digest(config["threshold"])
+            if digest is not None:
+                send_message(dispatcher, config, digest, -1)
+        if coordinator is not None:
+            if pool is not None and pool.changed:
+                state["subscribers"] = pool.export()
+            if coordinator.save(state) and pool is not None:
+                pool.changed = False
+            state.pop("subscribers", None)
+        watch.lap("alert")
+        watch.stop()
+        if warmer is not None:
+            warmer.schedule(time.time() + config["check_interval"])
+        # Sleeps until the next check, or until a check is requested.
+        wake.wait(config["check_interval"])
+        wake.clear()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+# Replays recorded AuroraWatch UK status snapshots through the alerting logic with a simulated clock.
+# run `python -m app.backtest [options] FILE [FILE ...]` from the root of the repo.
+# or `python -m app.backtest [options] --history STORE` to replay a history store populated by app.ingest.
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
+import time
+from app.aurorawatchuk import STATUS_TEXT, get_updated, parse_status_xml, snapshot_ranks
+from app.aurorawatchuk_alerts import should_alert
+from app.history import iter_samples, open_store
+from app.trend import DEFAULT_WINDOW, should_warn, status_eta
+
+SCRIPT_VERSION = "backtest 1.0.0"
+
+
+def load_snapshot(path):
+    # Reads a recorded all-site-status.xml file and returns a sample tuple:
+    # (time, normal sensitivity status, reduced sensitivity status).
+    # Time is taken from the document's <updated> element, falling back to the file modification time.
+    # Returns None if the file is not valid xml.
+    with open(path, "rb") as f:
+        content = f.read()
+    root = parse_status_xml(content)
+    if root is None:
+        return None
+    t = get_updated(root)
+    if t is None:
+        t = os.path.getmtime(path)
+    return (t,) + snapshot_ranks(root)
+
+
+def load_snapshots(paths):
+    # Loads recorded snapshots and returns samples sorted by time. Invalid files are skipped.
+    samples = []
+    for path in paths:
+        sample = load_snapshot(path)
+        if sample is None:
+            print(f"Skipping {path}, not a valid all-site-status.xml file.")
+            continue
+        samples.append(sample)
+    samples.sort(key=lambda s: s[0])
+    return samples
+
+
+def compress_samples(samples, threshold, reduced_sensitivity):
+    # Reduces a sample series to the (time, status) points that can affect should_alert() for a threshold.
+    # Samples with no status leave state untouched, so are dropped.
+    # Consecutive samples below threshold all perform the same reset, so only the first of each run is kept.
+    # The result is shared by every alert interval replayed against this threshold and sensitivity.
+    column = 2 if reduced_sensitivity else 1
+    points = []
+    below = False
+    for sample in samples:
+        status = sample[column]
+        if status is None:
+            continue
+        if status < threshold:
+            if below:
+                continue
+            below = True
+        else:
+            below = False
+        points.append((sample[0], status))
+    return points
+
+
+def replay(points, threshold, alert_interval):
+    # Feeds (time, status) points through should_alert() using the sample times as the clock.
+    # Returns a list of (time, status) for each alert that would have been sent.
+    config = {"threshold": threshold, "alert_interval": alert_interval}
+    state = {
+        "current_status": 0,
+        "last_alert_status": 0,
+        "last_alert_time": 0,
+    }
+    alerts = []
+    for t, status in points:
+        state["current_status"] = status
+        if should_alert(config, state, t):
+            alerts.append((t, status))
+    return alerts
+
+
+def backtest_warnings(
+    samples,
+    threshold,
+    warning_horizon,
+    alert_interval=3600,
+    reduced_sensitivity=False,
+    window=DEFAULT_WINDOW,
+):
+    """
+    Replays samples through the trend early warning and scores it against what actually happened.
+    A warning is a hit if status reaches threshold within warning_horizon of it, otherwise a false alarm.
+    A crossing is missed if no warning was sent in the warning_horizon before it.
+    Returns a dict of counts, hit and false alarm rates and mean lead time in seconds.
+    """
+    column = 2 if reduced_sensitivity else 1
+    config = {
+        "threshold": threshold,
+        "alert_interval": alert_interval,
+        "warning_horizon": warning_horizon,
+    }
+    state = {"current_status": 0}
+    recent = []
+    warnings = []
+    crossings = []
+    below = True
+    for sample in samples:
+        t, status = sample[0], sample[column]
+        state["current_status"] = status
+        if status is None:
+            continue
+        if status >= threshold and below:
+            crossings.append(t)
+        below = status < threshold
+        recent.append((t, status))
+        if should_warn(config, state, status_eta(recent, threshold, window), t):
+            warnings.append(t)
+        # Only the window is needed for the next fit.
+        if len(recent) > 1 and recent[0][0] < t - window:
+            recent = [r for r in recent if r[0] >= t - window]
+    hits = 0
+    leads = []
+    c = 0
+    for w in warnings:
+        while c < len(crossings) and crossings[c] <= w:
+            c += 1
+        if c < len(crossings) and crossings[c] - w <= warning_horizon:
+            hits += 1
+            leads.append(crossings[c] - w)
+    w = 0
+    missed = 0
+    for crossing in crossings:
+        while w < len(warnings) and warnings[w] < crossing - warning_horizon:
+            w += 1
+        if not (w < len(warnings) and warnings[w] < crossing):
+            missed += 1
+    return {
+        "threshold": threshold,
+        "reduced_sensitivity": reduced_sensitivity,
+        "warnings": len(warnings),
+        "hits": hits,
+        "false_alarms": len(warnings) - hits,
+        "crossings": len(crossings),
+        "missed": missed,
+        "hit_rate": hits / len(warnings) if warnings else None,
+        "false_alarm_rate": (len(warnings) - hits) / len(warnings) if warnings else None,
+        "mean_lead": sum(leads) / len(leads) if leads else None,
+    }
+
+
+# Samples are handed to each worker process once, rather than pickled with every task.
+_worker_samples = None
+
+
+def _init_worker(samples):
+    global _worker_samples
+    _worker_samples = samples
+
+
+def _run_batch(threshold, reduced_sensitivity, alert_intervals):
+    # Replays every alert interval for one threshold and sensitivity against the worker's samples.
+    points = compress_samples(_worker_samples, threshold, reduced_sensitivity)
+    return [
+        {
+            "threshold": threshold,
+            "alert_interval": alert_interval,
+            "reduced_sensitivity": reduced_sensitivity,
+            "alerts": replay(points, threshold, alert_interval),
+        }
+        for alert_interval in alert_intervals
+    ]
+
+
+def sweep(samples, thresholds, alert_intervals, sensitivities=(False, True), workers=None):
+    """
+    Replays samples for every combination of threshold, alert interval and sensitivity.
+    Work is batched by (threshold, sensitivity) so each compressed series is built once,
+    and batches are spread across a process pool. workers=1 runs everything in-process.
+    Returns a list of result dicts, each with an 'alerts' list of (time, status) tuples.
+    """
+    batches = list(itertools.product(thresholds, sensitivities))
+    alert_intervals = list(alert_intervals)
+    results = []
+    if workers == 1 or len(batches) == 1:
+        _init_worker(samples)
+        for threshold, reduced_sensitivity in batches:
+            results.extend(_run_batch(threshold, reduced_sensitivity, alert_intervals))
+        return results
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(samples,)
+    ) as pool:
+        futures = [
+            pool.submit(_run_batch, threshold, reduced_sensitivity, alert_intervals)
+            for threshold, reduced_sensitivity in batches
+        ]
+        for future in futures:
+            results.extend(future.result())
+    return results
+
+
+def argparser():
+    parser = argparse.ArgumentParser(
+        description="Replay recorded AuroraWatch UK all-site-status.xml files and report how many alerts would have been sent for each combination of threshold, alert interval and sensitivity."
+    )
+    parser.add_argument("files", nargs="*", help="Recorded all-site-status.xml files")
+    parser.add_argument(
+        "--history",
+        help="Replay snapshots from a history store populated by app.ingest",
+        default=None,
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        help="Alert thresholds to test. Default is 1 2 3",
+        nargs="+",
+        type=int,
+        default=[1, 2, 3],
+    )
+    parser.add_argument(
+        "-a",
+        "--alert-interval",
+        help="Alert intervals in seconds to test. Default is 3600",
+        nargs="+",
+        type=int,
+        default=[3600],
+    )
+    parser.add_argument(
+        "-s",
+        "--sensitivity",
+        help="Sensitivities to test. Default is both",
+        nargs="+",
+        choices=["normal", "reduced"],
+        default=["normal", "reduced"],
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of worker processes. Default is one per CPU",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--warning-horizon",
+        help="Also score the trend early warning with this horizon in seconds",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--times",
+        help="List the time and status of every alert",
+        action="store_true",
+    )
+    parser.add_argument("-v", "--version", action="version", version=SCRIPT_VERSION)
+    return parser.parse_args()
+
+
+def main():
+    args = argparser()
+    start = time.perf_counter()
+    samples = load_snapshots(args.files)
+    if args.history is not None:
+        conn = open_store(args.history)
+        samples.extend(iter_samples(conn))
+        conn.close()
+        samples.sort(key=lambda s: s[0])
+    print(f"Loaded {len(samples)} snapshots in {time.perf_counter() - start:.2f}s.")
+    if not samples:
+        return
+    start = time.perf_counter()
+    results = sweep(
+        samples,
+        args.threshold,
+        args.alert_interval,
+        [s == "reduced" for s in args.sensitivity],
+        args.workers,
+    )
+    print(f"Replayed {len(results)} combinations in {time.perf_counter() - start:.2f}s.")
+    for r in results:
+        sensitivity = "reduced" if r["reduced_sensitivity"] else "normal"
+        print(
+            f"threshold={r['threshold']} alert_interval={r['alert_interval']} sensitivity={sensitivity}: {len(r['alerts'])} alerts"
+        )
+        if args.times:
+            for t, status in r["alerts"]:
+                print(
+                    f"  {time.strftime('%Y-%m-%dT%H:%M:%S%z', time.gmtime(t))} {STATUS_TEXT[status]}"
+                )
+    if args.warning_horizon is not None:
+        for threshold, reduced_sensitivity in itertools.product(
+            args.threshold, [s == "reduced" for s in args.sensitivity]
+        ):
+            w = backtest_warnings(
+                samples,
+                threshold,
+                args.warning_horizon,
+                args.alert_interval[0],
+                reduced_sensitivity,
+            )
+            sensitivity = "reduced" if reduced_sensitivity else "normal"
+            lead = f"{w['mean_lead']:.0f}s" if w["mean_lead"] is not None else "n/a"
+            print(
+                f"warnings threshold={threshold} sensitivity={sensitivity}: {w['warnings']} warnings, {w['hits']} hits, {w['false_alarms']} false alarms, {w['missed']} of {w['crossings']} crossings missed, mean lead {lead}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+# Circuit breaker and last-known-good cache for upstream fetches.
+# After repeated failures the breaker opens and fetches are skipped, backing off exponentially with jitter.
+# Once the backoff has passed a single probe fetch is allowed, success closes the breaker again.
+
+import random
+import time
+
+SCRIPT_VERSION = "breaker 1.0.0"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold=3,
+        base_delay=300,
+        max_delay=3600,
+        jitter=0.2,
+        alert_after=3600,
+    ):
+        # failure_threshold consecutive failures open the breaker.
+        # Each time it opens the delay doubles from base_delay up to max_delay, varied by +/- jitter.
+        # alert_after is how long the breaker may stay open before the operator should be told.
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.alert_after = alert_after
+        self.state = CLOSED
+        self.failures = 0
+        self.opens = 0  # Consecutive times opened without a success, drives the backoff.
+        self.failing_since = None
+        self.opened_at = None  # Time of the first failure of the run that opened the breaker.
+        self.next_attempt = 0
+        self.operator_alerted = False
+
+    def allow(self, now=None):
+        # Returns True if a fetch may be attempted now.
+        if now is None:
+            now = time.time()
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now >= self.next_attempt:
+            self.state = HALF_OPEN
+            return True
+        # Open and backing off, or a probe is already in flight.
+        return False
+
+    def record_success(self, now=None):
+        if self.state != CLOSED:
+            print("AuroraWatch UK fetch succeeded, circuit closed.")
+        self.state = CLOSED
+        self.failures = 0
+        self.opens = 0
+        self.opened_at = None
+
+    def record_failure(self, now=None):
+        if now is None:
+            now = time.time()
+        self.failures += 1
+        if self.failures == 1:
+            self.failing_since = now
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opens += 1
+            delay = min(self.max_delay, self.base_delay * 2 ** (self.opens - 1))
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            if self.opened_at is None:
+                self.opened_at = self.failing_since
+            self.state = OPEN
+            self.next_attempt = now + delay
+            print(f"AuroraWatch UK fetch failing, circuit open, next attempt in {delay:.0f}s.")
+
+    def call(self, fetch, now=None):
+        # Calls fetch() if allowed and records the outcome. fetch() returns None on failure.
+        # Returns the fetch result, or None if it failed or was skipped.
+        if now is None:
+            now = time.time()
+        if not self.allow(now):
+            return None
+        result = fetch()
+        if result is None:
+            self.record_failure(now)
+        else:
+            self.record_success(now)
+        return result
+
+    def open_for(self, now=None):
+        # Seconds upstream has been failing since before the breaker opened, 0 if closed.
+        if self.opened_at is None:
+            return 0
+        if now is None:
+            now = time.time()
+        return now - self.opened_at
+
+    def operator_alert(self, now=None):
+        # Returns 'down' once when the breaker has been open longer than alert_after,
+        # 'up' once when it closes after that, otherwise None.
+        if self.opened_at is not None:
+            if not self.operator_alerted and self.open_for(now) >= self.alert_after:
+                self.operator_alerted = True
+                return "down"
+        elif self.operator_alerted:
+            self.operator_alerted = False
+            return "up"
+        return None
+
+
+class LastKnownGood:
+    # Keeps the last successful value so it can stand in, with its age, while upstream is failing.
+
+    def __init__(self, max_age=3600):
+        self.max_age = max_age
+        self.value = None
+        self.time = None
+
+    def update(self, value, now=None):
+        self.value = value
+        self.time = time.time() if now is None else now
+
+    def get(self, now=None):
+        # Returns (value, age in seconds), or (None, None) if there isn't one young enough.
+        if self.time is None:
+            return None, None
+        if now is None:
+            now = time.time()
+        age = now - self.time
+        if age > self.max_age:
+            return None, None
+        return self.value, age
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print("Import: from app.breaker import CircuitBreaker, LastKnownGood.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# Alert coalescing, hysteresis and digests.
+# Cuts notification volume during long storms without delaying the first alert of an event.
+
+import time
+from app.aurorawatchuk import STATUS_TEXT
+
+SCRIPT_VERSION = "coalesce 1.0.0"
+
+
+def apply_hysteresis(config, state, status):
+    # Returns the status to act on given a new reading, and records it in state["effective_status"].
+    # A change of status only takes effect after config["hysteresis"] consecutive readings at the new status,
+    # except a rise from below threshold to at or above it, which takes effect at once so the first alert
+    # of an event is never delayed. Readings of None pass straight through.
+    required = config.get("hysteresis", 1)
+    effective = state.get("effective_status")
+    if status is None:
+        return None
+    if (
+        effective is None
+        or required <= 1
+        or status == effective
+        or (effective < config["threshold"] <= status)
+    ):
+        state.update(
+            {"effective_status": status, "pending_status": None, "pending_count": 0}
+        )
+        return status
+    if status == state.get("pending_status"):
+        state["pending_count"] += 1
+    else:
+        state.update({"pending_status": status, "pending_count": 1})
+    if state["pending_count"] >= required:
+        state.update(
+            {"effective_status": status, "pending_status": None, "pending_count": 0}
+        )
+    return state["effective_status"]
+
+
+class Coalescer:
+    # Merges alerts that fall within a window of the last one sent into a single later alert,
+    # and optionally builds a periodic digest. Only repeats and falls are held, an alert for a
+    # higher status than the last sent goes at once, along with anything held.
+
+    def __init__(self, window=0, digest_interval=0):
+        self.window = window
+        self.digest_interval = digest_interval
+        self.last_sent = None
+        self.last_status = None
+        self.pending = []  # (time, status) of alerts held back.
+        self.sent = 0
+        self.suppressed = 0
+        # Digest bookkeeping.
+        self.digest_start = None
+        self.digest_readings = []  # (time, status) since the last digest.
+        self.digest_alerts = 0
+
+    def offer(self, status, now=None):
+        # Called when should_alert() says an alert is due.
+        # Returns a list of (status, note) to send now, empty if the alert is held for the window.
+        if now is None:
+            now = time.time()
+        if (
+            self.last_sent is None
+            or now - self.last_sent >= self.window
+            or status > self.last_status
+        ):
+            pending, self.pending = self.pending, []
+            return self._send(pending + [(now, status)], now)
+        self.pending.append((now, status))
+        self.suppressed += 1
+        return []
+
+    def flush(self, now=None):
+        # Called every cycle. Returns held alerts merged into one once their window has passed.
+        if now is None:
+            now = time.time()
+        if self.pending and now - self.last_sent >= self.window:
+            pending, self.pending = self.pending, []
+            return self._send(pending, now)
+        return []
+
+    def discard(self):
+        # Drops held alerts, e.g. when the event they belong to has ended.
+        self.pending = []
+
+    def _send(self, alerts, now):
+        status = alerts[-1][1]
+        self.last_sent = now
+        self.last_status = status
+        self.sent += 1
+        self.digest_alerts += 1
+        note = ""
+        if len(alerts) > 1:
+            path = []
+            for _, s in alerts:
+                if not path or path[-1] != s:
+                    path.append(s)
+            note = f" {len(alerts)} updates merged: {' > '.join(STATUS_TEXT[s] for s in path)}."
+        return [(status, note)]
+
+    def record(self, status, now=None):
+        # Records a reading for the digest.
+        if now is None:
+            now = time.time()
+        if self.digest_start is None:
+            self.digest_start = now
+        if status is not None:
+            self.digest_readings.append((now, status))
+
+    def digest(self, threshold, now=None):
+        # Returns the digest message if one is due, otherwise None. None too for an interval where
+        # nothing reached threshold and no alerts were sent, there being nothing to report.
+        if not self.digest_interval or self.digest_start is None:
+            return None
+        if now is None:
+            now = time.time()
+        if now - self.digest_start < self.digest_interval:
+            return None
+        readings, alerts = self.digest_readings, self.digest_alerts
+        self.digest_start, self.digest_readings, self.digest_alerts = now, [], 0
+        if not readings:
+            return None
+        highest = max(s for _, s in readings)
+        if highest < threshold and not alerts:
+            return None
+        # Time at or above threshold, each reading counting until the next.
+        above = 0
+        for (t, s), (t_next, _) in zip(readings, readings[1:] + [(now, None)]):
+            if s >= threshold:
+                above += t_next - t
+        hours = self.digest_interval / 3600
+        return (
+            f"AuroraWatch UK digest, last {hours:g}h: highest {STATUS_TEXT[highest]}, "
+            f"{above / 60:.0f} minutes at or above {STATUS_TEXT[threshold]}, {alerts} alerts sent."
+        )
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --hysteresis, --coalesce-window and --digest-interval options of app.aurorawatchuk_alerts."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+# DNS caching and connection pre-warming.
+# After a quiet spell the first fetch or alert pays for DNS, TCP and TLS from scratch, and the first
+# alert of a storm is the one that matters most. DNSCache keeps lookups in process, Warmer keeps
+# pooled connections to AWUK and Pushover open by touching them shortly before the next check.
+#
+# getaddrinfo() doesn't expose record TTLs, so with dnspython installed, the supported setup, hosts
+# are resolved with it (A and/or AAAA, as the family asks) and each entry lives for the records'
+# TTL, capped at the cache's ttl. Names dnspython can't resolve, e.g. from /etc/hosts, and every
+# name without dnspython, go to getaddrinfo() and live for ttl. If a lookup fails once an entry
+# has expired, the stale result is used rather than failing the request.
+
+import ipaddress
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+from app.metrics import METRICS
+
+try:
+    import dns.exception
+    import dns.resolver
+except ImportError:
+    dns = None
+
+SCRIPT_VERSION = "connections 1.0.0"
+
+# Longest time a lookup is cached, and how long a failure is.
+DEFAULT_TTL = 300
+NEGATIVE_TTL = 30
+
+# Seconds dnspython may take over a lookup.
+RESOLVE_TIMEOUT = 5
+
+METRICS.describe("dns_cache_hits_total", "counter", "Lookups answered from the DNS cache.")
+METRICS.describe("dns_cache_misses_total", "counter", "Lookups passed to the resolver.")
+METRICS.describe("connection_warm_seconds", "gauge", "Seconds taken by the last pre-warming request.")
+
+
+class DNSCache:
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=NEGATIVE_TTL, resolve=None):
+        # resolve is the getaddrinfo to cache, by default the one in place when created.
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._resolve = resolve or socket.getaddrinfo
+        self._entries = {}  # (host, port, family, type, proto, flags) -> (expires, result or error)
+        self._lock = threading.Lock()
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        # Drop in replacement for socket.getaddrinfo().
+        if host is None or _numeric(host):
+            return self._resolve(host, port, family, type, proto, flags)
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            METRICS.incr("dns_cache_hits_total")
+            if isinstance(entry[1], OSError):
+                raise entry[1]
+            return list(entry[1])
+        METRICS.incr("dns_cache_misses_total")
+        try:
+            result, ttl = self._lookup(host, port, family, type, proto, flags)
+        except OSError as e:
+            if entry is not None and not isinstance(entry[1], OSError):
+                # Stale beats nothing while the resolver is down. Retried after negative_ttl.
+                with self._lock:
+                    self._entries[key] = (now + self.negative_ttl, entry[1])
+                return list(entry[1])
+            with self._lock:
+                self._entries[key] = (now + self.negative_ttl, e)
+            raise
+        with self._lock:
+            self._entries[key] = (now + ttl, result)
+        return list(result)
+
+    def _lookup(self, host, port, family, type, proto, flags):
+        # Returns (getaddrinfo result, seconds to cache it).
+        if dns is None:
+            return self._resolve(host, port, family, type, proto, flags), self.ttl
+        name = host.decode() if isinstance(host, bytes) else host
+        rdtypes = {socket.AF_INET: ["A"], socket.AF_INET6: ["AAAA"]}.get(family, ["A", "AAAA"])
+        result = []
+        ttl = self.ttl
+        for rdtype in rdtypes:
+            try:
+                answer = dns.resolver.resolve(name, rdtype, lifetime=RESOLVE_TIMEOUT)
+            except dns.exception.DNSException:
+                continue
+            ttl = min(ttl, answer.rrset.ttl)
+            for record in answer:
+                # Numeric, so getaddrinfo() only builds the tuples, no second lookup.
+                result += self._resolve(
+                    record.address, port, family, type, proto, flags | socket.AI_NUMERICHOST
+                )
+        if not result:
+            return self._resolve(host, port, family, type, proto, flags), self.ttl
+        return result, max(1, ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _numeric(host):
+    try:
+        ipaddress.ip_address(host.decode() if isinstance(host, bytes) else host)
+        return True
+    except ValueError:
+        return False
+
+
+_installed = None
+
+
+def install(cache):
+    # Routes every lookup in the process through cache. Returns cache.
+    global _installed
+    uninstall()
+    _installed = (socket.getaddrinfo, cache)
+    socket.getaddrinfo = cache.getaddrinfo
+    return cache
+
+
+def uninstall():
+    global _installed
+    if _installed is not None:
+        socket.getaddrinfo = _installed[0]
+        _installed = None
+
+
+class Warmer:
+    # Opens, or refreshes, pooled connections to each url shortly before they are needed.
+    # A warm is a HEAD request through the session the real request will use, so the connection
+    # it leaves in the pool is the one reused. Errors are printed and otherwise ignored.
+
+    def __init__(self, targets, lead=10, refresh=None, timeout=5):
+        # targets is a list of (requests session, url). lead is how many seconds before a
+        # scheduled time to warm. refresh, if set, also warms this often when nothing is scheduled.
+        self.targets = targets
+        self.lead = lead
+        self.refresh = refresh
+        self.timeout = timeout
+        self._next = 0  # Warm at once when started.
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def warm(self):
+        for session, url in self.targets:
+            host = urlsplit(url).hostname
+            started = time.perf_counter()
+            try:
+                session.head(url, timeout=self.timeout, allow_redirects=False).close()
+            except Exception as e:
+                print(f"Could not pre-warm connection to {host}: {e}")
+                continue
+            METRICS.set(
+                "connection_warm_seconds", time.perf_counter() - started, {"host": host}
+            )
+
+    def schedule(self, when):
+        # Warms lead seconds before when, e.g. the time of the next check.
+        with self._lock:
+            self._next = max(time.time(), when - self.lead)
+        self._wake.set()
+
+    def _run(self):
+        last = 0
+        while not self._stop.is_set():
+            now = time.time()
+            with self._lock:
+                due = self._next
+                if self.refresh is not None:
+                    due = last + self.refresh if due is None else min(due, last + self.refresh)
+                if due is not None and due <= now:
+                    self._next = None
+            if due is not None and due <= now:
+                self.warm()
+                last = time.time()
+                continue
+            self._wake.wait(None if due is None else due - now)
+            self._wake.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(self.timeout)
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --prewarm and --dns-ttl options of app.aurorawatchuk_alerts, or import: from app.connections import DNSCache, Warmer, install."
+    )
+
+
+if __name__ == "__main__":
+    main()
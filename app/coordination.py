@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+# Active/standby coordination between nodes running the service.
+# Nodes compete for a lease in a shared backend. Only the lease holder fetches and sends alerts,
+# and it persists its alert state so a standby taking over carries on where it left off
+# instead of re-sending the same alert.
+
+from abc import ABC, abstractmethod
+import json
+import socket
+import sqlite3
+import threading
+import time
+
+SCRIPT_VERSION = "coordination 1.0.0"
+
+# Alert state persisted between nodes.
+PERSISTED_STATE = ("last_alert_time", "last_alert_status")
+
+# Subscriber alert state, app.shards.ShardPool.export(), persisted too when the state has it. It can
+# be large, so the caller only includes it when it has changed, and the last saved is kept otherwise.
+SUBSCRIBER_STATE = "subscribers"
+
+
+class LeaseBackend(ABC):
+    # Interface for lease storage. Implementations must make acquire() atomic across nodes.
+
+    @abstractmethod
+    def acquire(self, node_id, ttl, now):
+        # Takes or renews the lease for node_id if it is free, expired or already held by node_id.
+        # Returns (held, expires) where expires is when the current holder's lease runs out.
+        ...
+
+    @abstractmethod
+    def release(self, node_id):
+        # Gives up the lease if node_id holds it.
+        ...
+
+    @abstractmethod
+    def load_state(self):
+        # Returns the persisted alert state dict, or None if there isn't one.
+        ...
+
+    @abstractmethod
+    def save_state(self, node_id, state, now):
+        # Persists alert state if node_id still holds the lease. Returns True if saved.
+        ...
+
+
+class MemoryLeaseBackend(LeaseBackend):
+    # In-process stand-in, for tests and for nodes sharing one process.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._holder = None
+        self._expires = 0
+        self._state = None
+        self._subscribers = None
+
+    def acquire(self, node_id, ttl, now):
+        with self._lock:
+            if self._holder in (None, node_id) or self._expires <= now:
+                self._holder = node_id
+                self._expires = now + ttl
+            return self._holder == node_id, self._expires
+
+    def release(self, node_id):
+        with self._lock:
+            if self._holder == node_id:
+                self._holder = None
+                self._expires = 0
+
+    def load_state(self):
+        with self._lock:
+            if self._state is None:
+                return None
+            state = dict(self._state)
+            if self._subscribers is not None:
+                state[SUBSCRIBER_STATE] = json.loads(self._subscribers)
+            return state
+
+    def save_state(self, node_id, state, now):
+        with self._lock:
+            if self._holder != node_id or self._expires <= now:
+                return False
+            self._state = {k: state[k] for k in PERSISTED_STATE}
+            if state.get(SUBSCRIBER_STATE) is not None:
+                # Serialised, so the saved copy is as independent of the caller's as in SQLite.
+                self._subscribers = json.dumps(state[SUBSCRIBER_STATE])
+            return True
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    # Lease and alert state in a SQLite file that every node can reach.
+
+    def __init__(self, path, name="aurorawatchuk_alerts"):
+        self.name = name
+        # Autocommit mode, transactions are started explicitly.
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS lease (
+                name TEXT PRIMARY KEY,
+                holder TEXT,
+                expires REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS alert_state (
+                name TEXT PRIMARY KEY,
+                last_alert_time REAL NOT NULL,
+                last_alert_status INTEGER NOT NULL,
+                saved REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS subscriber_state (
+                name TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                saved REAL NOT NULL
+            );
+            """
+        )
+
+    def acquire(self, node_id, ttl, now):
+        # BEGIN IMMEDIATE takes the write lock up front, so two nodes can't both see the lease free.
+        c = self._conn
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            row = c.execute(
+                "SELECT holder, expires FROM lease WHERE name = ?", (self.name,)
+            ).fetchone()
+            if row is None or row[0] in (None, node_id) or row[1] <= now:
+                c.execute(
+                    "INSERT OR REPLACE INTO lease VALUES (?, ?, ?)",
+                    (self.name, node_id, now + ttl),
+                )
+                row = (node_id, now + ttl)
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return row[0] == node_id, row[1]
+
+    def release(self, node_id):
+        self._conn.execute(
+            "UPDATE lease SET holder = NULL, expires = 0 WHERE name = ? AND holder = ?",
+            (self.name, node_id),
+        )
+
+    def load_state(self):
+        row = self._conn.execute(
+            "SELECT last_alert_time, last_alert_status FROM alert_state WHERE name = ?",
+            (self.name,),
+        ).fetchone()
+        if row is None:
+            return None
+        state = dict(zip(PERSISTED_STATE, row))
+        row = self._conn.execute(
+            "SELECT data FROM subscriber_state WHERE name = ?", (self.name,)
+        ).fetchone()
+        if row is not None:
+            state[SUBSCRIBER_STATE] = json.loads(row[0])
+        return state
+
+    def save_state(self, node_id, state, now):
+        c = self._conn
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            row = c.execute(
+                "SELECT holder, expires FROM lease WHERE name = ?", (self.name,)
+            ).fetchone()
+            # Fencing: a node that has lost the lease must not overwrite the new holder's state.
+            saved = row is not None and row[0] == node_id and row[1] > now
+            if saved:
+                c.execute(
+                    "INSERT OR REPLACE INTO alert_state VALUES (?, ?, ?, ?)",
+                    (
+                        self.name,
+                        state["last_alert_time"],
+                        state["last_alert_status"],
+                        now,
+                    ),
+                )
+                if state.get(SUBSCRIBER_STATE) is not None:
+                    c.execute(
+                        "INSERT OR REPLACE INTO subscriber_state VALUES (?, ?, ?)",
+                        (self.name, json.dumps(state[SUBSCRIBER_STATE]), now),
+                    )
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return saved
+
+
+class Coordinator:
+    # Tracks whether this node is the active one.
+
+    def __init__(self, backend, node_id=None, ttl=360):
+        # ttl should be a little longer than the check interval, so the leader renews before it runs out
+        # and a standby takes over within one check interval of a missed renewal.
+        self.backend = backend
+        self.node_id = node_id or socket.gethostname()
+        self.ttl = ttl
+        self.leader = False
+        self.expires = 0
+
+    def is_leader(self, state, now=None):
+        # Takes or renews the lease. On becoming leader, loads the persisted alert state into state.
+        if now is None:
+            now = time.time()
+        held, self.expires = self.backend.acquire(self.node_id, self.ttl, now)
+        if held and not self.leader:
+            persisted = self.backend.load_state()
+            if persisted is not None:
+                state.update(persisted)
+            print(f"Node {self.node_id} is now active.")
+        elif self.leader and not held:
+            print(f"Node {self.node_id} lost the lease, now standby.")
+        self.leader = held
+        return held
+
+    def save(self, state, now=None):
+        # Persists alert state for whichever node takes over next.
+        if now is None:
+            now = time.time()
+        if not self.backend.save_state(self.node_id, state, now):
+            self.leader = False
+            return False
+        return True
+
+    def standby_sleep(self, check_interval, now=None):
+        # Seconds a standby should wait before trying for the lease again:
+        # until the current lease runs out, but no longer than one check interval.
+        if now is None:
+            now = time.time()
+        return max(1, min(check_interval, self.expires - now))
+
+    def release(self):
+        if self.leader:
+            self.backend.release(self.node_id)
+            self.leader = False
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --lease option of app.aurorawatchuk_alerts, or import: from app.coordination import Coordinator, SQLiteLeaseBackend."
+    )
+
+
+if __name__ == "__main__":
+    main()
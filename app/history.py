@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+# Local SQLite store of parsed all-site-status.xml snapshots, used for history and backtesting.
+
+import sqlite3
+
+SCRIPT_VERSION = "history 1.0.0"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    hash TEXT PRIMARY KEY,
+    updated REAL NOT NULL,
+    path TEXT,
+    status_normal INTEGER,
+    status_reduced INTEGER
+);
+CREATE INDEX IF NOT EXISTS snapshots_updated ON snapshots (updated);
+CREATE TABLE IF NOT EXISTS sites (
+    hash TEXT NOT NULL,
+    site_id TEXT,
+    site_url TEXT,
+    status_id TEXT,
+    alerting INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sites_hash ON sites (hash);
+"""
+
+
+def open_store(path):
+    # Opens (creating if necessary) a history store and returns the connection.
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def known_hashes(conn):
+    # Returns the set of content hashes already in the store.
+    return {row[0] for row in conn.execute("SELECT hash FROM snapshots")}
+
+
+def insert_snapshots(conn, records):
+    # Inserts a batch of snapshot records in a single transaction.
+    # Each record is a dict with hash, updated, path, status_normal, status_reduced and sites keys,
+    # sites being a list of dicts as returned by extract_status_ids() plus an 'alerting' flag.
+    # Records whose hash is already stored are ignored. Returns the number of snapshots inserted.
+    inserted = 0
+    with conn:
+        for r in records:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+                (
+                    r["hash"],
+                    r["updated"],
+                    r["path"],
+                    r["status_normal"],
+                    r["status_reduced"],
+                ),
+            )
+            if cur.rowcount == 0:
+                continue
+            inserted += 1
+            conn.executemany(
+                "INSERT INTO sites VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        r["hash"],
+                        s["site_id"],
+                        s["site_url"],
+                        s["status_id"],
+                        int(s["alerting"]),
+                    )
+                    for s in r["sites"]
+                ],
+            )
+    return inserted
+
+
+def iter_samples(conn, start=None, end=None):
+    # Yields (time, normal sensitivity status, reduced sensitivity status) samples in time order,
+    # in the same form as app.backtest.load_snapshots().
+    query = "SELECT updated, status_normal, status_reduced FROM snapshots"
+    clauses = []
+    params = []
+    if start is not None:
+        clauses.append("updated >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("updated < ?")
+        params.append(end)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY updated"
+    for row in conn.execute(query, params):
+        yield tuple(row)
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Use app.ingest to populate a history store, or import: from app.history import open_store, iter_samples."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# Bulk ingest of archived all-site-status.xml files into a local history store.
+# run `python -m app.ingest [options] STORE FILE_OR_DIR [FILE_OR_DIR ...]` from the root of the repo.
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import os
+import time
+from app.aurorawatchuk import parse_snapshot
+from app.history import insert_snapshots, known_hashes, open_store
+
+SCRIPT_VERSION = "ingest 1.0.0"
+
+
+def find_files(paths):
+    # Expands directories into the .xml files beneath them, in sorted order.
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.endswith(".xml"):
+                        yield os.path.join(dirpath, name)
+        else:
+            yield path
+
+
+# Hashes already in the store are handed to each worker process once, so they can skip parsing.
+_worker_known = frozenset()
+
+
+def _init_worker(known):
+    global _worker_known
+    _worker_known = known
+
+
+def _ingest_file(path):
+    # Returns (bytes read, record). Record is None for files already ingested or not valid xml.
+    with open(path, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    if digest in _worker_known:
+        return len(content), None
+    record = parse_snapshot(content, digest)
+    if record is None:
+        return len(content), None
+    # Fall back to the file modification time if the document has no <updated> element.
+    if record["updated"] is None:
+        record["updated"] = os.path.getmtime(path)
+    record["path"] = path
+    return len(content), record
+
+
+def ingest(store_path, paths, workers=None, batch_size=500):
+    """
+    Parses files across a process pool and streams the results into the history store in batches.
+    Files whose content hash is already stored are skipped.
+    Returns a dict of counts and timings.
+    """
+    conn = open_store(store_path)
+    known = frozenset(known_hashes(conn))
+    files = list(find_files(paths))
+    stats = {"files": len(files), "bytes": 0, "inserted": 0}
+    start = time.perf_counter()
+    batch = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(known,)
+    ) as pool:
+        chunksize = max(1, min(64, len(files) // ((workers or os.cpu_count() or 1) * 4)))
+        for size, record in pool.map(_ingest_file, files, chunksize=chunksize):
+            stats["bytes"] += size
+            if record is None:
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                stats["inserted"] += insert_snapshots(conn, batch)
+                batch = []
+    if batch:
+        stats["inserted"] += insert_snapshots(conn, batch)
+    conn.close()
+    # Already stored, invalid, and duplicated within this run.
+    stats["skipped"] = stats["files"] - stats["inserted"]
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def argparser():
+    parser = argparse.ArgumentParser(
+        description="Ingest archived AuroraWatch UK all-site-status.xml files into a local history store."
+    )
+    parser.add_argument("store", help="Path to the SQLite history store")
+    parser.add_argument(
+        "paths", nargs="+", help="Files, or directories searched for .xml files"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of worker processes. Default is one per CPU",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        help="Number of snapshots written per transaction. Default is 500",
+        type=int,
+        default=500,
+    )
+    parser.add_argument("-v", "--version", action="version", version=SCRIPT_VERSION)
+    return parser.parse_args()
+
+
+def main():
+    args = argparser()
+    stats = ingest(args.store, args.paths, args.workers, args.batch_size)
+    seconds = max(stats["seconds"], 1e-9)
+    print(
+        f"Ingested {stats['inserted']} of {stats['files']} files, skipped {stats['skipped']}, in {stats['seconds']:.2f}s."
+    )
+    print(
+        f"Throughput: {stats['files'] / seconds:.0f} files/s, {stats['bytes'] / seconds / 1e6:.2f} MB/s."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+# Process-wide counters, gauges and histograms.
+# Modules record into METRICS, the proxy serves it at /metrics in the Prometheus text format.
+
+from collections import deque
+import math
+import threading
+import time
+
+SCRIPT_VERSION = "metrics 1.0.0"
+
+# Histogram bucket upper bounds, in seconds: from a few seconds up to an hour.
+DEFAULT_BUCKETS = (5, 15, 30, 60, 120, 180, 300, 600, 900, 1800, 3600)
+
+# Recent observations kept per histogram for percentiles.
+SAMPLES = 1024
+
+
+class Metrics:
+    # Thread safe store of named values. A value can carry labels, e.g. {"source": "status"}.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}  # (name, labels) -> value, labels is a sorted tuple of pairs.
+        self._types = {}  # name -> "counter", "gauge" or "histogram".
+        self._help = {}
+        self._histograms = {}  # (name, labels) -> dict, see observe().
+
+    def describe(self, name, kind, text):
+        # Optional type and help text for a metric, used when rendering.
+        with self._lock:
+            self._types[name] = kind
+            self._help[name] = text
+
+    def incr(self, name, value=1, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, name, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def observe(self, name, value, labels=None, buckets=DEFAULT_BUCKETS):
+        # Adds value to a histogram. buckets only applies to the first observation of a series.
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = {
+                    "buckets": tuple(buckets),
+                    "counts": [0] * len(buckets),  # Cumulative, as rendered.
+                    "sum": 0,
+                    "count": 0,
+                    "samples": deque(maxlen=SAMPLES),
+                }
+            for i, bound in enumerate(h["buckets"]):
+                if value <= bound:
+                    h["counts"][i] += 1
+            h["sum"] += value
+            h["count"] += 1
+            h["samples"].append(value)
+
+    def percentiles(self, name, labels=None, qs=(0.5, 0.9, 0.99)):
+        # Returns {q: value} over the last SAMPLES observations of a histogram, empty if there are none.
+        # Nearest rank, so every value returned was actually observed.
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            samples = sorted(h["samples"]) if h is not None else []
+        if not samples:
+            return {}
+        return {q: samples[max(0, math.ceil(round(q * len(samples), 9)) - 1)] for q in qs}
+
+    def snapshot(self):
+        # Returns {name: value} with labels folded into the name, e.g. 'fetch_requests_total{source="status"}'.
+        # Histograms give their count, sum and median, 90th and 99th percentiles.
+        with self._lock:
+            result = {_series(name, labels): v for (name, labels), v in self._values.items()}
+            histograms = [(key, h["count"], h["sum"]) for key, h in self._histograms.items()]
+        for (name, labels), count, total in histograms:
+            result[_series(name + "_count", labels)] = count
+            result[_series(name + "_sum", labels)] = total
+            for q, v in self.percentiles(name, dict(labels)).items():
+                result[_series(name, labels + (("quantile", q),))] = v
+        return result
+
+    def render(self):
+        # Returns all metrics in the Prometheus text exposition format.
+        with self._lock:
+            values = sorted(self._values.items())
+            for (name, labels), h in sorted(self._histograms.items()):
+                for bound, count in zip(h["buckets"], h["counts"]):
+                    values.append(((name, labels), (bound, count)))
+                values.append(((name, labels), ("+Inf", h["count"])))
+                values.append(((name, labels), ("sum", h["sum"])))
+                values.append(((name, labels), ("count", h["count"])))
+            types = dict(self._types)
+            help_text = dict(self._help)
+        lines = []
+        seen = set()
+        for (name, labels), value in values:
+            if name not in seen:
+                seen.add(name)
+                if name in help_text:
+                    lines.append(f"# HELP {name} {help_text[name]}")
+                if name in types:
+                    lines.append(f"# TYPE {name} {types[name]}")
+            if not isinstance(value, tuple):
+                lines.append(f"{_series(name, labels)} {value}")
+            elif value[0] in ("sum", "count"):
+                lines.append(f"{_series(name + '_' + value[0], labels)} {value[1]}")
+            else:
+                lines.append(f"{_series(name + '_bucket', labels + (('le', value[0]),))} {value[1]}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._histograms.clear()
+
+
+class Stopwatch:
+    # Times consecutive stages of a cycle, recording each into a gauge labelled by stage,
+    # e.g. stage_seconds{stage="fetch"}. last holds the timings of the last complete cycle.
+
+    def __init__(self, metrics=None, name="stage_seconds"):
+        self.metrics = metrics if metrics is not None else METRICS
+        self.name = name
+        self.laps = {}
+        self.last = {}
+        self._mark = time.perf_counter()
+
+    def start(self):
+        # Starts a new cycle.
+        self.laps = {}
+        self._mark = time.perf_counter()
+
+    def stop(self):
+        # Ends the cycle, its laps become last.
+        self.last = self.laps
+
+    def lap(self, stage):
+        # Records the time since the last lap, or start, as stage. Returns the seconds taken.
+        now = time.perf_counter()
+        seconds = now - self._mark
+        self._mark = now
+        self.laps[stage] = self.laps.get(stage, 0) + seconds
+        self.metrics.set(self.name, seconds, {"stage": stage})
+        return seconds
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+METRICS = Metrics()
+METRICS.describe("stage_seconds", "gauge", "Seconds taken by each stage of the last check cycle.")
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print("Served at /metrics with the --proxy-port option of app.aurorawatchuk_alerts, or import: from app.metrics import METRICS.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+
+# Notifier backends and routing.
+# An alert is a dict with message and optional priority, ttl and title keys, as used by Pushover.
+# Each recipient is routed to one or more backends. Deliveries run concurrently, each bounded by its
+# backend's timeout, so a slow backend never holds up the others.
+#
+# Routing file, json:
+#   {
+#     "backends": {
+#       "pushover": {"type": "pushover"},
+#       "hook": {"type": "webhook", "url": "https://example.org/hook", "timeout": 5},
+#       "mail": {"type": "smtp", "host": "localhost", "sender": "aurora@example.org"},
+#       "log": {"type": "file", "path": "/home/aurora/alerts.jsonl"}
+#     },
+#     "recipients": [
+#       {"name": "me", "backends": ["pushover", "log"]},
+#       {"name": "ops", "pushover_user": "<user key>", "email": "ops@example.org", "backends": ["pushover", "mail", "hook"]}
+#     ]
+#   }
+# Backend types are pushover, webhook, smtp, file and null. A recipient without pushover_user gets
+# PUSHOVER_USER_KEY. An SMTP password is read from the environment variable named by password_env.
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
+from email.message import EmailMessage
+import json
+import os
+import smtplib
+import stat
+import threading
+import time
+import requests
+from app.metrics import METRICS
+from app.pushover import send_alert
+
+SCRIPT_VERSION = "notify 1.0.0"
+
+DEFAULT_TIMEOUT = 10
+
+METRICS.describe(
+    "alert_latency_seconds",
+    "histogram",
+    "Seconds from AWUK publishing a status to a backend accepting the alert for it.",
+)
+
+
+class Notifier(ABC):
+    # Interface for delivery backends. send() raises on failure.
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+
+    @abstractmethod
+    def send(self, alert, recipient):
+        ...
+
+
+class PushoverNotifier(Notifier):
+    # Emergency priority receipts are handed to tracker, an app.receipts.ReceiptTracker, if given.
+
+    def __init__(self, token, user, timeout=DEFAULT_TIMEOUT, tracker=None):
+        super().__init__(timeout)
+        self.token = token
+        self.user = user
+        self.tracker = tracker
+
+    def send(self, alert, recipient):
+        response = send_alert(
+            timeout=self.timeout,
+            token=self.token,
+            user=recipient.get("pushover_user", self.user),
+            **{k: v for k, v in alert.items() if v is not None},
+        )
+        if self.tracker is not None and alert.get("priority") == 2:
+            self.tracker.add(response.json()["receipt"], alert["expire"], alert.get("tags"))
+
+
+class WebhookNotifier(Notifier):
+    # POSTs the alert and recipient name as json.
+
+    def __init__(self, url, headers=None, timeout=DEFAULT_TIMEOUT):
+        super().__init__(timeout)
+        self.url = url
+        self.headers = headers or {}
+        self._session = requests.Session()
+
+    def send(self, alert, recipient):
+        response = self._session.post(
+            self.url,
+            json={"recipient": recipient.get("name"), **alert},
+            headers=self.headers,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+
+class SMTPNotifier(Notifier):
+    def __init__(
+        self,
+        host,
+        sender,
+        port=25,
+        starttls=False,
+        username=None,
+        password_env=None,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        super().__init__(timeout)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.starttls = starttls
+        self.username = username
+        self.password_env = password_env
+
+    def send(self, alert, recipient):
+        if not recipient.get("email"):
+            raise ValueError(f"Recipient {recipient.get('name')} has no email address.")
+        msg = EmailMessage()
+        msg["From"] = self.sender
+        msg["To"] = recipient["email"]
+        msg["Subject"] = alert.get("title") or alert["message"].split(".")[0]
+        msg.set_content(alert["message"])
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, os.environ.get(self.password_env or "", ""))
+            smtp.send_message(msg)
+
+
+class FileNotifier(Notifier):
+    # Appends one json line per alert to a file, or writes it to a FIFO for a local consumer.
+    # Writing to a FIFO with no reader fails rather than blocking.
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT):
+        super().__init__(timeout)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, alert, recipient):
+        line = json.dumps(
+            {"time": time.time(), "recipient": recipient.get("name"), **alert}
+        )
+        flags = os.O_WRONLY | os.O_APPEND | os.O_NONBLOCK
+        try:
+            is_fifo = stat.S_ISFIFO(os.stat(self.path).st_mode)
+        except FileNotFoundError:
+            is_fifo = False
+            flags |= os.O_CREAT
+        with self._lock:
+            fd = os.open(self.path, flags, 0o644)
+            try:
+                data = (line + "\n").encode()
+                # Writes up to PIPE_BUF bytes are atomic on a FIFO, longer lines may be split.
+                while data:
+                    data = data[os.write(fd, data) :]
+            except BlockingIOError:
+                if is_fifo:
+                    raise RuntimeError(f"FIFO {self.path} is full, reader not keeping up.")
+                raise
+            finally:
+                os.close(fd)
+
+
+class NullNotifier(Notifier):
+    # Discards alerts, counting them. For benchmarking and dry runs.
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__(timeout)
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def send(self, alert, recipient):
+        with self._lock:
+            self.sent += 1
+
+
+BACKEND_TYPES = {
+    "webhook": WebhookNotifier,
+    "smtp": SMTPNotifier,
+    "file": FileNotifier,
+    "null": NullNotifier,
+}
+
+
+class Dispatcher:
+    # Fans alerts out to every recipient's backends concurrently.
+    # Each backend has its own threads, so one that hangs can't use up the threads of the others.
+
+    def __init__(self, backends, recipients, max_workers=4):
+        # backends is {name: Notifier}, recipients a list of dicts with name and backends keys.
+        # Each backend gets at least a thread per recipient using it, so every delivery of an alert
+        # starts at once unless earlier deliveries are still hung.
+        for recipient in recipients:
+            for name in recipient["backends"]:
+                if name not in backends:
+                    raise ValueError(
+                        f"Recipient {recipient.get('name')} uses unknown backend {name}."
+                    )
+        self.backends = backends
+        self.recipients = recipients
+        self._pools = {
+            name: ThreadPoolExecutor(
+                max_workers=max(
+                    max_workers, sum(name in recipient["backends"] for recipient in recipients)
+                ),
+                thread_name_prefix=name,
+            )
+            for name in backends
+        }
+        self._lock = threading.Lock()
+        # Deliveries submitted and not yet finished, including those left running after a timeout.
+        self.pending = 0
+        # Alerts are dropped, not held, until this time. inf pauses until resumed.
+        self.paused_until = 0
+
+    def pause(self, seconds=None, now=None):
+        # Stops sending alerts, for seconds or until resume().
+        # Called from the admin thread while the loop sends, so paused_until is only touched under
+        # the lock.
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self.paused_until = float("inf") if seconds is None else now + seconds
+
+    def resume(self):
+        with self._lock:
+            self.paused_until = 0
+
+    def paused(self, now=None):
+        return (time.time() if now is None else now) < self.resumes_at()
+
+    def resumes_at(self):
+        # paused_until, 0 if not paused, inf if paused until resumed.
+        with self._lock:
+            return self.paused_until
+
+    @staticmethod
+    def _deliver(name, backend, alert, recipient, began, published):
+        # Runs in the backend's pool. began records when the delivery started, for its timeout.
+        # Latency is recorded here, so deliveries finishing after their timeout are counted too.
+        began.append(time.monotonic())
+        backend.send(alert, recipient)
+        if published is not None:
+            METRICS.observe("alert_latency_seconds", time.time() - published, {"backend": name})
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    def send(self, alert, published=None):
+        # Delivers alert to every recipient. Returns {(recipient name, backend name): error or None}.
+        # Each delivery has its backend's timeout from when it starts. A delivery still running
+        # after its timeout is reported as timed out and left to finish in the background. One
+        # that couldn't start within the timeout, its backend's threads all hung, is cancelled.
+        # published is when the data behind the alert was published upstream, if known. The time
+        # from then until each backend accepts the alert is recorded as alert_latency_seconds.
+        if self.paused():
+            print(f"Alerts paused, not sent: {alert['message']}")
+            return {}
+        started = time.monotonic()
+        futures = {}
+        for recipient in self.recipients:
+            for name in recipient["backends"]:
+                backend = self.backends[name]
+                with self._lock:
+                    self.pending += 1
+                began = []
+                future = self._pools[name].submit(
+                    self._deliver, name, backend, alert, recipient, began, published
+                )
+                future.add_done_callback(self._done)
+                futures[future] = (recipient.get("name"), name, backend.timeout, began)
+        results = {}
+        pending = set(futures)
+
+        def deadline(future):
+            _, _, timeout, began = futures[future]
+            return (began[0] if began else started) + timeout
+
+        while pending:
+            # Wake at the earliest remaining deadline.
+            now = time.monotonic()
+            done, pending = wait(pending, timeout=max(0, min(map(deadline, pending)) - now))
+            for future in done:
+                recipient, name, _, _ = futures[future]
+                results[(recipient, name)] = future.exception()
+            now = time.monotonic()
+            for future in [f for f in pending if deadline(f) <= now]:
+                recipient, name, timeout, began = futures[future]
+                if began:
+                    results[(recipient, name)] = TimeoutError(f"No response in {timeout}s.")
+                elif future.cancel():
+                    results[(recipient, name)] = TimeoutError(
+                        f"Not started in {timeout}s, {name} is busy."
+                    )
+                else:
+                    # Started just now, its own timeout runs from here.
+                    continue
+                pending.discard(future)
+        for (recipient, name), error in results.items():
+            if error is not None:
+                print(f"Alert to {recipient} via {name} failed: {error}")
+        return results
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False)
+
+
+def build_dispatcher(token, user, path=None, tracker=None):
+    # Returns a Dispatcher from a routing file, or a single Pushover recipient if path is None.
+    # tracker is passed to Pushover backends for emergency priority receipts.
+    # Raises ValueError if the routing file is not valid.
+    if path is None:
+        return Dispatcher(
+            {"pushover": PushoverNotifier(token, user, tracker=tracker)},
+            [{"name": "default", "backends": ["pushover"]}],
+        )
+    try:
+        with open(path) as f:
+            routing = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Could not read notifier routing file. {e}")
+    backends = {}
+    for name, spec in routing.get("backends", {}).items():
+        spec = dict(spec)
+        kind = spec.pop("type", None)
+        try:
+            if kind == "pushover":
+                backends[name] = PushoverNotifier(token, user, tracker=tracker, **spec)
+            elif kind in BACKEND_TYPES:
+                backends[name] = BACKEND_TYPES[kind](**spec)
+            else:
+                raise ValueError(f"unknown type {kind}")
+        except TypeError as e:
+            raise ValueError(f"Notifier backend {name} not valid. {e}")
+        except ValueError as e:
+            raise ValueError(f"Notifier backend {name} not valid, {e}.")
+    recipients = routing.get("recipients", [])
+    if not recipients:
+        raise ValueError("Notifier routing file has no recipients.")
+    for recipient in recipients:
+        if not recipient.get("backends"):
+            raise ValueError(f"Recipient {recipient.get('name')} has no backends.")
+    return Dispatcher(backends, recipients)
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --notifiers option of app.aurorawatchuk_alerts, or import: from app.notify import Dispatcher, build_dispatcher."
+    )
+
+
+if __name__ == "__main__":
+    main()
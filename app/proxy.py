@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+# Local caching status proxy.
+# Serves the latest fetched all-site-status.xml, and a parsed JSON summary, from memory over HTTP,
+# so other services on the host can read AWUK status without polling AWUK themselves.
+#
+# GET /all-site-status.xml  the upstream document, byte for byte.
+# GET /status.json          parsed summary, see StatusCache.update().
+# GET /metrics              service metrics in the Prometheus text format.
+
+from email.utils import formatdate
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from app.aurorawatchuk import STATUS_TEXT
+from app.metrics import METRICS
+
+SCRIPT_VERSION = "proxy 1.0.0"
+
+ROUTES = ("/all-site-status.xml", "/status.json")
+
+
+class StatusCache:
+    # Holds prebuilt responses for the latest snapshot. Safe to update from the main loop while serving.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.expires = 0
+
+    def update(self, content, record, status, expires, fetched=None):
+        # Replaces the cached responses.
+        # content is the raw all-site-status.xml, record is from app.aurorawatchuk.parse_snapshot(),
+        # status is the status used for alerting and expires is when the next upstream fetch is due.
+        # fetched is only sent as Last-Modified, so an unchanged body keeps its ETag across fetches.
+        if fetched is None:
+            fetched = time.time()
+        summary = {
+            "status": status,
+            "status_text": STATUS_TEXT[status] if status is not None else None,
+            "updated": record["updated"] if record else None,
+            "sites": record["sites"] if record else [],
+        }
+        entries = {
+            "/all-site-status.xml": _entry(content, "application/xml", fetched),
+            "/status.json": _entry(
+                json.dumps(summary, separators=(",", ":")).encode(),
+                "application/json",
+                fetched,
+            ),
+        }
+        with self._lock:
+            for path, entry in entries.items():
+                old = self._entries.get(path)
+                if old is not None and old["etag"] == entry["etag"]:
+                    # Unchanged, still last modified when it did change.
+                    entry["last_modified"] = old["last_modified"]
+            self._entries = entries
+            self.expires = expires
+
+    def get(self, path):
+        # Returns (entry, expires), entry is None if nothing is cached for path.
+        with self._lock:
+            return self._entries.get(path), self.expires
+
+
+def _entry(body, content_type, fetched):
+    return {
+        "body": body,
+        "etag": '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+        "content_type": content_type,
+        "last_modified": formatdate(fetched, usegmt=True),
+    }
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    server_version = "aurorawatchuk_alerts-proxy"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            self._respond_metrics(send_body)
+            return
+        entry, expires = self.server.cache.get(path)
+        if entry is None:
+            # Nothing fetched yet is a temporary condition, unknown paths are not.
+            code = 503 if path in ROUTES else 404
+            self.send_response(code)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        # Readers may reuse the response until the next upstream fetch is due.
+        max_age = max(0, int(expires - time.time()))
+        etags = _etags(self.headers.get("If-None-Match"))
+        if "*" in etags or entry["etag"] in etags:
+            self.send_response(304)
+            self.send_header("ETag", entry["etag"])
+            self.send_header("Cache-Control", f"max-age={max_age}")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", entry["content_type"])
+        self.send_header("Content-Length", str(len(entry["body"])))
+        self.send_header("ETag", entry["etag"])
+        self.send_header("Last-Modified", entry["last_modified"])
+        self.send_header("Cache-Control", f"max-age={max_age}")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(entry["body"])
+
+    def _respond_metrics(self, send_body):
+        body = METRICS.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Don't log every local read.
+        pass
+
+
+def _etags(header):
+    # Splits an If-None-Match header into its entity tags, ignoring weak validator prefixes.
+    if not header:
+        return ()
+    return [t.strip().removeprefix("W/") for t in header.split(",")]
+
+
+def start_proxy(cache, port, host="127.0.0.1"):
+    # Starts serving cache on a background thread and returns the server.
+    server = ThreadingHTTPServer((host, port), ProxyHandler)
+    server.daemon_threads = True
+    server.cache = cache
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"Status proxy listening on http://{host}:{server.server_address[1]}/")
+    return server
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --proxy-port option of app.aurorawatchuk_alerts, or import: from app.proxy import StatusCache, start_proxy."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,39 @@ SCRIPT_VERSION = "pushover 1.0.0"
 
 PUSHOVER_URL = "https://api.pushover.net/1/messages.json"
 
+# Seconds to wait for the Pushover API.
+PUSHOVER_TIMEOUT = 10
+
+# Built-in Pushover sounds.
+SOUNDS = [
+    "pushover",
+    "bike",
+    "bugle",
+    "cashregister",
+    "classical",
+    "cosmic",
+    "falling",
+    "gamelan",
+    "incoming",
+    "intermission",
+    "magic",
+    "mechanical",
+    "pianobar",
+    "siren",
+    "spacealarm",
+    "tugboat",
+    "alien",
+    "climb",
+    "persistent",
+    "echo",
+    "updown",
+    "vibrate",
+    "none",
+]
+
+# Shared so alerts reuse a pooled connection rather than connecting afresh each time.
+SESSION = requests.Session()
+
 
 @dataclass
 class Validate:
@@ -27,10 +60,13 @@ class Validate:
     # attachment_type isn't included as it appears to only be necessary when using attachment_base64.
     attachment: tuple[str, BinaryIO, str] | None = None
     device: str | None = None
+    expire: int | None = None  # Emergency priority only, seconds to keep retrying.
     html: int | None = None
     monospace: int | None = None
     priority: int | None = None
+    retry: int | None = None  # Emergency priority only, seconds between retries.
     sound: str | None = None  # Only built-in Pushover sounds currently supported.
+    tags: str | None = None  # Emergency priority only, comma separated, for cancelling by tag.
     timestamp: int | None = None
     title: str | None = None
     ttl: int | None = None
@@ -157,37 +193,12 @@ class Validate:
         f = getattr(self, "sound")
         if f is not None:
             if isinstance(f, str):
-                valid_sounds = [
-                    "pushover",
-                    "bike",
-                    "bugle",
-                    "cashregister",
-                    "classical",
-                    "cosmic",
-                    "falling",
-                    "gamelan",
-                    "incoming",
-                    "intermission",
-                    "magic",
-                    "mechanical",
-                    "pianobar",
-                    "siren",
-                    "spacealarm",
-                    "tugboat",
-                    "alien",
-                    "climb",
-                    "persistent",
-                    "echo",
-                    "updown",
-                    "vibrate",
-                    "none",
-                ]
-                if f in valid_sounds:
+                if f in SOUNDS:
                     pass
                 else:
                     lines = [
                         "Optional parameter 'sound' is not a valid Pushover sound.",
-                        f"Valid sounds are: {', '.join(valid_sounds)}.",
+                        f"Valid sounds are: {', '.join(SOUNDS)}.",
                     ]
                     emsg = "\n".join(lines)
                     raise ValueError(emsg)
@@ -275,10 +286,40 @@ class Validate:
                 raise ValueError(
                     "Optional parameter 'url_title' was passed without a corresponding 'url' parameter."
                 )
+
+        # Validate emergency priority parameters.
+        # Emergency priority requires retry, at least 30 seconds, and expire, at most three hours.
+        for field, low, high in (("retry", 30, 10800), ("expire", 1, 10800)):
+            m = getattr(self, field)
+            if m is None:
+                if getattr(self, "priority") == 2:
+                    raise ValueError(
+                        f"Optional parameter '{field}' is required when 'priority' is 2."
+                    )
+            elif isinstance(m, int):
+                if m >= low and m <= high:
+                    pass
+                else:
+                    raise ValueError(
+                        f"Optional parameter '{field}' must be between {low} and {high}."
+                    )
+            else:
+                raise TypeError(f"Optional parameter '{field}' must be an integer.")
+        n = getattr(self, "tags")
+        if not n == None:
+            if isinstance(n, str):
+                if re.fullmatch(r"[a-zA-Z0-9_.-]+(,[a-zA-Z0-9_.-]+)*", n):
+                    pass
+                else:
+                    raise ValueError(
+                        "Optional parameter 'tags' must be comma separated letters, numbers, underscores, hyphens and dots."
+                    )
+            else:
+                raise TypeError("Optional parameter 'tags' must be a string.")
         # End validation checks.
 
 
-def send_alert(**kwargs):
+def send_alert(timeout=PUSHOVER_TIMEOUT, **kwargs):
     """Function to send an alert using Pushover.
     The following kwargs are mandatory:
     - app_token is the application-specific token in Pushover.
@@ -291,13 +332,18 @@ def send_alert(**kwargs):
     - device is a specific device name associated with a user key to be the recipient, instead of all devices.
     - html tells the Pushover API to treat message as containing html. Cannot be used in conjunction with monospace.
     - monospace tells the Pushover API to use a monospace typeface for the message. Cannot be used in conjunction with html.
-    - priority determines the message priority.
+    - priority determines the message priority. Priority 2 (emergency) also needs retry and expire.
+    - retry is how often, in seconds, an emergency priority message is resent until acknowledged.
+    - expire is how long, in seconds, an emergency priority message keeps being resent.
+    - tags are comma separated tags for an emergency priority message, for cancelling by tag.
     - sound tells the Pushover API what sound to play on the device(s) that receive the message.
     - timestamp overrides the default timestamp on the message.
     - title overrides the Pushover app name for the message title.
     - ttl specifies how long before the message expires and is automatically deleted by the recipient's device(s).
     - url specifies a url to be added to the message as a hyperlink.
     - url_title specifies custom text for the url hyperlink.
+
+    timeout is how long, in seconds, to wait for the Pushover API.
     """
 
     # Use dataclass to validate the kwargs.
@@ -310,10 +356,11 @@ def send_alert(**kwargs):
         if value is not None and field.name != "attachment":
             msg_payload[field.name] = value
 
-    # Create arguments to be passed to requests.post()
+    # Create arguments to be passed to SESSION.post()
     args = {
         "url": PUSHOVER_URL,
         "data": msg_payload,
+        "timeout": timeout,
     }
 
     # If there is an attachment, add it to args.
@@ -321,8 +368,7 @@ def send_alert(**kwargs):
     if attachment is not None:
         args["files"] = {"attachment": attachment}
 
-    print(f"args: {args}")
-    response = requests.post(**args)
+    response = SESSION.post(**args)
     response.raise_for_status()
     return response
 
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+# Receipt tracking for emergency priority Pushover alerts.
+# Pushover returns a receipt for every priority 2 message and keeps resending it until it is
+# acknowledged or expires. One background thread polls every outstanding receipt: polls are
+# batched into a single wake-up, limited to a number of requests per second, and each receipt is
+# polled less often the longer it goes unacknowledged. Outstanding retries can be cancelled by tag
+# with one request however many receipts there are.
+
+import threading
+import time
+import requests
+from app.metrics import METRICS
+
+SCRIPT_VERSION = "receipts 1.0.0"
+
+RECEIPT_URL = "https://api.pushover.net/1/receipts/{}.json"
+CANCEL_BY_TAG_URL = "https://api.pushover.net/1/receipts/cancel_by_tag/{}.json"
+
+# Pushover ask that a receipt isn't polled more than once every five seconds.
+MIN_INTERVAL = 5
+
+
+class ReceiptTracker:
+    def __init__(
+        self,
+        token,
+        min_interval=MIN_INTERVAL,
+        max_interval=300,
+        max_rate=2,
+        timeout=10,
+    ):
+        # A new receipt is polled after min_interval, then each unacknowledged poll doubles the
+        # interval up to max_interval. max_rate is the most receipt requests per second.
+        self.token = token
+        self.min_interval = max(MIN_INTERVAL, min_interval)
+        self.max_interval = max_interval
+        self.max_rate = max_rate
+        self.timeout = timeout
+        self.receipts = {}  # receipt -> dict, see add().
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._session = requests.Session()
+
+    def add(self, receipt, expire, tag=None, now=None):
+        # Starts tracking a receipt for a message resent for up to expire seconds.
+        if now is None:
+            now = time.time()
+        with self._lock:
+            self.receipts[receipt] = {
+                "tag": tag,
+                "sent": now,
+                "expires": now + expire,
+                "interval": self.min_interval,
+                "next_poll": now + self.min_interval,
+            }
+            METRICS.set("receipts_outstanding", len(self.receipts))
+        self._wake.set()
+
+    def due(self, now=None):
+        # Receipts due a poll, most overdue first.
+        if now is None:
+            now = time.time()
+        with self._lock:
+            due = [(r["next_poll"], k) for k, r in self.receipts.items() if r["next_poll"] <= now]
+        return [k for _, k in sorted(due)]
+
+    def poll(self, now=None):
+        # Polls due receipts, at most max_rate requests per second.
+        # Returns a list of (receipt, result) for receipts that are finished, where result is the
+        # Pushover receipt status dict.
+        finished = []
+        for i, receipt in enumerate(self.due(now)):
+            if i and self.max_rate:
+                # Spread the batch out to stay within the rate limit.
+                if self._stop.wait(1 / self.max_rate):
+                    break
+            result = self._fetch(receipt)
+            t = time.time() if now is None else now
+            with self._lock:
+                r = self.receipts.get(receipt)
+                if r is None:
+                    continue
+                if result is not None and (result.get("acknowledged") or result.get("expired")):
+                    del self.receipts[receipt]
+                    finished.append((receipt, result))
+                elif t >= r["expires"] + self.max_interval:
+                    # Long past expiry and still not answering, give up on it.
+                    del self.receipts[receipt]
+                else:
+                    r["interval"] = min(self.max_interval, r["interval"] * 2)
+                    # No point polling after the last retry.
+                    r["next_poll"] = min(t + r["interval"], max(t + self.min_interval, r["expires"]))
+                METRICS.set("receipts_outstanding", len(self.receipts))
+        for receipt, result in finished:
+            if result.get("acknowledged"):
+                METRICS.incr("receipts_acknowledged_total")
+                print(
+                    f"Emergency alert {receipt} acknowledged by {result.get('acknowledged_by_device') or result.get('acknowledged_by')}."
+                )
+            else:
+                METRICS.incr("receipts_expired_total")
+                print(f"Emergency alert {receipt} expired unacknowledged.")
+        return finished
+
+    def _fetch(self, receipt):
+        # Returns the receipt status dict, or None if the request failed.
+        try:
+            response = self._session.get(
+                RECEIPT_URL.format(receipt),
+                params={"token": self.token},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"Exception occurred polling receipt {receipt}: {e}")
+            return None
+
+    def cancel(self, tag):
+        # Cancels retries of every outstanding message with tag. Returns True if Pushover accepted it.
+        with self._lock:
+            receipts = [k for k, r in self.receipts.items() if r["tag"] == tag]
+        if not receipts:
+            return True
+        try:
+            response = self._session.post(
+                CANCEL_BY_TAG_URL.format(tag),
+                data={"token": self.token},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Exception occurred cancelling emergency alerts tagged {tag}: {e}")
+            return False
+        with self._lock:
+            for receipt in receipts:
+                self.receipts.pop(receipt, None)
+            METRICS.set("receipts_outstanding", len(self.receipts))
+        print(f"Cancelled {len(receipts)} emergency alert(s) tagged {tag}.")
+        return True
+
+    def outstanding(self, tag=None):
+        with self._lock:
+            return sum(1 for r in self.receipts.values() if tag is None or r["tag"] == tag)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            with self._lock:
+                next_poll = min((r["next_poll"] for r in self.receipts.values()), default=None)
+            timeout = None if next_poll is None else max(0, next_poll - time.time())
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def start(self):
+        # Polls on a background thread until stop().
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._session.close()
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --emergency option of app.aurorawatchuk_alerts, or import: from app.receipts import ReceiptTracker."
+    )
+
+
+if __name__ == "__main__":
+    main()
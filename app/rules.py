@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+# Alert rule language.
+# Rules are compiled once into predicates over per-site rank bitmasks. The bitmasks are built once
+# per cycle and shared by every rule, so evaluating a rule is a handful of integer operations.
+#
+# Examples:
+#   at least 2 sites amber
+#   alerting site red or any site red for 10 minutes
+#   all sites yellow; ignore site site:AWN:SUM
+#
+# Grammar, keywords are case insensitive:
+#   rule      := statement (";" statement)*
+#   statement := "ignore" ("site" | "sites") SITE ("," SITE)* | expr
+#   expr      := term ("or" term)*
+#   term      := factor ("and" factor)*
+#   factor    := "not" factor | ("(" expr ")" | predicate) ["for" DURATION]
+#   predicate := "alerting" ["site"] LEVEL
+#              | "any" ["site"] LEVEL
+#              | "all" ["sites"] LEVEL
+#              | "at" "least" N ["site" | "sites"] LEVEL
+#              | "site" SITE LEVEL
+#   LEVEL     := green | yellow | amber | red, meaning at or above that status
+#   DURATION  := N ["s" | "m" | "h" | "seconds" | "minutes" | "hours"], e.g. 10m, 90s, 1 hour.
+#                No unit means seconds.
+#   SITE      := a site_id, e.g. site:AWN:SUM, or its last part, e.g. SUM
+#
+# Ignored sites are left out of every predicate in the rule.
+
+import re
+
+SCRIPT_VERSION = "rules 1.0.0"
+
+RANK_ORDER = ["green", "yellow", "amber", "red"]
+
+DURATION_UNITS = {
+    "s": 1,
+    "sec": 1,
+    "second": 1,
+    "seconds": 1,
+    "m": 60,
+    "min": 60,
+    "minute": 60,
+    "minutes": 60,
+    "h": 3600,
+    "hour": 3600,
+    "hours": 3600,
+}
+
+
+class SiteIndex:
+    # Assigns each site a bit position. Shared by every rule evaluated against the same masks.
+
+    def __init__(self):
+        self._bits = {}
+        self._next = 0
+
+    def bit(self, name):
+        # Returns the bit for a site_id or short name, allocating one if it hasn't been seen.
+        name = name.lower()
+        b = self._bits.get(name)
+        if b is None:
+            b = self._bits[name] = 1 << self._next
+            self._next += 1
+        return b
+
+    def register(self, site_id):
+        # Returns the bit for a site_id seen in a status document.
+        # Short names used by rules before the site was seen are joined to the same bit.
+        site_id = site_id.lower()
+        b = self._bits.get(site_id)
+        if b is not None:
+            return b
+        parts = site_id.split(":")
+        for i in range(1, len(parts)):
+            alias = ":".join(parts[i:])
+            if alias in self._bits:
+                b = self._bits[alias]
+                break
+        else:
+            b = self.bit(site_id)
+        self._bits[site_id] = b
+        for i in range(1, len(parts)):
+            self._bits.setdefault(":".join(parts[i:]), b)
+        return b
+
+
+class Masks:
+    # Per-cycle view of site ranks as bitmasks.
+    # levels[r] has a bit set for every site at rank r or above.
+    __slots__ = ("levels", "present", "alerting_bit", "alerting_rank")
+
+    def __init__(self, index, sites):
+        # sites is a list of dicts with site_id, status_id and alerting keys, as in a parse_snapshot() record.
+        levels = [0, 0, 0, 0]
+        present = 0
+        self.alerting_bit = 0
+        self.alerting_rank = None
+        for site in sites:
+            b = index.register(site["site_id"])
+            present |= b
+            try:
+                rank = RANK_ORDER.index(site["status_id"])
+            except ValueError:
+                # Unknown status, present but not at any level.
+                rank = -1
+            for r in range(rank + 1):
+                levels[r] |= b
+            if site.get("alerting"):
+                self.alerting_bit = b
+                self.alerting_rank = rank if rank >= 0 else None
+        self.levels = levels
+        self.present = present
+
+
+class Rule:
+    # A compiled rule. Call with (masks, now) to evaluate.
+
+    def __init__(self, text, predicate, durations):
+        self.text = text
+        self._predicate = predicate
+        self._durations = durations
+
+    def __call__(self, masks, now):
+        return self._predicate(masks, now)
+
+    def reset(self):
+        # Forgets how long 'for' conditions have been true.
+        for d in self._durations:
+            d["since"] = None
+
+
+def normalise(text):
+    # Canonical form of a rule, rules with the same canonical form behave identically.
+    return " ".join(_tokenise(text)).lower()
+
+
+def _tokenise(text):
+    return re.findall(r"[(),;]|[^\s(),;]+", text)
+
+
+class _Parser:
+    def __init__(self, text, index):
+        self.tokens = _tokenise(text)
+        self.pos = 0
+        self.index = index
+        self.ignore = 0
+        self.durations = []
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos].lower()
+        return None
+
+    def take(self, *expected):
+        token = self.peek()
+        if token is None:
+            raise ValueError(f"Rule ended early, expected {' or '.join(expected) or 'more'}.")
+        if expected and token not in expected:
+            raise ValueError(
+                f"Rule has '{self.tokens[self.pos]}' where {' or '.join(expected)} was expected."
+            )
+        self.pos += 1
+        return token
+
+    def optional(self, *words):
+        if self.peek() in words:
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self):
+        exprs = []
+        while True:
+            if self.peek() == "ignore":
+                self.take("ignore")
+                self.take("site", "sites")
+                while True:
+                    self.ignore |= self.index.bit(self.take())
+                    if not self.optional(","):
+                        break
+            else:
+                exprs.append(self.expr())
+            if self.peek() is None:
+                break
+            self.take(";")
+        if not exprs:
+            raise ValueError("Rule has no conditions.")
+        if len(exprs) == 1:
+            return exprs[0]
+        return _all(exprs)
+
+    def expr(self):
+        terms = [self.term()]
+        while self.optional("or"):
+            terms.append(self.term())
+        return terms[0] if len(terms) == 1 else _any(terms)
+
+    def term(self):
+        factors = [self.factor()]
+        while self.optional("and"):
+            factors.append(self.factor())
+        return factors[0] if len(factors) == 1 else _all(factors)
+
+    def factor(self):
+        if self.optional("not"):
+            inner = self.factor()
+            return lambda m, now: not inner(m, now)
+        if self.optional("("):
+            p = self.expr()
+            self.take(")")
+        else:
+            p = self.predicate()
+        if self.optional("for"):
+            p = self.duration(p)
+        return p
+
+    def level(self):
+        return RANK_ORDER.index(self.take(*RANK_ORDER))
+
+    def predicate(self):
+        # The ignore mask isn't known until the whole rule is parsed, so predicates read it from self.
+        word = self.take("alerting", "any", "all", "at", "site")
+        if word == "alerting":
+            self.optional("site")
+            level = self.level()
+            return lambda m, now: (
+                m.alerting_rank is not None
+                and m.alerting_rank >= level
+                and not m.alerting_bit & self.ignore
+            )
+        if word == "any":
+            self.optional("site")
+            level = self.level()
+            return lambda m, now: m.levels[level] & ~self.ignore != 0
+        if word == "all":
+            self.optional("sites")
+            level = self.level()
+
+            def _all_sites(m, now):
+                present = m.present & ~self.ignore
+                return present != 0 and m.levels[level] & present == present
+
+            return _all_sites
+        if word == "at":
+            self.take("least")
+            token = self.take()
+            if not token.isdigit():
+                raise ValueError(f"Rule has '{token}' where a number of sites was expected.")
+            n = int(token)
+            self.optional("site", "sites")
+            level = self.level()
+            return lambda m, now: (m.levels[level] & ~self.ignore).bit_count() >= n
+        # site SITE LEVEL
+        b = self.index.bit(self.take())
+        level = self.level()
+        return lambda m, now: m.levels[level] & b & ~self.ignore != 0
+
+    def duration(self, inner):
+        token = self.take()
+        match = re.fullmatch(r"(\d+)([a-z]*)", token)
+        if match is None:
+            raise ValueError(f"Rule has '{token}' where a duration was expected.")
+        unit = match.group(2)
+        if not unit and self.peek() in DURATION_UNITS:
+            unit = self.take()
+        if unit and unit not in DURATION_UNITS:
+            raise ValueError(f"Rule duration '{token}' has no valid unit.")
+        seconds = int(match.group(1)) * DURATION_UNITS[unit or "s"]
+        d = {"since": None}
+        self.durations.append(d)
+
+        def _for(m, now):
+            if not inner(m, now):
+                d["since"] = None
+                return False
+            if d["since"] is None:
+                d["since"] = now
+            return now - d["since"] >= seconds
+
+        return _for
+
+
+def _any(ps):
+    # Every operand is evaluated, so 'for' conditions keep track of time even when short-circuiting wouldn't.
+    return lambda m, now: any([p(m, now) for p in ps])
+
+
+def _all(ps):
+    return lambda m, now: all([p(m, now) for p in ps])
+
+
+def compile_rule(text, index):
+    # Compiles rule text against a SiteIndex. Raises ValueError if the rule is not valid.
+    parser = _Parser(text, index)
+    predicate = parser.parse()
+    return Rule(normalise(text), predicate, parser.durations)
+
+
+class RuleSet:
+    # Many subscribers' rules evaluated together. Identical rules are compiled and evaluated once.
+
+    def __init__(self):
+        self.index = SiteIndex()
+        self._rules = {}  # Canonical text -> Rule.
+        self._keys = {}  # Subscriber key -> canonical text.
+
+    def add(self, key, text):
+        # Adds or replaces the rule for key. Raises ValueError if the rule is not valid.
+        canonical = normalise(text)
+        if canonical not in self._rules:
+            self._rules[canonical] = compile_rule(text, self.index)
+        self._keys[key] = canonical
+
+    def __len__(self):
+        return len(self._keys)
+
+    def evaluate(self, sites, now):
+        # Returns {key: matched} for every subscriber.
+        masks = Masks(self.index, sites)
+        results = {text: rule(masks, now) for text, rule in self._rules.items()}
+        return {key: results[text] for key, text in self._keys.items()}
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --rule option of app.aurorawatchuk_alerts, or import: from app.rules import RuleSet, compile_rule."
+    )
+
+
+if __name__ == "__main__":
+    main()
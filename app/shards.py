@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+
+# Sharded evaluation of large subscriber lists.
+# Subscribers are split across worker processes, each owning its slice of alert state and its own
+# send queue, so evaluation isn't bound by one process and the GIL. Each cycle the parent writes
+# the status once into shared memory and wakes every worker with the cycle number, so nothing
+# about the status is pickled per worker.
+# Workers report the subscribers they alert, so the parent holds everyone's alert state. A worker
+# that dies is restarted with its slice of it, and export() and load() carry it across a lease
+# failover, so neither alerts subscribers again for an event they've already been alerted for.
+
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import queue
+import struct
+import threading
+import time
+from app.subscribers import SubscriberIndex
+from app.templates import compile_templates
+
+SCRIPT_VERSION = "shards 1.0.0"
+
+# Broadcast layout: cycle number, time, normal sensitivity status, reduced sensitivity status, paused.
+# A status of -1 means None.
+BROADCAST = struct.Struct("<Qdbb?")
+
+
+def _attach(name):
+    # Attaches to the parent's shared memory. Workers are spawned, so they share the parent's
+    # resource tracker and registering the segment again is harmless; the parent unlinks it.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13.
+        return shared_memory.SharedMemory(name=name)
+
+
+def _sender(sends, notifier, counts, lock):
+    while True:
+        item = sends.get()
+        if item is None:
+            return
+        alert, recipient = item
+        try:
+            notifier.send(alert, recipient)
+            with lock:
+                counts["sent"] += 1
+        except Exception as e:
+            with lock:
+                counts["failed"] += 1
+            print(f"Alert to subscriber {recipient['name']} failed: {e}")
+
+
+def _load(indexes, saved):
+    # Restores alert state in a worker's indexes from ShardPool._saved().
+    alerted = {sub_id: (t, status) for sub_id, t, status in saved["subscribers"]}
+    for reduced, index in zip((False, True), indexes):
+        index.restore({t for r, t in saved["armed"] if r == reduced}, alerted)
+
+
+def _worker(shm_name, subscribers, conn, token, backend, senders, templates, saved):
+    # Imported here as aurorawatchuk_alerts imports this module.
+    from app.notify import NullNotifier, PushoverNotifier
+
+    shm = _attach(shm_name)
+    # Only subscribers whose alert state changes are touched each cycle.
+    indexes = [
+        SubscriberIndex([sub for sub in subscribers if not sub["reduced_sensitivity"]]),
+        SubscriberIndex([sub for sub in subscribers if sub["reduced_sensitivity"]]),
+    ]
+    recipients = [
+        [{"name": sub["id"], "pushover_user": sub["user"]} for sub in index.subscribers]
+        for index in indexes
+    ]
+    _load(indexes, saved)
+    notifier = NullNotifier() if backend == "null" else PushoverNotifier(token, None)
+    sends = queue.Queue()
+    counts = {"sent": 0, "failed": 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=_sender, args=(sends, notifier, counts, lock), daemon=True)
+        for _ in range(senders)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            if isinstance(message, dict):
+                _load(indexes, message)
+                continue
+            seq, now, normal, reduced, paused = BROADCAST.unpack_from(shm.buf, 0)
+            normal = None if normal < 0 else normal
+            reduced = None if reduced < 0 else reduced
+            alerts = 0
+            alerted = []
+            for index, to, status in zip(indexes, recipients, (normal, reduced)):
+                due = index.cycle(status, now)
+                alerts += len(due)
+                alerted += [(index.subscribers[i]["id"], *index.state(i)) for i in due]
+                if paused:
+                    # Dropped, as for the main recipients.
+                    continue
+                # One alert per template and ttl, shared by every subscriber using them.
+                shared = {}
+                for i in due:
+                    sub = index.subscribers[i]
+                    key = (sub.get("template", "default"), sub["ttl"])
+                    alert = shared.get(key)
+                    if alert is None:
+                        alert = shared[key] = {
+                            **templates[key[0]][status],
+                            "ttl": sub["ttl"],
+                            "priority": 1 if status == 3 else None,
+                        }
+                    sends.put((alert, to[i]))
+            conn.send(
+                {
+                    "seq": seq,
+                    "evaluated": len(subscribers),
+                    "alerts": alerts,
+                    "queued": sends.qsize(),
+                    "sent": counts["sent"],
+                    "failed": counts["failed"],
+                    "alerted": alerted,
+                    "armed": [
+                        (reduced, t)
+                        for reduced, index in zip((False, True), indexes)
+                        for t in index.armed()
+                    ],
+                }
+            )
+    finally:
+        for _ in threads:
+            sends.put(None)
+        for t in threads:
+            t.join(timeout=10)
+        shm.close()
+        conn.close()
+
+
+class ShardPool:
+    def __init__(
+        self, subscribers, workers=None, token=None, backend="pushover", senders=4, templates=None
+    ):
+        # subscribers is a list from app.subscribers.load_subscribers().
+        # backend is "pushover" or "null", the latter for benchmarking.
+        # templates is from app.templates, by default just the built in default template.
+        if templates is None:
+            templates = compile_templates({})
+        workers = max(1, min(workers or os.cpu_count() or 1, len(subscribers) or 1))
+        # spawn, not fork: the parent runs threads (proxy, stream, notifiers) that fork would copy mid-flight.
+        self._ctx = multiprocessing.get_context("spawn")
+        self._shm = shared_memory.SharedMemory(create=True, size=BROADCAST.size)
+        self._seq = 0
+        self._slices = [subscribers[i::workers] for i in range(workers)]
+        self._args = (token, backend, senders, templates)
+        self._conns = [None] * workers
+        self._procs = [None] * workers
+        # Alert state reported by the workers: the (reduced_sensitivity, threshold) buckets alerted
+        # for the current event and {subscriber id: (last alert time, last alert status)}.
+        self._buckets = {
+            sub["id"]: (sub["reduced_sensitivity"], sub["threshold"]) for sub in subscribers
+        }
+        self._armed = set()
+        self._alerted = {}
+        # Set when the alert state changes, for the caller to clear once it has persisted export().
+        self.changed = False
+        for i in range(workers):
+            self._start(i)
+        self.subscribers = len(subscribers)
+        self.restarts = 0
+
+    def _start(self, i):
+        parent, child = self._ctx.Pipe()
+        p = self._ctx.Process(
+            target=_worker,
+            args=(self._shm.name, self._slices[i], child) + self._args + (self._saved(i),),
+            daemon=True,
+        )
+        p.start()
+        child.close()
+        self._conns[i] = parent
+        self._procs[i] = p
+
+    def _saved(self, i):
+        # Alert state of worker i's subscribers, as _load() takes it.
+        return {
+            "armed": sorted(self._armed),
+            "subscribers": [
+                (sub["id"], *self._alerted[sub["id"]])
+                for sub in self._slices[i]
+                if sub["id"] in self._alerted
+            ],
+        }
+
+    def export(self):
+        # Returns the alert state of every subscriber alerted for the current event, json serialisable.
+        return {
+            "armed": [list(bucket) for bucket in sorted(self._armed)],
+            "subscribers": [
+                [sub_id, t, status]
+                for sub_id, (t, status) in self._alerted.items()
+                if self._buckets.get(sub_id) in self._armed
+            ],
+        }
+
+    def load(self, saved):
+        # Replaces every worker's alert state with saved, from export().
+        self._armed = {tuple(bucket) for bucket in saved["armed"]}
+        self._alerted = {sub_id: (t, status) for sub_id, t, status in saved["subscribers"]}
+        for i, conn in enumerate(self._conns):
+            try:
+                conn.send(self._saved(i))
+            except OSError as e:
+                # Restarted with the state just loaded.
+                self._restart(i, e)
+        self.changed = False
+
+    def _restart(self, i, error):
+        # Replaces a worker that has died, with its subscribers' alert state as last reported.
+        # Anything it alerted in a cycle it didn't report back may be alerted again.
+        print(f"Subscriber worker {i} failed, restarting it: {error!r}")
+        self._conns[i].close()
+        if self._procs[i].is_alive():
+            self._procs[i].kill()
+        self._procs[i].join(5)
+        self._start(i)
+        self.restarts += 1
+
+    @property
+    def workers(self):
+        return len(self._procs)
+
+    def cycle(self, status_normal, status_reduced, now=None, paused=False):
+        # Evaluates every subscriber against the statuses. Returns totals across shards:
+        # evaluated, alerts raised this cycle, queued (not yet sent), sent and failed, plus seconds taken.
+        # While paused alerts are evaluated but not sent.
+        if now is None:
+            now = time.time()
+        started = time.perf_counter()
+        self._seq += 1
+        BROADCAST.pack_into(
+            self._shm.buf,
+            0,
+            self._seq,
+            now,
+            -1 if status_normal is None else status_normal,
+            -1 if status_reduced is None else status_reduced,
+            paused,
+        )
+        # A worker that has died is restarted and missing from this cycle's totals, rather than
+        # stopping alerts for everyone else.
+        failed = {}
+        for i, conn in enumerate(self._conns):
+            try:
+                conn.send(self._seq)
+            except OSError as e:
+                failed[i] = e
+        totals = {"evaluated": 0, "alerts": 0, "queued": 0, "sent": 0, "failed": 0}
+        armed = None
+        for i, conn in enumerate(self._conns):
+            if i in failed:
+                continue
+            try:
+                reply = conn.recv()
+            except (EOFError, OSError) as e:
+                failed[i] = e
+                continue
+            for k in totals:
+                totals[k] += reply[k]
+            for sub_id, t, status in reply["alerted"]:
+                self._alerted[sub_id] = (t, status)
+                self.changed = True
+            # Every worker sees the same statuses, so agrees on which buckets are armed.
+            armed = set(reply["armed"])
+        if armed is not None and armed != self._armed:
+            self._armed = armed
+            self.changed = True
+        for i, error in failed.items():
+            self._restart(i, error)
+        totals["seconds"] = time.perf_counter() - started
+        totals["restarts"] = self.restarts
+        return totals
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for p in self._procs:
+            p.join(timeout=15)
+        for conn in self._conns:
+            conn.close()
+        self._shm.close()
+        self._shm.unlink()
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --subscribers and --workers options of app.aurorawatchuk_alerts, or import: from app.shards import ShardPool."
+    )
+
+
+if __name__ == "__main__":
+    main()
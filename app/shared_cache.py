@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# Shared fetch cache for several instances on one host.
+# The last all-site-status.xml response and its parsed snapshot are kept in a file protected by a lock.
+# The first instance to find the file stale fetches, the others wait for it and read its copy,
+# so AWUK sees one request per interval however many instances are running. Requires a POSIX system.
+
+import fcntl
+import json
+import os
+import time
+from app.aurorawatchuk import parse_snapshot
+
+SCRIPT_VERSION = "shared_cache 1.0.0"
+
+
+class SharedFetchCache:
+    def __init__(self, path, max_age):
+        # path is the cache file, path + ".lock" is used as the lock file.
+        # max_age is seconds before the cached response is considered stale.
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.max_age = max_age
+
+    def get(self, fetch, now=None):
+        # Returns (content, record) for a response no older than max_age, calling fetch() if needed.
+        # fetch() returns all-site-status.xml content or None, record is from parse_snapshot().
+        # Returns (None, None) if the cache is stale and the fetch failed.
+        if now is None:
+            now = time.time()
+        with open(self.lock_path, "a") as lock:
+            # Fast path, readers share the lock.
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            entry = self._read()
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            if self._fresh(entry, now):
+                return entry["content"], entry["record"]
+            # Stale, only one instance fetches.
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Another instance may have fetched while we waited for the lock.
+                entry = self._read()
+                if self._fresh(entry, now):
+                    return entry["content"], entry["record"]
+                content = fetch()
+                if content is None:
+                    return None, None
+                record = parse_snapshot(content)
+                self._write(content, record, time.time())
+                return content, record
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _fresh(self, entry, now):
+        return entry is not None and now - entry["fetched"] < self.max_age
+
+    def _read(self):
+        # Returns the cached entry, or None if there isn't a readable one.
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        header, sep, content = data.partition(b"\n")
+        if not sep:
+            return None
+        try:
+            meta = json.loads(header)
+        except ValueError:
+            return None
+        return {"fetched": meta["fetched"], "record": meta["record"], "content": content}
+
+    def _write(self, content, record, fetched):
+        # One line of json metadata followed by the raw response.
+        # Written to a temporary file and renamed into place so a reader never sees a partial file.
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps({"fetched": fetched, "record": record}).encode())
+            f.write(b"\n")
+            f.write(content)
+        os.replace(tmp, self.path)
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --shared-cache option of app.aurorawatchuk_alerts, or import: from app.shared_cache import SharedFetchCache."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+# Multiple space weather sources combined into one status.
+# Each source is polled on its own thread at its own interval, with its own timeout, circuit breaker
+# and cached last reading, so a slow or failing feed never delays the others or the check loop.
+# Readings are normalised to the same 0-3 rank as process_status_ids() and combined by a policy:
+#   max      highest rank of any source, alert if any source says so.
+#   min      lowest rank, alert only if every source agrees.
+#   median   middle rank, the low middle with an even number of sources.
+#   primary  the first source's rank while it is fresh, otherwise max of the rest.
+# Readings older than a source's max_age are ignored.
+
+import json
+import statistics
+import threading
+import time
+import requests
+from app.aurorawatchuk import read_body
+from app.breaker import CircuitBreaker
+
+SCRIPT_VERSION = "sources 1.0.0"
+
+# NOAA SWPC planetary K index, three hourly with provisional updates.
+KP_URL = "https://services.swpc.noaa.gov/products/noaa-planetary-k-index.json"
+
+# Kp at or above which each rank applies: yellow, amber, red.
+# Roughly where aurora becomes possible, likely and widely visible from the UK.
+KP_THRESHOLDS = (5, 6, 7)
+
+# Sent to NOAA. AWUK_HEADERS is AWUK's own request for its API, not for anyone else's.
+KP_HEADERS = {"accept": "application/json"}
+
+POLICIES = ("max", "min", "median", "primary")
+
+
+class Source:
+    # A status source. fetch() returns raw data or None on failure, rank(raw) returns 0-3 or None.
+    # A source with interval None isn't polled, its readings are recorded by the caller.
+    # label names the source in alerts, by default name.
+
+    def __init__(
+        self, name, fetch=None, rank=None, interval=None, timeout=10, max_age=None, label=None
+    ):
+        self.name = name
+        self.label = label or name
+        self.fetch = fetch
+        self.rank = rank
+        self.interval = interval
+        self.timeout = timeout
+        # Readings stay usable for two polls by default, so one missed poll doesn't drop the source.
+        self.max_age = max_age if max_age is not None else 2 * (interval or 300)
+        self.breaker = CircuitBreaker(base_delay=interval or 300, max_delay=3600)
+        self.reading = None  # (rank, time)
+
+    def poll(self, now=None):
+        # Fetches and ranks once through the breaker. Returns the rank, or None if nothing new.
+        if now is None:
+            now = time.time()
+        raw = self.breaker.call(self.fetch, now)
+        if raw is None:
+            return None
+        try:
+            rank = self.rank(raw)
+        except Exception as e:
+            print(f"Source {self.name} returned data that could not be ranked: {e}")
+            return None
+        if rank is not None:
+            self.reading = (rank, now)
+        return rank
+
+
+def kp_rank(raw, thresholds=KP_THRESHOLDS):
+    # Ranks the latest Kp value in a NOAA planetary K index document.
+    # Handles both the list of rows format, first row a header, and the list of objects format.
+    rows = json.loads(raw)
+    if not rows:
+        return None
+    latest = rows[-1]
+    kp = float(latest["Kp"] if isinstance(latest, dict) else latest[1])
+    return sum(1 for t in thresholds if kp >= t)
+
+
+def kp_source(url=KP_URL, thresholds=KP_THRESHOLDS, interval=900, timeout=10):
+    # Returns a Source polling a Kp index JSON feed.
+    session = requests.Session()
+
+    def fetch():
+        try:
+            response = session.get(
+                url, headers=KP_HEADERS, timeout=timeout, stream=True
+            )
+            try:
+                response.raise_for_status()
+                return read_body(response, "kp", max_time=timeout)[0]
+            finally:
+                response.close()
+        except Exception as e:
+            print(f"Exception occurred fetching Kp index: {e}")
+            return None
+
+    return Source(
+        "kp",
+        fetch,
+        lambda raw: kp_rank(raw, thresholds),
+        interval=interval,
+        timeout=timeout,
+        label="NOAA Kp index",
+    )
+
+
+def combine(ranks, policy):
+    # Combines a list of ranks, primary first, by policy. Returns None if there are none.
+    if not ranks or all(r is None for r in ranks):
+        return None
+    if policy == "primary":
+        if ranks[0] is not None:
+            return ranks[0]
+        policy = "max"
+    present = [r for r in ranks if r is not None]
+    if policy == "max":
+        return max(present)
+    if policy == "min":
+        return min(present)
+    if policy == "median":
+        return statistics.median_low(present)
+    raise ValueError(f"Unknown combining policy {policy}.")
+
+
+class Aggregator:
+    def __init__(self, sources, policy="max"):
+        # sources is a list of Source, the first being primary for the primary policy.
+        if policy not in POLICIES:
+            raise ValueError(f"Policy must be one of {', '.join(POLICIES)}.")
+        self.sources = {s.name: s for s in sources}
+        self.order = [s.name for s in sources]
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def record(self, name, rank, now=None):
+        # Records a reading for a source the caller fetches itself.
+        if rank is None:
+            return
+        with self._lock:
+            self.sources[name].reading = (rank, time.time() if now is None else now)
+
+    def readings(self, now=None):
+        # Returns {name: (rank, age)} for every source with a reading, stale or not.
+        if now is None:
+            now = time.time()
+        with self._lock:
+            return {
+                name: (s.reading[0], now - s.reading[1])
+                for name, s in self.sources.items()
+                if s.reading is not None
+            }
+
+    def fresh(self, now=None):
+        # Returns {label: rank} for every source with a fresh reading, in source order.
+        if now is None:
+            now = time.time()
+        with self._lock:
+            return {
+                s.label: s.reading[0]
+                for s in (self.sources[name] for name in self.order)
+                if s.reading is not None and now - s.reading[1] <= s.max_age
+            }
+
+    def status(self, now=None, override=None):
+        # Combined rank of the fresh readings, or None if there aren't any.
+        # override is {name: rank} to use in place of those sources' ranks, keeping their reading
+        # times, e.g. to combine the other sources with each sensitivity of AWUK.
+        if now is None:
+            now = time.time()
+        override = override or {}
+        ranks = []
+        with self._lock:
+            for name in self.order:
+                s = self.sources[name]
+                fresh = s.reading is not None and now - s.reading[1] <= s.max_age
+                if not fresh:
+                    ranks.append(None)
+                else:
+                    ranks.append(override[name] if name in override else s.reading[0])
+        return combine(ranks, self.policy)
+
+    def _run(self, source):
+        while not self._stop.is_set():
+            source.poll()
+            self._stop.wait(source.interval)
+
+    def start(self):
+        # Starts a polling thread for every source with an interval.
+        for s in self.sources.values():
+            if s.interval is not None and s.fetch is not None:
+                t = threading.Thread(target=self._run, args=(s,), daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout=None):
+        # Stops polling. A fetch in progress is left to time out on its own if it outlasts timeout.
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --kp and --combine options of app.aurorawatchuk_alerts, or import: from app.sources import Aggregator, Source, kp_source."
+    )
+
+
+if __name__ == "__main__":
+    main()
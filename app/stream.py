@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+# Push-based status change stream.
+# Publishes status change events to local subscribers as Server-Sent Events.
+# All connections are served by one asyncio loop on a background thread,
+# so thousands of idle subscribers cost a socket and a small buffer each.
+#
+# GET /events   text/event-stream. Send a Last-Event-ID header, or ?last_event_id=N,
+#               to resume after a disconnect. Events still in the history are replayed first.
+
+import asyncio
+from collections import deque
+import itertools
+import json
+import threading
+from urllib.parse import parse_qs, urlsplit
+from app.aurorawatchuk import STATUS_TEXT
+
+SCRIPT_VERSION = "stream 1.0.0"
+
+# Events kept for resuming subscribers.
+DEFAULT_HISTORY = 1000
+# Events buffered per subscriber. A subscriber that falls this far behind is disconnected,
+# it can resume with its last event id.
+DEFAULT_CLIENT_BUFFER = 64
+# Seconds between keepalive comments, stops idle connections being dropped by middleboxes.
+KEEPALIVE_INTERVAL = 15
+# Seconds start() waits for the event loop thread to be listening.
+STARTUP_TIMEOUT = 10
+
+
+def change_events(prev_status, status, prev_sites, sites):
+    # Compares two cycles and returns a list of (event type, data) for what changed.
+    # prev_sites and sites are {site_id: status_id} dicts.
+    events = []
+    if status != prev_status:
+        events.append(
+            (
+                "status",
+                {
+                    "from": prev_status,
+                    "to": status,
+                    "status_text": STATUS_TEXT[status] if status is not None else None,
+                },
+            )
+        )
+    for site_id, status_id in sites.items():
+        if prev_sites.get(site_id) != status_id:
+            events.append(
+                (
+                    "site",
+                    {
+                        "site_id": site_id,
+                        "from": prev_sites.get(site_id),
+                        "to": status_id,
+                    },
+                )
+            )
+    return events
+
+
+class _Client:
+    __slots__ = ("queue", "task")
+
+    def __init__(self, queue, task):
+        self.queue = queue
+        self.task = task
+
+
+class ChangeStream:
+    # Fans events out to Server-Sent Events subscribers.
+    # publish() may be called from any thread.
+
+    def __init__(self, history=DEFAULT_HISTORY, client_buffer=DEFAULT_CLIENT_BUFFER):
+        self.client_buffer = client_buffer
+        self.history = deque(maxlen=history)
+        self.clients = set()
+        self.dropped = 0  # Subscribers disconnected for falling behind.
+        self._ids = itertools.count(1)
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self._thread = None
+
+    def start(self, port, host="127.0.0.1"):
+        # Starts the event loop thread and listens for subscribers. Returns the bound port.
+        # Raises OSError if the port can't be bound, RuntimeError if the loop doesn't start in time.
+        ready = threading.Event()
+        errors = []
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._server = self._loop.run_until_complete(
+                    asyncio.start_server(self._handle, host, port, backlog=1024)
+                )
+                self._loop.create_task(self._keepalive())
+            except Exception as e:
+                errors.append(e)
+                return
+            finally:
+                ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        if not ready.wait(STARTUP_TIMEOUT):
+            raise RuntimeError(f"Change stream did not start within {STARTUP_TIMEOUT} seconds.")
+        if errors:
+            self._thread.join()
+            self._loop.close()
+            raise errors[0]
+        port = self._server.sockets[0].getsockname()[1]
+        print(f"Change stream listening on http://{host}:{port}/events")
+        return port
+
+    def stop(self):
+        # Disconnects every subscriber and stops the event loop thread.
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(10)
+        self._loop.close()
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def publish(self, event_type, data):
+        # Queues an event for every subscriber.
+        self._loop.call_soon_threadsafe(self._publish, event_type, data)
+
+    def _publish(self, event_type, data):
+        event_id = next(self._ids)
+        message = (
+            f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+        ).encode()
+        self.history.append((event_id, message))
+        self._broadcast(message)
+
+    def _broadcast(self, message):
+        for client in list(self.clients):
+            try:
+                client.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Backpressure: don't let one slow subscriber buffer without bound.
+                self.clients.discard(client)
+                self.dropped += 1
+                client.task.cancel()
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            self._broadcast(b": keepalive\n\n")
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+            writer.close()
+            return
+        lines = request.decode("latin-1").split("\r\n")
+        parts = lines[0].split(" ")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        url = urlsplit(parts[1]) if len(parts) == 3 else None
+        if url is None or parts[0] != "GET" or url.path != "/events":
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await _close(writer)
+            return
+        last_event_id = headers.get("last-event-id")
+        if last_event_id is None:
+            last_event_id = parse_qs(url.query).get("last_event_id", [None])[0]
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+        )
+        # Replay missed events, then register for new ones.
+        # Both happen without yielding to the loop so no event can fall between them.
+        if last_event_id is not None and last_event_id.isdigit():
+            for event_id, message in self.history:
+                if event_id > int(last_event_id):
+                    writer.write(message)
+        client = _Client(asyncio.Queue(maxsize=self.client_buffer), asyncio.current_task())
+        self.clients.add(client)
+        try:
+            while True:
+                writer.write(await client.queue.get())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(client)
+            writer.transport.abort()
+
+
+async def _close(writer):
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --stream-port option of app.aurorawatchuk_alerts, or import: from app.stream import ChangeStream."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# Subscriber lists, for alerting many Pushover users each with their own settings.
+# A subscriber file is json lines, one subscriber per line:
+#   {"id": "alice", "user": "<pushover user key>", "threshold": 2}
+#   {"id": "bob", "user": "<pushover user key>", "threshold": 3, "alert_interval": 7200, "reduced_sensitivity": true}
+#   {"id": "carys", "user": "<pushover user key>", "threshold": 2, "template": "cy"}
+# alert_interval defaults to one hour, ttl to four hours, reduced_sensitivity to false and template,
+# a name from the --templates file (see app/templates.py), to "default".
+
+import heapq
+import json
+import re
+import time
+
+SCRIPT_VERSION = "subscribers 1.0.0"
+
+DEFAULTS = {
+    "alert_interval": 3600,
+    "ttl": 14400,
+    "reduced_sensitivity": False,
+    "template": "default",
+}
+
+
+def validate_subscriber(sub):
+    # Returns a subscriber dict with defaults filled in. Raises ValueError if it is not valid.
+    if not isinstance(sub, dict):
+        raise ValueError("Subscriber must be a json object.")
+    sub = {**DEFAULTS, **sub}
+    if "id" not in sub:
+        raise ValueError("Subscriber has no id.")
+    if not isinstance(sub.get("user"), str) or not re.fullmatch(r"[a-z0-9]{30}", sub["user"]):
+        raise ValueError(
+            f"Subscriber {sub['id']} user key not valid. Only a-z, 0-9, 30 characters."
+        )
+    if sub.get("threshold") not in (1, 2, 3):
+        raise ValueError(f"Subscriber {sub['id']} threshold must be between 1 and 3.")
+    if not isinstance(sub["alert_interval"], int) or sub["alert_interval"] <= 0:
+        raise ValueError(f"Subscriber {sub['id']} alert interval must be an integer > 0.")
+    if not isinstance(sub["ttl"], int) or not 1 <= sub["ttl"] <= 31536000:
+        raise ValueError(f"Subscriber {sub['id']} ttl must be between 1 and 31536000.")
+    if not isinstance(sub["reduced_sensitivity"], bool):
+        raise ValueError(f"Subscriber {sub['id']} reduced_sensitivity must be true or false.")
+    if not isinstance(sub["template"], str):
+        raise ValueError(f"Subscriber {sub['id']} template must be a string.")
+    return sub
+
+
+def load_subscribers(path, templates=None):
+    # Returns a list of subscriber dicts from a json lines file. Raises ValueError if any line is not valid.
+    # templates, from app.templates, if given is checked to have every subscriber's template.
+    subscribers = []
+    ids = set()
+    try:
+        with open(path) as f:
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    sub = validate_subscriber(json.loads(line))
+                except ValueError as e:
+                    raise ValueError(f"Subscriber file line {n}: {e}")
+                if templates is not None and sub["template"] not in templates:
+                    raise ValueError(
+                        f"Subscriber file line {n}: template {sub['template']} not found."
+                    )
+                if sub["id"] in ids:
+                    raise ValueError(f"Subscriber file line {n}: duplicate id {sub['id']}.")
+                ids.add(sub["id"])
+                subscribers.append(sub)
+    except OSError as e:
+        raise ValueError(f"Could not read subscriber file. {e}")
+    return subscribers
+
+
+class SubscriberIndex:
+    # Alert state for subscribers sharing one status, indexed so a cycle only touches subscribers
+    # that are alerted, rather than calling should_alert() on each. Decisions are the same as
+    # should_alert() per subscriber:
+    #   - status below threshold resets a subscriber's alert state.
+    #   - status at or above threshold alerts if the subscriber isn't yet alerted for the event,
+    #     status has risen above the last status alerted, or alert_interval has passed since.
+    # Subscribers are bucketed by threshold. Every subscriber in a bucket sees the same status, so
+    # a bucket is alerted for an event ("armed") or reset as a whole, and a reset is O(1) however
+    # many subscribers it holds. Within an armed bucket subscribers are grouped by the status last
+    # alerted, for escalations, with a heap of when each can next be re-alerted.
+
+    def __init__(self, subscribers):
+        # subscribers is a list of subscriber dicts, all evaluated against the same status.
+        self.subscribers = subscribers
+        self._last_time = [0] * len(subscribers)
+        self._last_status = [0] * len(subscribers)
+        # Bumped each time a subscriber is alerted, heap entries with an older version are stale.
+        self._version = [0] * len(subscribers)
+        self._buckets = {t: _Bucket() for t in (1, 2, 3)}
+        for i, sub in enumerate(subscribers):
+            self._buckets[sub["threshold"]].members.append(i)
+        self.touched = 0  # Subscribers alerted, and stale heap entries, last cycle.
+
+    def state(self, i):
+        # Returns (last alert time, last alert status) for subscriber i, as should_alert() keeps them.
+        if not self._buckets[self.subscribers[i]["threshold"]].armed:
+            return 0, 0
+        return self._last_time[i], self._last_status[i]
+
+    def armed(self):
+        # Returns the thresholds whose subscribers are alerted for the current event.
+        return {t for t, bucket in self._buckets.items() if bucket.armed}
+
+    def restore(self, armed, saved):
+        # Replaces all alert state. armed is a set of thresholds as from armed(), saved is
+        # {subscriber id: (last alert time, last alert status)} for their subscribers. A subscriber
+        # in an armed bucket without saved state, added since it was saved, is due at once.
+        for threshold, bucket in self._buckets.items():
+            bucket.reset()
+            if threshold not in armed:
+                continue
+            bucket.armed = True
+            for i in bucket.members:
+                sub = self.subscribers[i]
+                if sub["id"] in saved:
+                    last_time, last_status = saved[sub["id"]]
+                    due = last_time + sub["alert_interval"]
+                else:
+                    last_time, last_status, due = 0, threshold, 0
+                self._last_time[i] = last_time
+                self._last_status[i] = last_status
+                self._version[i] += 1
+                bucket.levels[last_status].add(i)
+                bucket.due.append((due, self._version[i], i))
+            heapq.heapify(bucket.due)
+
+    def cycle(self, status, now=None):
+        # Returns the indexes of subscribers to alert for status, updating their state.
+        if now is None:
+            now = time.time()
+        self.touched = 0
+        if status is None:
+            return []
+        alerts = []
+        for threshold, bucket in self._buckets.items():
+            if threshold > status:
+                if bucket.armed:
+                    bucket.reset()
+                continue
+            if not bucket.armed:
+                # First alert of an event, for everyone in the bucket.
+                bucket.armed = True
+                bucket.levels[status] = set(bucket.members)
+                for i in bucket.members:
+                    self._last_time[i] = now
+                    self._last_status[i] = status
+                    self._version[i] += 1
+                bucket.due = [
+                    (now + self.subscribers[i]["alert_interval"], self._version[i], i)
+                    for i in bucket.members
+                ]
+                heapq.heapify(bucket.due)
+                alerts += bucket.members
+                continue
+            # Escalation, a whole group at a time. Their old heap entries go stale.
+            for level in range(1, status):
+                group = bucket.levels[level]
+                if not group:
+                    continue
+                bucket.levels[level] = set()
+                for i in group:
+                    self._last_time[i] = now
+                    self._last_status[i] = status
+                    self._version[i] += 1
+                    heapq.heappush(
+                        bucket.due,
+                        (now + self.subscribers[i]["alert_interval"], self._version[i], i),
+                    )
+                bucket.levels[status] |= group
+                alerts += group
+            # Alert interval passed. Pushed back at least an interval on, so never popped twice.
+            while bucket.due and bucket.due[0][0] <= now:
+                _, version, i = heapq.heappop(bucket.due)
+                if version != self._version[i]:
+                    # Alerted again since.
+                    self.touched += 1
+                    continue
+                bucket.levels[self._last_status[i]].discard(i)
+                bucket.levels[status].add(i)
+                self._last_time[i] = now
+                self._last_status[i] = status
+                self._version[i] += 1
+                heapq.heappush(
+                    bucket.due, (now + self.subscribers[i]["alert_interval"], self._version[i], i)
+                )
+                alerts.append(i)
+        self.touched += len(alerts)
+        return alerts
+
+
+class _Bucket:
+    def __init__(self):
+        self.members = []  # Subscriber indexes.
+        self.reset()
+
+    def reset(self):
+        self.armed = False
+        self.levels = {s: set() for s in (1, 2, 3)}  # Last status alerted -> subscriber indexes.
+        self.due = []  # (next alert time, version, index) heap.
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --subscribers option of app.aurorawatchuk_alerts, or import: from app.subscribers import load_subscribers."
+    )
+
+
+if __name__ == "__main__":
+    main()
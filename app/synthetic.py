@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+# Synthetic all-site-status.xml documents, for tests, benchmarks and backtests at any network size.
+# A storm is a sequence of documents with activity rising to a peak and dying away. Each site sees
+# the storm shifted by a fixed offset, sites further "south" seeing it weaker, plus some noise, so
+# sites disagree the way real ones do. The alerting site is chosen by placement:
+#   first    the first site, as AWUK's alerting site is fixed.
+#   last     the last site, so the whole document is scanned to find it.
+#   random   a different site each document.
+#   max      the most active site.
+#   none     no alerting site, as when AWUK has none.
+#
+# Write a storm to files for app.backtest: python -m app.synthetic --sites 500 DIR
+
+import argparse
+from datetime import datetime, timezone
+import math
+import os
+import random
+
+SCRIPT_VERSION = "synthetic 1.0.0"
+
+STATUS_IDS = ["green", "yellow", "amber", "red"]
+
+PLACEMENTS = ("first", "last", "random", "max", "none")
+
+# Weights of green, yellow, amber and red in a quiet spell.
+QUIET = (0.9, 0.08, 0.015, 0.005)
+
+API_URL = "http://aurorawatch-api.lancs.ac.uk/0.2.5"
+
+
+def site_ids(sites, project="SYN"):
+    # Returns (site_id, site_url) for each of sites sites.
+    return [
+        (f"site:{project}:S{i:05d}", f"{API_URL}/project/{project.lower()}/s{i:05d}.xml")
+        for i in range(sites)
+    ]
+
+
+def document(statuses, alerting=None, updated=0, project="SYN"):
+    # Returns an all-site-status.xml document, as bytes, for a list of statuses 0 to 3, one per site.
+    # alerting is the index of the alerting site, None for none. updated is a unix time.
+    stamp = datetime.fromtimestamp(updated, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+0000")
+    lines = [
+        '<current_status api_version="0.2.5">',
+        f"<updated><datetime>{stamp}</datetime></updated>",
+    ]
+    for i, ((site_id, site_url), status) in enumerate(zip(site_ids(len(statuses), project), statuses)):
+        flag = 'alerting="true" ' if i == alerting else ""
+        lines.append(
+            f'<site_status {flag}project_id="project:{project}" site_id="{site_id}" site_url="{site_url}" status_id="{STATUS_IDS[status]}"/>'
+        )
+    lines.append("</current_status>")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def place(statuses, placement, rng):
+    # Returns the index of the alerting site for placement, None for none.
+    if placement not in PLACEMENTS:
+        raise ValueError(f"Placement must be one of: {', '.join(PLACEMENTS)}.")
+    if placement == "none" or not statuses:
+        return None
+    if placement == "first":
+        return 0
+    if placement == "last":
+        return len(statuses) - 1
+    if placement == "random":
+        return rng.randrange(len(statuses))
+    return max(range(len(statuses)), key=lambda i: statuses[i])
+
+
+def snapshot(sites, weights=QUIET, placement="first", updated=0, seed=None):
+    # Returns a document with each site's status drawn independently from weights.
+    if sites < 1:
+        raise ValueError("Sites must be > 0.")
+    if len(weights) != 4 or sum(weights) <= 0:
+        raise ValueError("Weights must be four numbers, green to red, not all 0.")
+    rng = random.Random(seed)
+    statuses = rng.choices(range(4), weights=weights, k=sites)
+    return document(statuses, place(statuses, placement, rng), updated)
+
+
+def storm(
+    sites,
+    cycles=60,
+    peak=3,
+    interval=180,
+    start=0,
+    placement="first",
+    spread=1.0,
+    noise=0.3,
+    seed=None,
+):
+    # Yields (time, document) for cycles documents interval seconds apart from start.
+    # Activity rises from green to peak and back. Each site's status is the activity less an offset
+    # between 0 and spread, plus gaussian noise of standard deviation noise, rounded and clamped.
+    if sites < 1:
+        raise ValueError("Sites must be > 0.")
+    if cycles < 1:
+        raise ValueError("Cycles must be > 0.")
+    if peak not in (0, 1, 2, 3):
+        raise ValueError("Peak must be between 0 and 3.")
+    rng = random.Random(seed)
+    offsets = [spread * i / max(1, sites - 1) for i in range(sites)]
+    for n in range(cycles):
+        # Zero at both ends, peak in the middle.
+        activity = peak * math.sin(math.pi * n / max(1, cycles - 1)) ** 2
+        statuses = [
+            min(3, max(0, round(activity - offset + rng.gauss(0, noise)))) for offset in offsets
+        ]
+        t = start + n * interval
+        yield t, document(statuses, place(statuses, placement, rng), t)
+
+
+def argparser():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic AuroraWatch UK storm as all-site-status.xml files, one per check."
+    )
+    parser.add_argument("directory", help="Directory to write the files to")
+    parser.add_argument("--sites", help="Number of sites. Default is 10", type=int, default=10)
+    parser.add_argument("--cycles", help="Number of documents. Default is 60", type=int, default=60)
+    parser.add_argument("--peak", help="Highest status, 0 to 3. Default is 3", type=int, default=3)
+    parser.add_argument(
+        "--interval", help="Seconds between documents. Default is 180", type=int, default=180
+    )
+    parser.add_argument(
+        "--start",
+        help="Time of the first document, ISO 8601, UTC by default. Default is now",
+        default=None,
+    )
+    parser.add_argument(
+        "--placement",
+        help="Which site is the alerting site. Default is first",
+        choices=PLACEMENTS,
+        default="first",
+    )
+    parser.add_argument("--seed", help="Random seed, for repeatable storms", type=int, default=None)
+    parser.add_argument("-v", "--version", action="version", version=SCRIPT_VERSION)
+    return parser.parse_args()
+
+
+def main():
+    args = argparser()
+    if args.start is None:
+        start = int(datetime.now(timezone.utc).timestamp())
+    else:
+        t = datetime.fromisoformat(args.start)
+        if t.tzinfo is None:
+            t = t.replace(tzinfo=timezone.utc)
+        start = int(t.timestamp())
+    os.makedirs(args.directory, exist_ok=True)
+    written = 0
+    for t, content in storm(
+        args.sites,
+        args.cycles,
+        args.peak,
+        args.interval,
+        start,
+        args.placement,
+        seed=args.seed,
+    ):
+        with open(os.path.join(args.directory, f"{t}.xml"), "wb") as f:
+            f.write(content)
+        written += 1
+    print(f"Wrote {written} documents of {args.sites} sites to {args.directory}.")
+
+
+if __name__ == "__main__":
+    main()
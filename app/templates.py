@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Status alert message templates.
+# Templates are rendered for every status when loaded, so sending an alert is a lookup, however
+# many subscribers share a template. Each is checked against Pushover's limits at the same time, so
+# a template that would be rejected fails at startup rather than mid storm.
+#
+# Template file, json, template name -> fields:
+#   {
+#     "default": {"message": "AuroraWatch UK Status: {status}.", "url": "https://aurorawatch.lancs.ac.uk/"},
+#     "cy": {
+#       "status_text": ["GWYRDD", "MELYN", "OREN", "COCH"],
+#       "message": "Statws AuroraWatch UK: {status}.",
+#       "title": "AuroraWatch UK",
+#       "sound": ["none", "pushover", "pushover", "siren"]
+#     }
+#   }
+# message is required. title, url, url_title and sound are optional. Any of them may be a list of
+# four, one per status from green to red. {status} is replaced by the status name, from status_text
+# if given, and {level} by its number, 0 to 3. Subscribers choose a template by name, the main
+# recipient and subscribers without one get "default", built in unless the file has its own.
+
+import json
+import string
+from app.aurorawatchuk import STATUS_TEXT
+from app.pushover import SOUNDS
+
+SCRIPT_VERSION = "templates 1.0.0"
+
+# Pushover's limits, in characters.
+LIMITS = {"message": 1024, "title": 250, "url": 512, "url_title": 100}
+
+FIELDS = ("message", "title", "url", "url_title", "sound")
+
+PLACEHOLDERS = {"status", "level"}
+
+DEFAULT = {"message": "AuroraWatch UK Status: {status}."}
+
+# The built in default when other sources are combined with AWUK, as they can set the status alone.
+COMBINED_DEFAULT = {"message": "Aurora alert status: {status}."}
+
+
+def compile_template(name, template):
+    # Returns a list of four alert field dicts, one per status, with unset fields left out.
+    # Raises ValueError if the template is not valid or renders past Pushover's limits.
+    if not isinstance(template, dict):
+        raise ValueError(f"Template {name} must be a json object.")
+    unknown = set(template) - set(FIELDS) - {"status_text"}
+    if unknown:
+        raise ValueError(f"Template {name} has unknown fields: {', '.join(sorted(unknown))}.")
+    if "message" not in template:
+        raise ValueError(f"Template {name} has no message.")
+    status_text = template.get("status_text", STATUS_TEXT)
+    if (
+        not isinstance(status_text, list)
+        or len(status_text) != 4
+        or not all(isinstance(t, str) and t for t in status_text)
+    ):
+        raise ValueError(f"Template {name} status_text must be a list of four names.")
+    rendered = [{} for _ in STATUS_TEXT]
+    for field in FIELDS:
+        value = template.get(field)
+        if value is None:
+            continue
+        values = value if isinstance(value, list) else [value] * 4
+        if len(values) != 4 or not all(isinstance(v, str) for v in values):
+            raise ValueError(
+                f"Template {name} {field} must be a string or a list of four strings."
+            )
+        for status, v in enumerate(values):
+            rendered[status][field] = _render(name, field, v, status_text[status], status)
+    for status, fields in enumerate(rendered):
+        _check(name, STATUS_TEXT[status], fields)
+    return rendered
+
+
+def _render(name, field, text, status_text, level):
+    try:
+        names = {f for _, f, _, _ in string.Formatter().parse(text) if f is not None}
+    except ValueError as e:
+        raise ValueError(f"Template {name} {field} not valid. {e}")
+    if names - PLACEHOLDERS:
+        raise ValueError(
+            f"Template {name} {field} has unknown placeholders: {', '.join(sorted(names - PLACEHOLDERS))}. Only {{status}} and {{level}} are supported."
+        )
+    try:
+        return text.format(status=status_text, level=level)
+    except (ValueError, IndexError) as e:
+        raise ValueError(f"Template {name} {field} not valid. {e}")
+
+
+def _check(name, status, fields):
+    for field, limit in LIMITS.items():
+        if field in fields and not 1 <= len(fields[field]) <= limit:
+            raise ValueError(
+                f"Template {name} {field} for {status} must be between 1 and {limit} characters, is {len(fields[field])}."
+            )
+    if "url" in fields and not fields["url"].startswith("https://"):
+        raise ValueError(f"Template {name} url for {status} must start with https://.")
+    if "url_title" in fields and "url" not in fields:
+        raise ValueError(f"Template {name} url_title for {status} has no url.")
+    if "sound" in fields and fields["sound"] not in SOUNDS:
+        raise ValueError(
+            f"Template {name} sound {fields['sound']} is not a Pushover sound. Valid sounds are: {', '.join(SOUNDS)}."
+        )
+
+
+def compile_templates(templates, default=DEFAULT):
+    # Returns {name: list of four alert field dicts} for a {name: template} dict, with default
+    # added if templates has none. Raises ValueError if any template is not valid.
+    if not isinstance(templates, dict):
+        raise ValueError("Templates must be a json object of name: template.")
+    templates = {"default": default, **templates}
+    return {name: compile_template(name, t) for name, t in templates.items()}
+
+
+def load_templates(path, default=DEFAULT):
+    # Compiles the templates in a json file, with default added if the file has none.
+    # Raises ValueError if it can't be read or is not valid.
+    try:
+        with open(path) as f:
+            templates = json.load(f)
+    except OSError as e:
+        raise ValueError(f"Could not read template file. {e}")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Template file is not valid json. {e}")
+    return compile_templates(templates, default)
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --templates option of app.aurorawatchuk_alerts, or import: from app.templates import load_templates."
+    )
+
+
+if __name__ == "__main__":
+    main()
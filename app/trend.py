@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Trend-based early warning.
+# Fits a cheap trend over recent samples, either status ranks or site activity values,
+# and projects when it will reach the alert threshold.
+
+import time
+
+SCRIPT_VERSION = "trend 1.0.0"
+
+# Seconds of recent samples the trend is fitted over.
+DEFAULT_WINDOW = 1800
+# EWMA smoothing factor applied before fitting, 1 disables smoothing.
+DEFAULT_ALPHA = 0.5
+
+
+def ewma(values, alpha=DEFAULT_ALPHA):
+    # Returns the exponentially weighted moving average of values as a list.
+    result = []
+    s = None
+    for v in values:
+        s = v if s is None else alpha * v + (1 - alpha) * s
+        result.append(s)
+    return result
+
+
+def fit_trend(times, values, alpha=DEFAULT_ALPHA):
+    # Least-squares fit over EWMA-smoothed values.
+    # Returns (slope per second, fitted value at the latest time), or None if fewer than two samples.
+    n = len(times)
+    if n < 2:
+        return None
+    smoothed = ewma(values, alpha)
+    t0 = times[-1]
+    xs = [t - t0 for t in times]
+    mean_x = sum(xs) / n
+    mean_y = sum(smoothed) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    if sxx == 0:
+        return None
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, smoothed))
+    slope = sxy / sxx
+    # Fitted line evaluated at x = 0, the latest sample.
+    return slope, mean_y - slope * mean_x
+
+
+def time_to_cross(times, values, level, alpha=DEFAULT_ALPHA):
+    # Returns the projected seconds until the trend rises to level, measured from the latest sample.
+    # Returns None if the trend is flat or falling, or already at or above level.
+    fit = fit_trend(times, values, alpha)
+    if fit is None:
+        return None
+    slope, current = fit
+    if slope <= 0 or current >= level:
+        return None
+    return (level - current) / slope
+
+
+def status_eta(samples, threshold, window=DEFAULT_WINDOW):
+    # Projected seconds until status rank reaches threshold, from (time, status) samples oldest first.
+    # Only samples within window seconds of the latest are used.
+    if not samples:
+        return None
+    start = samples[-1][0] - window
+    recent = [s for s in samples if s[0] >= start]
+    return time_to_cross([s[0] for s in recent], [s[1] for s in recent], threshold)
+
+
+def activity_eta(feed, status_ids, status_name, window=DEFAULT_WINDOW):
+    # Projected seconds until site activity reaches the lower threshold for status_name,
+    # using the app.activity.ActivityFeed buffers of every site in status_ids.
+    # Status is the lowest rank across those sites, so the crossing is projected for the last of them.
+    etas = []
+    for site in status_ids or []:
+        buffer = feed.buffers.get(site["site_id"])
+        level = feed.thresholds.get(site["site_id"], {}).get(status_name)
+        if buffer is None or level is None:
+            return None
+        times, values = buffer.window(window)
+        if len(values) and values[-1] >= level:
+            # Already there, waiting on the other sites.
+            etas.append(0)
+            continue
+        eta = time_to_cross(list(times), list(values), level)
+        if eta is None:
+            return None
+        etas.append(eta)
+    if not etas:
+        return None
+    return max(etas)
+
+
+def should_warn(config, state, eta, now=None):
+    # Decides whether to send a heads-up that status is projected to reach the threshold.
+    # eta is the projected seconds to crossing from time_to_cross().
+    # Warnings stop once the threshold is reached, where should_alert() takes over,
+    # and are repeated no more often than the alert interval.
+    if state["current_status"] is None:
+        return False
+    if state["current_status"] >= config["threshold"]:
+        state["last_warning_time"] = 0
+        return False
+    if eta is None or eta > config["warning_horizon"]:
+        return False
+    if now is None:
+        now = time.time()
+    last = state.get("last_warning_time", 0)
+    if last != 0 and now - last < config["alert_interval"]:
+        return False
+    state["last_warning_time"] = now
+    return True
+
+
+def main():
+    print("This script is not intended to be run as-is.")
+    print(
+        "Enable with the --warning-horizon option of app.aurorawatchuk_alerts, or import: from app.trend import time_to_cross, should_warn."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Stress test of status processing against synthetic feeds of increasing size.
+# Each size is a synthetic storm fed through get_status_ids() at both sensitivities,
+# process_status_ids() and, for as many subscribers as sites, should_alert(). Reports the cost
+# per site of each stage and the first size where it grows past LINEAR times the cheapest per site
+# cost at any smaller size, which allows for fixed costs dominating small documents. Each size is
+# run REPEATS times and the fastest of each stage kept, so one noisy run doesn't move the knee.
+# process_status_ids() prints every site it is given; the print is patched out so the stage times
+# the function rather than formatting to stdout.
+# Not collected by pytest, run from the root of the repo: python -m tests.bench_feed [SIZES ...]
+
+import sys
+import time
+from unittest import mock
+from app.aurorawatchuk import MAX_BODY_SIZE, get_status_ids, process_status_ids
+from app.aurorawatchuk_alerts import should_alert
+from app.synthetic import storm
+
+SIZES = [10, 100, 1000, 3000, 10000, 12000, 15000]
+
+CYCLES = 20
+
+REPEATS = 5
+
+# Cost per site this many times the cheapest at a smaller size counts as no longer linear.
+LINEAR = 1.5
+
+STAGES = ["get_status_ids normal", "get_status_ids reduced", "process_status_ids", "should_alert"]
+
+
+def run(sites):
+    # Returns (largest document in bytes, {stage: seconds per document}), with None for the
+    # timings if the documents are too large to parse.
+    documents = list(storm(sites, CYCLES, placement="max", seed=1))
+    size = max(len(content) for _, content in documents)
+    configs = [{"threshold": i % 3 + 1, "alert_interval": 3600} for i in range(sites)]
+    best = None
+    with mock.patch("app.aurorawatchuk.print", lambda *args, **kwargs: None, create=True):
+        for _ in range(REPEATS):
+            totals = once(documents, configs)
+            if totals is None:
+                return size, None
+            best = totals if best is None else {k: min(best[k], totals[k]) for k in STAGES}
+    return size, {stage: seconds / CYCLES for stage, seconds in best.items()}
+
+
+def once(documents, configs):
+    # Returns {stage: total seconds} for one pass over documents, None if they are too large.
+    states = [
+        {"current_status": None, "last_alert_time": 0, "last_alert_status": 0} for _ in configs
+    ]
+    totals = dict.fromkeys(STAGES, 0.0)
+    for t, content in documents:
+        started = time.perf_counter()
+        normal = get_status_ids(False, content)
+        totals["get_status_ids normal"] += time.perf_counter() - started
+        started = time.perf_counter()
+        reduced = get_status_ids(True, content)
+        totals["get_status_ids reduced"] += time.perf_counter() - started
+        if reduced is None:
+            return None
+        started = time.perf_counter()
+        status = process_status_ids(reduced)
+        if normal:
+            process_status_ids(normal)
+        totals["process_status_ids"] += time.perf_counter() - started
+        started = time.perf_counter()
+        for config, state in zip(configs, states):
+            state["current_status"] = status
+            should_alert(config, state, t)
+        totals["should_alert"] += time.perf_counter() - started
+    return totals
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1:]] or SIZES
+    results = {}
+    sizes_bytes = {}
+    print(f"{CYCLES} documents per size, times per document, fastest of {REPEATS} runs.")
+    print(f"{'sites':>6} {'bytes':>9} " + " ".join(f"{stage:>23}" for stage in STAGES))
+    for sites in sizes:
+        size, timings = run(sites)
+        if timings is None:
+            print(f"{sites:>6} {size:>9} rejected, over the {MAX_BODY_SIZE} byte document limit.")
+            continue
+        results[sites] = timings
+        sizes_bytes[sites] = size
+        print(
+            f"{sites:>6} {size:>9} "
+            + " ".join(f"{timings[stage] * 1000:>20.3f} ms" for stage in STAGES)
+        )
+    if not results:
+        return
+    largest = max(sizes_bytes)
+    per_site = sizes_bytes[largest] / largest
+    print(
+        f"Documents are about {per_site:.0f} bytes per site, so the {MAX_BODY_SIZE} byte limit is reached at about {MAX_BODY_SIZE / per_site:.0f} sites."
+    )
+    if len(results) < 2:
+        return
+    sizes = sorted(results)
+    print("Cost per site relative to the cheapest at a smaller size:")
+    for stage in STAGES:
+        per_site = {n: results[n][stage] / n for n in sizes}
+        ratios = {
+            n: per_site[n] / min(per_site[m] for m in sizes[:i]) for i, n in enumerate(sizes) if i
+        }
+        knee = next((n for n in ratios if ratios[n] > LINEAR), None)
+        line = ", ".join(f"{n}: {ratio:.2f}x" for n, ratio in ratios.items())
+        verdict = f"stops scaling linearly at {knee} sites" if knee else "linear throughout"
+        print(f"  {stage}: {line}. {verdict.capitalize()}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Benchmark of ShardPool cycle time across worker and subscriber counts, alerts going nowhere.
+# Each run is a storm, the SCENARIO of bench_subscribers, so cycles where everyone is alerted and
+# cycles where nothing changes are both measured. Cycle time should stay flat as subscribers and
+# workers grow together, up to the number of CPUs.
+# Not collected by pytest, run from the root of the repo:
+#   python -m tests.bench_shards [SUBSCRIBERS ...] [--workers W ...]
+
+import os
+import random
+import sys
+from app.shards import ShardPool
+from tests.bench_subscribers import SCENARIO
+
+SUBSCRIBERS = [10000, 100000, 400000]
+
+USER = "b" * 30
+
+
+def subscribers(n):
+    random.seed(1)
+    return [
+        {
+            "id": i,
+            "user": USER,
+            "threshold": random.choice((1, 2, 2, 3, 3, 3)),
+            "alert_interval": random.choice((1800, 3600, 7200)),
+            "ttl": 14400,
+            "reduced_sensitivity": random.random() < 0.2,
+            "template": "default",
+        }
+        for i in range(n)
+    ]
+
+
+def run(subs, workers):
+    # Returns (mean, worst) cycle seconds over SCENARIO, and the number of workers used.
+    pool = ShardPool(subs, workers, backend="null")
+    try:
+        timings = [
+            pool.cycle(status, max(0, status - 1), now=1000 + now)["seconds"]
+            for _, status, now in SCENARIO
+        ]
+        return sum(timings) / len(timings), max(timings), pool.workers
+    finally:
+        pool.close()
+
+
+def main():
+    args = sys.argv[1:]
+    workers = [1, 2, 4, 8]
+    if "--workers" in args:
+        i = args.index("--workers")
+        workers = [int(w) for w in args[i + 1 :]]
+        args = args[:i]
+    sizes = [int(n) for n in args] or SUBSCRIBERS
+    print(f"{len(SCENARIO)} cycles per run, {os.cpu_count()} CPUs.")
+    print(f"{'subscribers':>11} {'workers':>7} {'per worker':>10} {'mean ms':>9} {'worst ms':>9}")
+    for n in sizes:
+        subs = subscribers(n)
+        for w in workers:
+            mean, worst, used = run(subs, w)
+            print(f"{n:>11} {used:>7} {n // used:>10} {mean * 1000:>9.2f} {worst * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
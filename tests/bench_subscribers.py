@@ -0,0 +1,104 @@
+# Benchmark of SubscriberIndex against calling should_alert() on every subscriber.
+# Not collected by pytest, run from the root of the repo: python -m tests.bench_subscribers [N]
+
+import random
+import sys
+import time
+from app.aurorawatchuk_alerts import should_alert
+from app.subscribers import SubscriberIndex
+
+# (name, status, time) per five minute cycle: a quiet spell, an event building to red and dying
+# away. Every subscriber is alerted on the same few cycles.
+SCENARIO = [
+    (name, status, step * 300)
+    for step, (name, status) in enumerate(
+        [("quiet", 0)] * 12
+        + [("yellow", 1)] * 6
+        + [("amber", 2)] * 12
+        + [("red", 3)] * 12
+        + [("amber", 2)] * 6
+        + [("quiet", 0)] * 12
+    )
+]
+
+# A storm at red, then checked every ten seconds an hour in. Alert intervals are spread over the
+# day, so only a few subscribers are due each cycle and a cycle should cost about its alerts.
+# Times start after 0, which should_alert() takes as never alerted.
+TRICKLE = [("red", 3, 1000)] + [("red", 3, 4600 + step * 10) for step in range(60)]
+
+
+def subscribers(n):
+    random.seed(1)
+    return [
+        {
+            "threshold": random.choice((1, 2, 2, 3, 3, 3)),
+            "alert_interval": random.choice((1800, 3600, 7200)),
+        }
+        for _ in range(n)
+    ]
+
+
+def spread_subscribers(n):
+    random.seed(1)
+    return [
+        {"threshold": random.choice((1, 2, 3)), "alert_interval": random.randint(3600, 86400)}
+        for _ in range(n)
+    ]
+
+
+def naive(subs, scenario):
+    states = [
+        {"current_status": None, "last_alert_time": 0, "last_alert_status": 0} for _ in subs
+    ]
+    timings = []
+    for name, status, now in scenario:
+        started = time.perf_counter()
+        alerts = 0
+        for sub, state in zip(subs, states):
+            state["current_status"] = status
+            if should_alert(sub, state, now):
+                alerts += 1
+        timings.append((name, time.perf_counter() - started, alerts, len(subs)))
+    return timings
+
+
+def indexed(subs, scenario):
+    index = SubscriberIndex(subs)
+    timings = []
+    for name, status, now in scenario:
+        started = time.perf_counter()
+        alerts = len(index.cycle(status, now))
+        timings.append((name, time.perf_counter() - started, alerts, index.touched))
+    return timings
+
+
+def report(title, results, rows):
+    assert [a for _, _, a, _ in results["naive"]] == [a for _, _, a, _ in results["indexed"]]
+    print(title)
+    print(f"{'cycle':>5} {'status':>7} {'alerts':>7} {'naive ms':>9} {'indexed ms':>11} {'touched':>8}")
+    for step, (a, b) in enumerate(zip(results["naive"], results["indexed"])):
+        if step in rows:
+            print(f"{step:>5} {a[0]:>7} {a[2]:>7} {a[1] * 1000:>9.2f} {b[1] * 1000:>11.3f} {b[3]:>8}")
+    for name, timings in results.items():
+        total = sum(t for _, t, _, _ in timings)
+        print(f"{name}: {total * 1000:.0f} ms in total, {total / len(timings) * 1000:.3f} ms per cycle.")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    subs = subscribers(n)
+    report(
+        f"{n} subscribers, {len(SCENARIO)} five minute cycles of a storm.",
+        {"naive": naive(subs, SCENARIO), "indexed": indexed(subs, SCENARIO)},
+        range(len(SCENARIO)),
+    )
+    subs = spread_subscribers(n)
+    report(
+        f"\n{n} subscribers, a red storm with alert intervals spread over a day, ten second cycles.",
+        {"naive": naive(subs, TRICKLE), "indexed": indexed(subs, TRICKLE)},
+        range(0, len(TRICKLE), 10),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import threading
+import pytest
+
+# numpy is optional, only needed for --site-activity.
+np = pytest.importorskip("numpy")
+
+from app.activity import ActivityBuffer, ActivityFeed, parse_site_activity
+
+SITE_XML = b"""
+<site_activity api_version="0.2.5" project_id="project:AWN" site_id="site:AWN:SUM">
+  <lower_threshold status_id="green">0</lower_threshold>
+  <lower_threshold status_id="yellow">50</lower_threshold>
+  <lower_threshold status_id="amber">100</lower_threshold>
+  <lower_threshold status_id="red">200</lower_threshold>
+  <updated><datetime>2026-01-01T00:02:00+0000</datetime></updated>
+  <activity status_id="green"><datetime>2026-01-01T00:00:00+0000</datetime><value>10.0</value></activity>
+  <activity status_id="yellow"><datetime>2026-01-01T00:01:00+0000</datetime><value>60.0</value></activity>
+  <activity status_id="amber"><datetime>2026-01-01T00:02:00+0000</datetime><value>110.0</value></activity>
+</site_activity>
+"""
+
+
+# parse_site_activity() tests.
+def test_parse_site_activity():
+    times, values, thresholds = parse_site_activity(SITE_XML)
+    assert list(times) == [1767225600.0, 1767225660.0, 1767225720.0]
+    assert list(values) == [10.0, 60.0, 110.0]
+    assert thresholds == {"green": 0, "yellow": 50, "amber": 100, "red": 200}
+
+
+def test_parse_site_activity_junk():
+    assert parse_site_activity(b"moo") == None
+
+
+# ActivityBuffer tests.
+def test_activity_buffer_wraps_and_ignores_old_samples():
+    buffer = ActivityBuffer(capacity=4)
+    assert buffer.extend([1, 2, 3], [10, 20, 30]) == 3
+    # Samples already stored are ignored.
+    assert buffer.extend([2, 3, 4, 5, 6], [20, 30, 40, 50, 60]) == 3
+    assert len(buffer) == 4
+    times, values = buffer.ordered()
+    assert list(times) == [3, 4, 5, 6]
+    assert list(values) == [30, 40, 50, 60]
+
+
+def test_activity_buffer_rolling_statistics():
+    buffer = ActivityBuffer(capacity=5)
+    buffer.extend(np.arange(7) * 60.0, [1, 5, 2, 8, 3, 4, 9])
+    # Buffer holds the last five samples: 2, 8, 3, 4, 9.
+    assert list(buffer.rolling_mean(2)) == [5.0, 5.5, 3.5, 6.5]
+    assert list(buffer.rolling_max(3)) == [8, 8, 9]
+    assert list(buffer.rate_of_change()) == [360.0, -300.0, 60.0, 300.0]
+    summary = buffer.summary(seconds=120)
+    assert summary["latest"] == 9
+    assert summary["max"] == 9
+    assert summary["mean"] == pytest.approx(16 / 3)
+    assert summary["slope"] == pytest.approx(180.0)
+
+
+# ActivityFeed tests.
+def test_activity_feed_conditional_requests(mocker):
+    class MockResponse:
+        def __init__(self, status_code, content=b"", headers=None):
+            self.status_code = status_code
+            self.content = content
+            self.headers = headers or {}
+            self.raw = mocker.Mock()
+            self.raw.stream.return_value = [content]
+
+        def close(self):
+            pass
+
+    feed = ActivityFeed()
+    get = mocker.patch.object(
+        feed._session,
+        "get",
+        side_effect=[
+            MockResponse(200, SITE_XML, {"ETag": '"abc"'}),
+            MockResponse(304),
+        ],
+    )
+    s_ids = [
+        {
+            "site_id": "site:AWN:SUM",
+            "site_url": "http://aurorawatch-api.lancs.ac.uk/0.2.5/project/awn/sum.xml",
+            "status_id": "amber",
+        }
+    ]
+    assert feed.refresh(s_ids) == 3
+    assert feed.refresh(s_ids) == 0
+    assert get.call_args.kwargs["headers"]["If-None-Match"] == '"abc"'
+    assert feed.summaries()["site:AWN:SUM"]["latest"] == 110.0
+    feed.close()
+
+
+def test_activity_feed_background_refresh(mocker):
+    # A slow site holds up neither start_refresh() nor apply().
+    release = threading.Event()
+
+    class SlowResponse:
+        status_code = 200
+        headers = {}
+
+        def __init__(self):
+            self.raw = mocker.Mock()
+            self.raw.stream.return_value = [SITE_XML]
+
+        def close(self):
+            pass
+
+    def get(*args, **kwargs):
+        release.wait(5)
+        return SlowResponse()
+
+    feed = ActivityFeed()
+    mocker.patch.object(feed._session, "get", side_effect=get)
+    s_ids = [{"site_id": "site:AWN:SUM", "site_url": "http://example.com/sum.xml"}]
+    assert feed.start_refresh(s_ids) == True
+    # Still fetching.
+    assert feed.start_refresh(s_ids) == False
+    assert feed.apply() == 0
+    assert feed.summaries() == {}
+    release.set()
+    feed._pending.result(5)
+    assert feed.apply() == 3
+    assert feed.summaries()["site:AWN:SUM"]["latest"] == 110.0
+    assert feed.start_refresh(s_ids) == True
+    feed.close()
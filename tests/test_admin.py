@@ -0,0 +1,87 @@
+import os
+import socket
+import threading
+import pytest
+from app.admin import AdminServer, request
+from app.aurorawatchuk_alerts import admin_commands
+from app.breaker import CircuitBreaker
+from app.metrics import Stopwatch
+from app.notify import Dispatcher, NullNotifier
+
+
+@pytest.fixture
+def sock(tmp_path):
+    return str(tmp_path / "admin.sock")
+
+
+# AdminServer tests.
+def test_admin_server_commands(sock):
+    server = AdminServer(sock, {"echo": lambda *words: list(words), "bad": lambda: int("x")})
+    server.start()
+    try:
+        assert request(sock, "echo moo cow") == {"ok": True, "result": ["moo", "cow"]}
+        assert request(sock, "bad")["ok"] == False
+        assert request(sock, "echo moo\nmore") == {"ok": True, "result": ["moo"]}
+        reply = request(sock, "moo")
+        assert reply["ok"] == False
+        assert "bad, echo" in reply["error"]
+        # Too many arguments.
+        assert request(sock, "bad 1")["ok"] == False
+        assert oct(os.stat(sock).st_mode & 0o777) == "0o600"
+    finally:
+        server.close()
+    assert not os.path.exists(sock)
+
+
+def test_admin_server_stale_socket(sock):
+    # Left behind by an instance that has exited.
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(sock)
+    s.close()
+    server = AdminServer(sock, {})
+    server.start()
+    try:
+        # Still listening.
+        with pytest.raises(RuntimeError):
+            AdminServer(sock, {})
+    finally:
+        server.close()
+
+
+def test_admin_server_not_a_socket(sock):
+    open(sock, "w").close()
+    with pytest.raises(ValueError):
+        AdminServer(sock, {})
+
+
+# admin_commands() tests.
+def test_admin_commands():
+    state = {"current_status": 2, "last_alert_status": 2, "last_alert_time": 0}
+    latest = {"record": {"sites": [{"site_id": "a"}]}, "pool": None}
+    wake = threading.Event()
+    watch = Stopwatch()
+    watch.start()
+    watch.lap("fetch")
+    watch.stop()
+    notifier = NullNotifier()
+    dispatcher = Dispatcher({"null": notifier}, [{"name": "me", "backends": ["null"]}])
+    commands = admin_commands(state, latest, wake, watch, dispatcher, CircuitBreaker())
+    try:
+        assert commands["state"]() == state
+        assert commands["sites"]() == [{"site_id": "a"}]
+        stats = commands["stats"]()
+        assert list(stats["stages"]) == ["fetch"]
+        assert stats["breaker"]["state"] == "closed"
+        assert stats["send_queue"] == 0
+        commands["check"]()
+        assert wake.is_set() == True
+        assert commands["pause"]() == {"paused": True, "paused_until": None}
+        dispatcher.send({"message": "moo"})
+        assert notifier.sent == 0
+        assert commands["resume"]()["paused"] == False
+        dispatcher.send({"message": "moo"})
+        assert notifier.sent == 1
+        with pytest.raises(ValueError):
+            commands["pause"]("0")
+    finally:
+        dispatcher.close()
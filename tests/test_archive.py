@@ -0,0 +1,67 @@
+import pytest
+from app import archive as archive_module
+from app.archive import Archive
+
+XML = """<current_status api_version="0.2.5">
+<updated><datetime>2026-01-01T00:{minute:02d}:00+0000</datetime></updated>
+<site_status alerting="true" project_id="project:AWN" site_id="site:AWN:SUM" site_url="http://aurorawatch-api.lancs.ac.uk/0.2.5/project/awn/sum.xml" status_id="{status}"/>
+</current_status>
+"""
+
+
+def body(minute, status="green"):
+    return XML.format(minute=minute, status=status).encode()
+
+
+# Archive tests.
+def test_archive_dedups_and_indexes_by_time(tmp_path):
+    a = Archive(str(tmp_path / "archive.db"), codec="zlib")
+    assert a.add(body(0), now=1000) == True
+    # Polled again, unchanged.
+    assert a.add(body(0), now=1300) == False
+    assert a.add(body(5), now=1600) == True
+    # Back to an earlier body.
+    assert a.add(body(0), now=1900) == False
+    runs = list(a.iter_range())
+    assert [(first, last) for first, last, _ in runs] == [(1000, 1300), (1600, 1600), (1900, 1900)]
+    assert [content for _, _, content in runs] == [body(0), body(5), body(0)]
+    stats = a.stats()
+    assert stats["bodies"] == 2
+    assert stats["runs"] == 3
+    # The run in effect at the start of the range is included, though last seen before it.
+    assert [first for first, _, _ in a.iter_range(1400, 1900)] == [1000, 1600]
+    assert a.at(1599) == body(0)
+    assert a.at(1600) == body(5)
+    assert a.at(999) == None
+    a.close()
+
+
+def test_archive_keyframes_and_reopen(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_module, "KEYFRAME", 4)
+    path = str(tmp_path / "archive.db")
+    a = Archive(path, codec="zlib")
+    for minute in range(10):
+        a.add(body(minute, "amber" if minute % 3 else "green"), now=minute * 60)
+    bases = [row[0] for row in a.conn.execute("SELECT base FROM bodies ORDER BY id")]
+    assert bases == [None, 1, 2, 3, None, 5, 6, 7, None, 9]
+    stored, raw = a.stats()["stored_bytes"], a.stats()["body_bytes"]
+    assert stored < raw / 2
+    a.close()
+    # Reopened, nothing cached, the chain continues and every body reads back.
+    a = Archive(path)
+    assert a.codec == "zlib"
+    assert a.add(body(3, "green"), now=600) == False
+    a.add(body(10, "red"), now=660)
+    assert a.conn.execute("SELECT MAX(base) FROM bodies").fetchone()[0] == 10
+    assert a.at(420) == body(7, "amber")
+    assert a.at(660) == body(10, "red")
+    a.close()
+
+
+def test_archive_zstd_unavailable(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_module, "zstd", None)
+    monkeypatch.setattr(archive_module, "zstandard", None)
+    path = str(tmp_path / "archive.db")
+    assert Archive(path).codec == "zlib"
+    with pytest.raises(RuntimeError):
+        Archive(str(tmp_path / "other.db"), codec="zstd")
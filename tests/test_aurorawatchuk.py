@@ -1,5 +1,15 @@
-from app.aurorawatchuk import get_status_ids, process_status_ids
+import gzip
+import zlib
+from app.aurorawatchuk import (
+    get_status_ids,
+    parse_snapshot,
+    parse_xml,
+    process_status_ids,
+    read_body,
+)
+from app.metrics import METRICS
 import pytest
+import requests
 
 
 @pytest.fixture
@@ -10,12 +20,18 @@ def mock_awuk_request(mocker):
         class MockXMLResponse:
             def __init__(self, content):
                 self.content = content
+                self.headers = {}
+                self.raw = mocker.Mock()
+                self.raw.stream.return_value = [content]
 
             def raise_for_status(self):
                 pass
 
+            def close(self):
+                pass
+
         return mocker.patch(
-            "app.aurorawatchuk.requests.get",
+            "app.aurorawatchuk.SESSION.get",
             return_value=MockXMLResponse(xml),
         )
 
@@ -23,7 +39,7 @@ def mock_awuk_request(mocker):
 
 
 # get_status_ids() tests.
-# Class to return mock XML responses via requests.get()
+# Class to return mock XML responses via SESSION.get()
 def test_get_status_ids_junk_xml(mock_awuk_request):
     mock_awuk_request(
         b"""
@@ -34,6 +50,15 @@ def test_get_status_ids_junk_xml(mock_awuk_request):
     assert result == None
 
 
+# HTTP error responses return None instead of raising.
+def test_get_status_ids_http_error(mocker):
+    response = mocker.Mock()
+    response.raise_for_status.side_effect = requests.HTTPError("503 Server Error")
+    mocker.patch("app.aurorawatchuk.SESSION.get", return_value=response)
+    result = get_status_ids(reduced_sensitivity=False)
+    assert result == None
+
+
 # Normal sensitivity test. Only alerting=true site should be returned.
 def test_get_status_ids_normal(mock_awuk_request):
     mock_awuk_request(
@@ -73,6 +98,94 @@ def test_get_status_ids_reduced(mock_awuk_request):
     assert result[2]["status_id"] == "brown"
 
 
+# read_body() tests.
+@pytest.mark.parametrize(
+    "encoding, compress",
+    [
+        ("gzip", lambda b: gzip.compress(b)),
+        ("deflate", lambda b: zlib.compress(b)),
+        # Raw deflate, as sent by some servers.
+        ("deflate", lambda b: zlib.compress(b, wbits=-zlib.MAX_WBITS)),
+        ("identity", lambda b: b),
+    ],
+)
+def test_read_body_decodes_in_chunks(mocker, encoding, compress):
+    body = b"<current_status>" + b"x" * 5000 + b"</current_status>"
+    wire = compress(body)
+    response = mocker.Mock()
+    response.headers = {"Content-Encoding": encoding}
+    response.raw.stream.return_value = [wire[i : i + 100] for i in range(0, len(wire), 100)]
+    before = METRICS.get("fetch_wire_bytes_total", {"source": "test"})
+    assert read_body(response, "test") == (body, len(wire), encoding)
+    assert METRICS.get("fetch_wire_bytes_total", {"source": "test"}) - before == len(wire)
+    assert METRICS.get("fetch_last_body_bytes", {"source": "test"}) == len(body)
+
+
+def test_read_body_unsupported_encoding(mocker):
+    response = mocker.Mock()
+    response.headers = {"Content-Encoding": "moo"}
+    with pytest.raises(ValueError):
+        read_body(response, "test")
+
+
+def test_read_body_size_limit(mocker):
+    # A small gzip body that expands far beyond the limit.
+    wire = gzip.compress(b"<a>" + b" " * 1000000 + b"</a>")
+    response = mocker.Mock()
+    response.headers = {"Content-Encoding": "gzip"}
+    response.raw.stream.return_value = [wire]
+    with pytest.raises(ValueError):
+        read_body(response, "test", max_size=10000)
+    # Declared length over the limit is refused before reading.
+    response.headers = {"Content-Length": "20000"}
+    with pytest.raises(ValueError):
+        read_body(response, "test", max_size=10000)
+
+
+# parse_xml() tests.
+def test_parse_xml_limits():
+    assert parse_xml(b"<a><b/></a>").tag == "a"
+    with pytest.raises(ValueError):
+        parse_xml(b"<a>" * 20 + b"</a>" * 20, max_depth=16)
+    with pytest.raises(ValueError):
+        parse_xml(b"<a>" + b" " * 100 + b"</a>", max_size=50)
+
+
+def test_parse_xml_refuses_entities():
+    laughs = b"""<?xml version="1.0"?>
+<!DOCTYPE lolz [<!ENTITY lol "lol"><!ENTITY lol2 "&lol;&lol;&lol;&lol;&lol;">]>
+<current_status>&lol2;</current_status>"""
+    with pytest.raises(ValueError):
+        parse_xml(laughs)
+    assert parse_snapshot(laughs) == None
+
+
+# parse_snapshot() tests.
+def test_parse_snapshot_marks_alerting_site():
+    record = parse_snapshot(
+        b"""
+        <current_status api_version="0.2.5">
+          <updated>
+            <datetime>2026-01-01T00:00:00+0000</datetime>
+          </updated>
+        <site_status project_id="project:SAMNET" site_id="site:SAMNET:CRK2" site_url="http://aurorawatch-api.lancs.ac.uk/0.2.5/project/samnet/crk2.xml" status_id="red"/>
+        <site_status alerting="true" project_id="project:AWN" site_id="site:AWN:SUM" site_url="http://aurorawatch-api.lancs.ac.uk/0.2.5/project/awn/sum.xml" status_id="amber"/>
+    </current_status>
+    """
+    )
+    assert record["updated"] == 1767225600.0
+    assert record["status_normal"] == 2
+    assert record["status_reduced"] == 2
+    assert [(s["site_id"], s["alerting"]) for s in record["sites"]] == [
+        ("site:SAMNET:CRK2", False),
+        ("site:AWN:SUM", True),
+    ]
+
+
+def test_parse_snapshot_junk():
+    assert parse_snapshot(b"moo") == None
+
+
 # process_status_ids() tests.
 # Invalid status ID tests.
 def test_process_status_ids_single_invalid():
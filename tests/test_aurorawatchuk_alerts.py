@@ -1,6 +1,7 @@
 import pytest
 from argparse import Namespace
-from app.aurorawatchuk_alerts import pre_checks, should_alert
+from app.aurorawatchuk_alerts import pre_checks, send_status_alert, should_alert
+from app.templates import COMBINED_DEFAULT, compile_templates
 
 
 # pre_checks() tests.
@@ -180,6 +181,24 @@ def test_pre_checks_bad_ttl():
     )
 
 
+def test_pre_checks_combine_requires_kp():
+    # Valid test data.
+    token = "abcdefghijklmnopqrstuvwxyz1234"
+    user = "abcdefghijklmnopqrstuvwxyz1234"
+    args = Namespace(
+        threshold=1,
+        alert_interval=3600,
+        check_interval=300,
+        reduced_sensitivity=False,
+        ttl=14400,
+        combine="min",
+    )
+    with pytest.raises(ValueError, match="Combine requires a second source"):
+        config = pre_checks(token, user, args)
+    args.kp = True
+    assert pre_checks(token, user, args)["combine"] == "min"
+
+
 # should_alert() tests.
 def test_should_alert_invalid_current_status():
     # Valid data.
@@ -336,3 +355,52 @@ def test_should_alert_escalation():
     now = 5
     state["current_status"] = 3
     assert should_alert(config, state, now) == True
+
+
+def test_should_alert_rule():
+    # Valid data.
+    config = {
+        "token": "abcdefghijklmnopqrstuvwxyz1234",
+        "user": "abcdefghijklmnopqrstuvwxyz1234",
+        "threshold": 3,
+        "alert_interval": 3600,
+        "check_interval": 300,
+        "reduced_sensitivity": False,
+        "ttl": 14400,
+        "rule": "at least 2 sites amber",
+    }
+    state = {
+        "current_status": 0,
+        "last_alert_status": 0,
+        "last_alert_time": 0,
+    }
+    # Rule matched, although status is below threshold.
+    now = 1
+    state["current_status"] = 2
+    state["rule_match"] = True
+    assert should_alert(config, state, now) == True
+    # Again, but too soon.
+    now = 2
+    assert should_alert(config, state, now) == False
+    # Rule no longer matches, state is reset.
+    now = 3
+    state["rule_match"] = False
+    assert should_alert(config, state, now) == False
+    assert state["last_alert_time"] == 0
+
+
+# send_status_alert() tests.
+def test_send_status_alert_names_sources(mocker):
+    dispatcher = mocker.Mock()
+    dispatcher.send.return_value = {}
+    config = {"ttl": 14400, "alert_interval": 3600}
+    template = compile_templates({}, COMBINED_DEFAULT)["default"]
+    # Kp alone sets the status.
+    state = {"sources": {"AuroraWatch UK": 0, "NOAA Kp index": 2}}
+    send_status_alert(dispatcher, config, state, 2, template=template)
+    message = dispatcher.send.call_args.args[0]["message"]
+    assert message == "Aurora alert status: AMBER. Status from NOAA Kp index."
+    state = {"sources": {"AuroraWatch UK": 2, "NOAA Kp index": 2}}
+    send_status_alert(dispatcher, config, state, 2, template=template)
+    message = dispatcher.send.call_args.args[0]["message"]
+    assert message.endswith("Status from AuroraWatch UK and NOAA Kp index.")
@@ -0,0 +1,72 @@
+from app.backtest import compress_samples, load_snapshots, replay, sweep
+
+XML = """
+<current_status api_version="0.2.5">
+  <updated>
+    <datetime>{updated}</datetime>
+  </updated>
+<site_status project_id="project:SAMNET" site_id="site:SAMNET:CRK2" site_url="http://aurorawatch-api.lancs.ac.uk/0.2.5/project/samnet/crk2.xml" status_id="{other}"/>
+<site_status alerting="true" project_id="project:AWN" site_id="site:AWN:SUM" site_url="http://aurorawatch-api.lancs.ac.uk/0.2.5/project/awn/sum.xml" status_id="{alerting}"/>
+</current_status>
+"""
+
+
+# load_snapshots() tests.
+def test_load_snapshots_sorted_by_updated(tmp_path):
+    (tmp_path / "a.xml").write_text(
+        XML.format(updated="2026-01-01T01:00:00+0000", other="red", alerting="amber")
+    )
+    (tmp_path / "b.xml").write_text(
+        XML.format(updated="2026-01-01T00:00:00+0000", other="green", alerting="yellow")
+    )
+    (tmp_path / "c.xml").write_text("moo")
+    samples = load_snapshots(sorted(tmp_path.iterdir()))
+    assert samples == [
+        (1767225600.0, 1, 0),
+        (1767229200.0, 2, 2),
+    ]
+
+
+# compress_samples() tests.
+def test_compress_samples_drops_repeated_resets_and_none():
+    samples = [
+        (0, 0, 0),
+        (1, 0, 0),
+        (2, None, None),
+        (3, 2, 0),
+        (4, 0, 0),
+        (5, 1, 0),
+    ]
+    assert compress_samples(samples, 2, False) == [(0, 0), (3, 2), (4, 0)]
+    assert compress_samples(samples, 2, True) == [(0, 0)]
+
+
+def test_compress_samples_replay_matches_uncompressed():
+    # Status cycling through all ranks, including gaps.
+    samples = [(t * 180, r, r) for t, r in enumerate([0, 1, 1, 2, 0, 0, 3, 3, None, 1] * 50)]
+    for threshold in (1, 2, 3):
+        for alert_interval in (180, 600, 3600):
+            full = replay(
+                [(s[0], s[1]) for s in samples if s[1] is not None],
+                threshold,
+                alert_interval,
+            )
+            compressed = replay(
+                compress_samples(samples, threshold, False), threshold, alert_interval
+            )
+            assert full == compressed
+
+
+# replay() tests.
+def test_replay_alert_interval_and_escalation():
+    points = [(1, 1), (2, 1), (3, 2), (4, 2), (3603, 2), (3604, 0), (3605, 1)]
+    assert replay(points, 1, 3600) == [(1, 1), (3, 2), (3603, 2), (3605, 1)]
+
+
+# sweep() tests.
+def test_sweep_in_process_and_pool_agree():
+    samples = [(t * 300, r, max(r - 1, 0)) for t, r in enumerate([0, 1, 2, 3, 2, 1] * 20)]
+    in_process = sweep(samples, [1, 2, 3], [600, 3600], workers=1)
+    pooled = sweep(samples, [1, 2, 3], [600, 3600], workers=2)
+    assert len(in_process) == 3 * 2 * 2
+    assert in_process == pooled
@@ -0,0 +1,64 @@
+from app.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LastKnownGood
+
+
+# CircuitBreaker tests.
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, base_delay=100, jitter=0)
+    fetch = lambda: None
+    breaker.call(fetch, now=0)
+    assert breaker.state == CLOSED
+    breaker.call(fetch, now=10)
+    assert breaker.state == OPEN
+    assert breaker.next_attempt == 110
+    # Backing off, fetch isn't called.
+    called = []
+    assert breaker.call(lambda: called.append(1), now=50) == None
+    assert called == []
+
+
+def test_breaker_half_open_probe():
+    breaker = CircuitBreaker(failure_threshold=1, base_delay=100, jitter=0)
+    breaker.call(lambda: None, now=0)
+    assert breaker.allow(now=100) == True
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time.
+    assert breaker.allow(now=101) == False
+    # Failed probe reopens with double the delay.
+    breaker.record_failure(now=100)
+    assert breaker.state == OPEN
+    assert breaker.next_attempt == 300
+    # Successful probe closes.
+    assert breaker.call(lambda: b"xml", now=300) == b"xml"
+    assert breaker.state == CLOSED
+    assert breaker.open_for(now=400) == 0
+
+
+def test_breaker_backoff_capped_with_jitter():
+    breaker = CircuitBreaker(failure_threshold=1, base_delay=100, max_delay=400, jitter=0.2)
+    now = 0
+    for _ in range(6):
+        breaker.allow(now=breaker.next_attempt)
+        now = breaker.next_attempt
+        breaker.record_failure(now=now)
+        assert 0.8 * 100 <= breaker.next_attempt - now <= 1.2 * 400
+
+
+def test_breaker_operator_alert():
+    breaker = CircuitBreaker(failure_threshold=1, base_delay=100, jitter=0, alert_after=600)
+    breaker.call(lambda: None, now=0)
+    assert breaker.operator_alert(now=300) == None
+    assert breaker.operator_alert(now=600) == "down"
+    # Only once per outage.
+    assert breaker.operator_alert(now=700) == None
+    breaker.call(lambda: b"xml", now=800)
+    assert breaker.operator_alert(now=800) == "up"
+    assert breaker.operator_alert(now=900) == None
+
+
+# LastKnownGood tests.
+def test_last_known_good_age():
+    last_good = LastKnownGood(max_age=600)
+    assert last_good.get(now=0) == (None, None)
+    last_good.update("value", now=100)
+    assert last_good.get(now=400) == ("value", 300)
+    assert last_good.get(now=701) == (None, None)
@@ -0,0 +1,86 @@
+from app.coalesce import Coalescer, apply_hysteresis
+
+
+# apply_hysteresis() tests.
+def test_hysteresis_first_crossing_immediate():
+    config = {"threshold": 2, "hysteresis": 3}
+    state = {}
+    assert apply_hysteresis(config, state, 0) == 0
+    # Rise to threshold takes effect at once.
+    assert apply_hysteresis(config, state, 2) == 2
+
+
+def test_hysteresis_suppresses_flapping():
+    config = {"threshold": 1, "hysteresis": 3}
+    state = {}
+    readings = [1, 2, 1, 2, 2, 2, 1, 1, 0, 0, 0]
+    effective = [apply_hysteresis(config, state, r) for r in readings]
+    assert effective == [1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 0]
+
+
+def test_hysteresis_none_passes_through():
+    config = {"threshold": 1, "hysteresis": 2}
+    state = {}
+    assert apply_hysteresis(config, state, 1) == 1
+    assert apply_hysteresis(config, state, None) == None
+    assert apply_hysteresis(config, state, 0) == 1
+
+
+# Coalescer tests.
+def test_coalescer_merges_within_window():
+    c = Coalescer(window=900)
+    # First alert is sent at once.
+    assert c.offer(3, now=0) == [(3, "")]
+    # A repeat and a fall are held.
+    assert c.offer(3, now=300) == []
+    assert c.offer(2, now=600) == []
+    assert c.flush(now=600) == []
+    assert c.flush(now=900) == [(2, " 2 updates merged: RED > AMBER.")]
+    assert c.flush(now=1200) == []
+    # Window has passed since the last send.
+    assert c.offer(2, now=1800) == [(2, "")]
+    assert c.sent == 3
+    assert c.suppressed == 2
+
+
+def test_coalescer_escalation_not_held():
+    c = Coalescer(window=900)
+    assert c.offer(1, now=0) == [(1, "")]
+    assert c.offer(1, now=300) == []
+    # Sent at once, with what was held.
+    assert c.offer(3, now=600) == [(3, " 2 updates merged: YELLOW > RED.")]
+    assert c.flush(now=900) == []
+    assert c.offer(3, now=1200) == []
+
+
+def test_coalescer_discard():
+    c = Coalescer(window=900)
+    c.offer(1, now=0)
+    c.offer(2, now=300)
+    c.discard()
+    assert c.flush(now=900) == []
+
+
+def test_coalescer_digest():
+    c = Coalescer(digest_interval=3600)
+    for t, s in [(0, 0), (600, 2), (1200, 3), (1800, 1)]:
+        c.record(s, now=t)
+    c.offer(2, now=600)
+    assert c.digest(2, now=1800) == None
+    assert (
+        c.digest(2, now=3600)
+        == "AuroraWatch UK digest, last 1h: highest RED, 20 minutes at or above AMBER, 1 alerts sent."
+    )
+    # Nothing recorded since.
+    assert c.digest(2, now=7200) == None
+
+
+def test_coalescer_digest_skips_quiet_interval():
+    c = Coalescer(digest_interval=3600)
+    for t in range(0, 3600, 300):
+        c.record(1, now=t)
+    # Below threshold throughout and no alerts.
+    assert c.digest(2, now=3600) == None
+    c.record(0, now=3600)
+    c.offer(1, now=3900)
+    assert c.digest(2, now=7200).endswith("1 alerts sent.")
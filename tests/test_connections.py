@@ -0,0 +1,220 @@
+import importlib.util
+import socket
+import sys
+import time
+from types import SimpleNamespace
+import pytest
+import app.connections
+from app.connections import DNSCache, Warmer, install, uninstall
+
+ADDR = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("192.0.2.1", 443))]
+
+
+class Resolver:
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, host, port, *args):
+        self.calls.append(host)
+        if self.fail:
+            raise socket.gaierror("Temporary failure in name resolution")
+        return ADDR
+
+
+class Session:
+    def __init__(self):
+        self.heads = []
+
+    def head(self, url, **kwargs):
+        self.heads.append(url)
+        return self
+
+    def close(self):
+        pass
+
+
+# DNSCache tests.
+def test_dns_cache_hits_until_ttl(mocker):
+    clock = mocker.patch("app.connections.time.monotonic", return_value=1000)
+    resolver = Resolver()
+    cache = DNSCache(ttl=300, resolve=resolver)
+    assert cache.getaddrinfo("example.com", 443) == ADDR
+    assert cache.getaddrinfo("example.com", 443) == ADDR
+    assert len(resolver.calls) == 1
+    clock.return_value = 1301
+    cache.getaddrinfo("example.com", 443)
+    assert len(resolver.calls) == 2
+    # Numeric addresses aren't cached.
+    cache.getaddrinfo("192.0.2.1", 443)
+    cache.getaddrinfo("192.0.2.1", 443)
+    assert len(resolver.calls) == 4
+
+
+def test_dns_cache_failures(mocker):
+    clock = mocker.patch("app.connections.time.monotonic", return_value=1000)
+    resolver = Resolver()
+    cache = DNSCache(ttl=300, negative_ttl=30, resolve=resolver)
+    resolver.fail = True
+    with pytest.raises(socket.gaierror):
+        cache.getaddrinfo("example.com", 443)
+    # Failure is cached too.
+    with pytest.raises(socket.gaierror):
+        cache.getaddrinfo("example.com", 443)
+    assert len(resolver.calls) == 1
+    clock.return_value = 1031
+    resolver.fail = False
+    assert cache.getaddrinfo("example.com", 443) == ADDR
+    # Resolver down once the entry expires, the stale entry is used.
+    clock.return_value = 1400
+    resolver.fail = True
+    assert cache.getaddrinfo("example.com", 443) == ADDR
+
+
+class DNSException(Exception):
+    pass
+
+
+class Answer(list):
+    def __init__(self, ttl, records):
+        super().__init__(records)
+        self.rrset = SimpleNamespace(ttl=ttl)
+
+
+def fake_dns(records):
+    # Stands in for dnspython. records is {(name, rdtype): (ttl, [addresses])}.
+    queries = []
+
+    def resolve(name, rdtype, lifetime):
+        queries.append((name, rdtype))
+        if (name, rdtype) not in records:
+            raise DNSException("no answer")
+        ttl, addresses = records[(name, rdtype)]
+        return Answer(ttl, [SimpleNamespace(address=a) for a in addresses])
+
+    module = SimpleNamespace(
+        resolver=SimpleNamespace(resolve=resolve),
+        exception=SimpleNamespace(DNSException=DNSException),
+    )
+    return module, queries
+
+
+def test_dns_cache_uses_record_ttl(mocker):
+    clock = mocker.patch("app.connections.time.monotonic", return_value=1000)
+    dns, queries = fake_dns({("example.com", "A"): (60, ["192.0.2.1"])})
+    mocker.patch("app.connections.dns", dns)
+    resolver = Resolver()
+    cache = DNSCache(ttl=300, resolve=resolver)
+    assert cache.getaddrinfo("example.com", 443, socket.AF_INET) == ADDR
+    # One query, the address handed to getaddrinfo() as numeric.
+    assert queries == [("example.com", "A")]
+    assert resolver.calls == ["192.0.2.1"]
+    clock.return_value = 1059
+    cache.getaddrinfo("example.com", 443, socket.AF_INET)
+    assert len(queries) == 1
+    clock.return_value = 1061
+    cache.getaddrinfo("example.com", 443, socket.AF_INET)
+    assert len(queries) == 2
+
+
+def test_dns_cache_family_and_fallback(mocker):
+    mocker.patch("app.connections.time.monotonic", return_value=1000)
+    dns, queries = fake_dns({("example.com", "AAAA"): (60, ["2001:db8::1"])})
+    mocker.patch("app.connections.dns", dns)
+    resolver = Resolver()
+    cache = DNSCache(ttl=300, resolve=resolver)
+    cache.getaddrinfo("example.com", 443, socket.AF_INET6)
+    assert queries == [("example.com", "AAAA")]
+    # Unknown to DNS, e.g. in /etc/hosts, so getaddrinfo() resolves it.
+    assert cache.getaddrinfo("printer", 443) == ADDR
+    assert queries[1:] == [("printer", "A"), ("printer", "AAAA")]
+    assert resolver.calls == ["2001:db8::1", "printer"]
+
+
+def test_dns_cache_imports_dns_exception(tmp_path, mocker):
+    # dns.exception is imported in its own right, not left to dns.resolver importing it. The stand
+    # in package's resolver doesn't, so dns.exception is only there if app.connections imports it.
+    package = tmp_path / "dns"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "exception.py").write_text("class DNSException(Exception):\n    pass\n")
+    (package / "resolver.py").write_text(
+        "def resolve(name, rdtype, lifetime):\n"
+        "    import sys\n"
+        "    raise sys.modules['dns.exception'].DNSException('no answer')\n"
+    )
+    mocker.patch.dict(sys.modules)
+    for name in [m for m in sys.modules if m == "dns" or m.startswith("dns.")]:
+        del sys.modules[name]
+    mocker.patch.object(sys, "path", [str(tmp_path)] + sys.path)
+    # A separate copy of the module, loaded against the stand in.
+    spec = importlib.util.spec_from_file_location("connections_copy", app.connections.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert module.dns.__file__ == str(package / "__init__.py")
+    cache = module.DNSCache(resolve=Resolver())
+    # No answer from DNS, so getaddrinfo() resolves it.
+    assert cache.getaddrinfo("printer", 443, socket.AF_INET) == ADDR
+
+
+def test_dns_cache_with_dnspython(mocker):
+    pytest.importorskip("dns.resolver")
+    import dns.resolver
+
+    mocker.patch("app.connections.time.monotonic", return_value=1000)
+    resolve = mocker.patch("dns.resolver.resolve", side_effect=dns.resolver.NoAnswer())
+    resolver = Resolver()
+    cache = DNSCache(resolve=resolver)
+    # No answer from DNS, so getaddrinfo() resolves it.
+    assert cache.getaddrinfo("printer", 443, socket.AF_INET) == ADDR
+    assert resolve.call_count == 1
+    assert resolver.calls == ["printer"]
+
+
+def test_dns_cache_install():
+    original = socket.getaddrinfo
+    cache = install(DNSCache(resolve=Resolver()))
+    try:
+        assert socket.getaddrinfo == cache.getaddrinfo
+        assert socket.getaddrinfo("example.com", 443) == ADDR
+    finally:
+        uninstall()
+    assert socket.getaddrinfo == original
+
+
+# Warmer tests.
+def test_warmer_warms_at_start_and_before_schedule():
+    session = Session()
+    warmer = Warmer([(session, "https://example.com/x")], lead=10)
+    warmer.start()
+    try:
+        for _ in range(100):
+            if session.heads:
+                break
+            time.sleep(0.01)
+        assert session.heads == ["https://example.com/x"]
+        # Due now, less the lead.
+        warmer.schedule(time.time() + 10)
+        for _ in range(100):
+            if len(session.heads) == 2:
+                break
+            time.sleep(0.01)
+        assert len(session.heads) == 2
+        # Not yet due.
+        warmer.schedule(time.time() + 60)
+        time.sleep(0.1)
+        assert len(session.heads) == 2
+    finally:
+        warmer.stop()
+
+
+def test_warmer_refreshes_idle_connections():
+    session = Session()
+    warmer = Warmer([(session, "https://example.com/x")], refresh=0.05)
+    warmer.start()
+    try:
+        # Nothing scheduled, warmed at start and again each refresh.
+        time.sleep(0.3)
+        assert len(session.heads) >= 3
+    finally:
+        warmer.stop()
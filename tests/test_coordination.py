@@ -0,0 +1,72 @@
+import pytest
+from app.coordination import Coordinator, LeaseBackend, MemoryLeaseBackend, SQLiteLeaseBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backends(request, tmp_path):
+    # Two handles on the same lease, as two nodes would have.
+    if request.param == "memory":
+        backend = MemoryLeaseBackend()
+        return backend, backend
+    path = str(tmp_path / "lease.db")
+    return SQLiteLeaseBackend(path), SQLiteLeaseBackend(path)
+
+
+def test_only_one_node_active(backends):
+    a = Coordinator(backends[0], "a", ttl=450)
+    b = Coordinator(backends[1], "b", ttl=450)
+    assert a.is_leader({}, now=0) == True
+    assert b.is_leader({}, now=1) == False
+    # Renewal.
+    assert a.is_leader({}, now=300) == True
+    assert b.is_leader({}, now=301) == False
+    # Standby waits until the lease runs out, at most one check interval.
+    assert b.standby_sleep(300, now=301) == 300
+    assert b.standby_sleep(300, now=700) == 50
+
+
+def test_standby_takes_over_with_alert_state(backends):
+    a = Coordinator(backends[0], "a", ttl=450)
+    b = Coordinator(backends[1], "b", ttl=450)
+    a_state = {"current_status": 2, "last_alert_time": 100, "last_alert_status": 2}
+    assert a.is_leader(a_state, now=100) == True
+    assert a.save(a_state, now=100) == True
+    # a stops renewing, b takes over once the lease expires.
+    b_state = {"current_status": 0, "last_alert_time": 0, "last_alert_status": 0}
+    assert b.is_leader(b_state, now=549) == False
+    assert b.is_leader(b_state, now=550) == True
+    assert b_state == {"current_status": 0, "last_alert_time": 100, "last_alert_status": 2}
+    # a comes back, it is not allowed to overwrite b's state.
+    assert a.save(a_state, now=551) == False
+    assert a.is_leader(a_state, now=552) == False
+
+
+def test_subscriber_state_carried_over(backends):
+    a = Coordinator(backends[0], "a", ttl=450)
+    b = Coordinator(backends[1], "b", ttl=450)
+    subscribers = {"armed": [[False, 2]], "subscribers": [["alice", 100, 2]]}
+    state = {"last_alert_time": 100, "last_alert_status": 2, "subscribers": subscribers}
+    assert a.is_leader(state, now=100) == True
+    assert a.save(state, now=100) == True
+    # Left out when unchanged, the last saved stands.
+    assert a.save({"last_alert_time": 100, "last_alert_status": 2}, now=200) == True
+    b_state = {}
+    assert b.is_leader(b_state, now=650) == True
+    assert b_state["subscribers"] == subscribers
+
+
+def test_release(backends):
+    a = Coordinator(backends[0], "a", ttl=450)
+    b = Coordinator(backends[1], "b", ttl=450)
+    assert a.is_leader({}, now=0) == True
+    a.release()
+    assert b.is_leader({}, now=1) == True
+
+
+def test_incomplete_backend_fails_when_created():
+    class Partial(LeaseBackend):
+        def acquire(self, node_id, ttl, now):
+            return True, now + ttl
+
+    with pytest.raises(TypeError):
+        Partial()
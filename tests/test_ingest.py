@@ -0,0 +1,44 @@
+from app.history import iter_samples, open_store
+from app.ingest import ingest
+
+XML = """
+<current_status api_version="0.2.5">
+  <updated>
+    <datetime>2026-01-01T0{hour}:00:00+0000</datetime>
+  </updated>
+<site_status project_id="project:SAMNET" site_id="site:SAMNET:CRK2" site_url="http://aurorawatch-api.lancs.ac.uk/0.2.5/project/samnet/crk2.xml" status_id="red"/>
+<site_status alerting="true" project_id="project:AWN" site_id="site:AWN:SUM" site_url="http://aurorawatch-api.lancs.ac.uk/0.2.5/project/awn/sum.xml" status_id="{alerting}"/>
+</current_status>
+"""
+
+
+# ingest() tests.
+def test_ingest_skips_duplicates_and_already_ingested(tmp_path):
+    xml_dir = tmp_path / "xml"
+    xml_dir.mkdir()
+    (xml_dir / "0.xml").write_text(XML.format(hour=0, alerting="green"))
+    (xml_dir / "1.xml").write_text(XML.format(hour=1, alerting="yellow"))
+    # Same content as 1.xml.
+    (xml_dir / "1_copy.xml").write_text(XML.format(hour=1, alerting="yellow"))
+    (xml_dir / "junk.xml").write_text("moo")
+    store = str(tmp_path / "history.db")
+
+    stats = ingest(store, [str(xml_dir)], workers=2, batch_size=1)
+    assert stats["files"] == 4
+    assert stats["inserted"] == 2
+    assert stats["skipped"] == 2
+
+    (xml_dir / "2.xml").write_text(XML.format(hour=2, alerting="red"))
+    stats = ingest(store, [str(xml_dir)], workers=2)
+    assert stats["inserted"] == 1
+
+    conn = open_store(store)
+    assert list(iter_samples(conn)) == [
+        (1767225600.0, 0, 0),
+        (1767229200.0, 1, 1),
+        (1767232800.0, 3, 3),
+    ]
+    assert list(iter_samples(conn, start=1767229200.0, end=1767232800.0)) == [
+        (1767229200.0, 1, 1),
+    ]
+    assert conn.execute("SELECT COUNT(*) FROM sites").fetchone()[0] == 6
@@ -0,0 +1,63 @@
+from app.metrics import Metrics, Stopwatch
+
+
+# Metrics tests.
+def test_metrics_counters_and_gauges():
+    metrics = Metrics()
+    metrics.incr("requests_total", labels={"source": "status"})
+    metrics.incr("requests_total", 2, {"source": "status"})
+    metrics.set("last_bytes", 10)
+    metrics.set("last_bytes", 20)
+    assert metrics.get("requests_total", {"source": "status"}) == 3
+    assert metrics.snapshot() == {'requests_total{source="status"}': 3, "last_bytes": 20}
+
+
+def test_metrics_render():
+    metrics = Metrics()
+    metrics.describe("requests_total", "counter", "Requests made.")
+    metrics.incr("requests_total", labels={"source": "a"})
+    metrics.incr("requests_total", labels={"source": "b"})
+    assert metrics.render() == (
+        "# HELP requests_total Requests made.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{source="a"} 1\n'
+        'requests_total{source="b"} 1\n'
+    )
+
+
+# Stopwatch tests.
+def test_stopwatch_laps():
+    metrics = Metrics()
+    watch = Stopwatch(metrics)
+    watch.start()
+    watch.lap("fetch")
+    watch.lap("alert")
+    assert watch.last == {}
+    watch.stop()
+    watch.start()
+    assert list(watch.last) == ["fetch", "alert"]
+    assert watch.laps == {}
+    assert metrics.get("stage_seconds", {"stage": "fetch"}) >= 0
+    assert 'stage_seconds{stage="alert"}' in metrics.snapshot()
+
+
+# Histogram tests.
+def test_metrics_histogram():
+    metrics = Metrics()
+    metrics.describe("latency_seconds", "histogram", "Latency.")
+    for value in (1, 2, 3, 4, 100):
+        metrics.observe("latency_seconds", value, buckets=(5, 60))
+    assert metrics.percentiles("latency_seconds") == {0.5: 3, 0.9: 100, 0.99: 100}
+    assert metrics.percentiles("moo") == {}
+    assert metrics.render() == (
+        "# HELP latency_seconds Latency.\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="5"} 4\n'
+        'latency_seconds_bucket{le="60"} 4\n'
+        'latency_seconds_bucket{le="+Inf"} 5\n'
+        "latency_seconds_sum 110\n"
+        "latency_seconds_count 5\n"
+    )
+    snapshot = metrics.snapshot()
+    assert snapshot["latency_seconds_count"] == 5
+    assert snapshot['latency_seconds{quantile="0.5"}'] == 3
@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+import time
+import pytest
+from app.metrics import METRICS
+from app.notify import (
+    Dispatcher,
+    FileNotifier,
+    Notifier,
+    NullNotifier,
+    PushoverNotifier,
+    build_dispatcher,
+)
+
+TOKEN = "a" * 30
+USER = "b" * 30
+
+
+class SlowNotifier(Notifier):
+    def __init__(self, delay, timeout):
+        super().__init__(timeout)
+        self.delay = delay
+        self.done = threading.Event()
+
+    def send(self, alert, recipient):
+        time.sleep(self.delay)
+        self.done.set()
+
+
+# Dispatcher tests.
+def test_dispatcher_routes_recipients():
+    a, b = NullNotifier(), NullNotifier()
+    dispatcher = Dispatcher(
+        {"a": a, "b": b},
+        [{"name": "one", "backends": ["a", "b"]}, {"name": "two", "backends": ["a"]}],
+    )
+    results = dispatcher.send({"message": "moo"})
+    assert results == {("one", "a"): None, ("one", "b"): None, ("two", "a"): None}
+    assert a.sent == 2
+    assert b.sent == 1
+    dispatcher.close()
+
+
+def test_dispatcher_slow_backend_times_out_alone():
+    fast = NullNotifier()
+    slow = SlowNotifier(delay=1, timeout=0.1)
+    dispatcher = Dispatcher(
+        {"fast": fast, "slow": slow}, [{"name": "me", "backends": ["slow", "fast"]}]
+    )
+    started = time.monotonic()
+    results = dispatcher.send({"message": "moo"})
+    assert time.monotonic() - started < 0.5
+    assert results[("me", "fast")] == None
+    assert isinstance(results[("me", "slow")], TimeoutError)
+    assert fast.sent == 1
+    slow.done.wait(2)
+    dispatcher.close()
+
+
+def test_dispatcher_timeout_runs_from_start_of_delivery():
+    # More recipients than max_workers, all delivered, none waits out another's time.
+    slow = SlowNotifier(delay=0.2, timeout=0.5)
+    dispatcher = Dispatcher(
+        {"slow": slow},
+        [{"name": f"r{i}", "backends": ["slow"]} for i in range(6)],
+        max_workers=2,
+    )
+    results = dispatcher.send({"message": "moo"})
+    assert list(results.values()) == [None] * 6
+    dispatcher.close()
+
+
+def test_dispatcher_busy_backend_not_started():
+    hung = SlowNotifier(delay=1, timeout=0.1)
+    dispatcher = Dispatcher({"hung": hung}, [{"name": "me", "backends": ["hung"]}], max_workers=1)
+    assert isinstance(dispatcher.send({"message": "moo"})[("me", "hung")], TimeoutError)
+    # The only thread is still in the first delivery, the second never starts and is dropped.
+    error = dispatcher.send({"message": "moo"})[("me", "hung")]
+    assert "Not started" in str(error)
+    hung.done.wait(2)
+    time.sleep(0.1)
+    assert dispatcher.pending == 0
+    dispatcher.close()
+
+
+def test_dispatcher_records_latency():
+    METRICS.clear()
+    dispatcher = Dispatcher({"null": NullNotifier()}, [{"name": "me", "backends": ["null"]}])
+    dispatcher.send({"message": "moo"}, published=time.time() - 90)
+    dispatcher.close()
+    assert METRICS.snapshot()['alert_latency_seconds_count{backend="null"}'] == 1
+    assert 90 <= METRICS.percentiles("alert_latency_seconds", {"backend": "null"})[0.5] < 95
+
+
+def test_dispatcher_records_latency_of_late_deliveries():
+    METRICS.clear()
+    slow = SlowNotifier(delay=0.3, timeout=0.1)
+    dispatcher = Dispatcher({"slow": slow}, [{"name": "me", "backends": ["slow"]}])
+    results = dispatcher.send({"message": "moo"}, published=time.time() - 90)
+    assert isinstance(results[("me", "slow")], TimeoutError)
+    slow.done.wait(2)
+    dispatcher.close()
+    time.sleep(0.1)
+    # Timed out but delivered, so in the slow tail.
+    assert METRICS.snapshot()['alert_latency_seconds_count{backend="slow"}'] == 1
+
+
+def test_dispatcher_pause_resume():
+    null = NullNotifier()
+    dispatcher = Dispatcher({"null": null}, [{"name": "me", "backends": ["null"]}])
+    dispatcher.pause(60, now=1000)
+    assert dispatcher.resumes_at() == 1060
+    assert dispatcher.paused(now=1059) == True
+    assert dispatcher.paused(now=1060) == False
+    dispatcher.pause()
+    assert dispatcher.send({"message": "moo"}) == {}
+    assert null.sent == 0
+    dispatcher.resume()
+    assert dispatcher.paused() == False
+    dispatcher.send({"message": "moo"})
+    assert null.sent == 1
+    dispatcher.close()
+
+
+def test_dispatcher_unknown_backend():
+    with pytest.raises(ValueError):
+        Dispatcher({}, [{"name": "me", "backends": ["moo"]}])
+
+
+# FileNotifier tests.
+def test_file_notifier_appends_json_lines(tmp_path):
+    path = str(tmp_path / "alerts.jsonl")
+    notifier = FileNotifier(path)
+    notifier.send({"message": "one"}, {"name": "me"})
+    notifier.send({"message": "two"}, {"name": "me"})
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["message"] for line in lines] == ["one", "two"]
+    assert lines[0]["recipient"] == "me"
+
+
+def test_file_notifier_fifo_without_reader(tmp_path):
+    path = str(tmp_path / "alerts.fifo")
+    os.mkfifo(path)
+    with pytest.raises(OSError):
+        FileNotifier(path).send({"message": "moo"}, {"name": "me"})
+
+
+# build_dispatcher() tests.
+def test_build_dispatcher_from_file(tmp_path):
+    path = tmp_path / "notifiers.json"
+    path.write_text(
+        json.dumps(
+            {
+                "backends": {
+                    "pushover": {"type": "pushover"},
+                    "log": {"type": "file", "path": str(tmp_path / "log.jsonl")},
+                    "null": {"type": "null", "timeout": 1},
+                },
+                "recipients": [{"name": "me", "backends": ["pushover", "log", "null"]}],
+            }
+        )
+    )
+    dispatcher = build_dispatcher(TOKEN, USER, str(path))
+    assert sorted(dispatcher.backends) == ["log", "null", "pushover"]
+    assert dispatcher.backends["null"].timeout == 1
+    dispatcher.close()
+
+
+def test_build_dispatcher_bad_backend(tmp_path):
+    path = tmp_path / "notifiers.json"
+    path.write_text(
+        json.dumps(
+            {
+                "backends": {"x": {"type": "moo"}},
+                "recipients": [{"name": "me", "backends": ["x"]}],
+            }
+        )
+    )
+    with pytest.raises(ValueError):
+        build_dispatcher(TOKEN, USER, str(path))
+
+
+def test_build_dispatcher_default_pushover(mocker):
+    post = mocker.patch("app.pushover.SESSION.post")
+    dispatcher = build_dispatcher(TOKEN, USER)
+    dispatcher.send({"message": "moo", "ttl": 60, "priority": None})
+    assert post.call_args.kwargs["data"] == {
+        "token": TOKEN,
+        "user": USER,
+        "message": "moo",
+        "ttl": 60,
+    }
+    dispatcher.close()
+
+
+def test_pushover_emergency_receipt_tracked(mocker):
+    post = mocker.patch("app.pushover.SESSION.post")
+    post.return_value.json.return_value = {"status": 1, "receipt": "r1"}
+    tracker = mocker.Mock()
+    dispatcher = build_dispatcher(TOKEN, USER, tracker=tracker)
+    results = dispatcher.send(
+        {"message": "moo", "priority": 2, "retry": 60, "expire": 3600, "tags": "red"}
+    )
+    assert results[("default", "pushover")] == None
+    tracker.add.assert_called_once_with("r1", 3600, "red")
+    # Emergency priority without retry is rejected.
+    results = dispatcher.send({"message": "moo", "priority": 2, "expire": 3600})
+    assert isinstance(results[("default", "pushover")], ValueError)
+    dispatcher.close()
+
+
+def test_pushover_notifier_timeout(mocker):
+    post = mocker.patch("app.pushover.SESSION.post")
+    PushoverNotifier(TOKEN, USER, timeout=3).send({"message": "moo"}, {"name": "me"})
+    assert post.call_args.kwargs["timeout"] == 3
+
+
+def test_pushover_notifier_keeps_keys_out_of_output(mocker, capsys):
+    mocker.patch("app.pushover.SESSION.post")
+    PushoverNotifier(TOKEN, USER).send({"message": "moo"}, {"name": "me", "pushover_user": "c" * 30})
+    out = capsys.readouterr().out
+    assert TOKEN not in out
+    assert "c" * 30 not in out
+
+
+def test_incomplete_notifier_fails_when_created():
+    class Partial(Notifier):
+        pass
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,73 @@
+import json
+import time
+import urllib.error
+import urllib.request
+import pytest
+from app.metrics import METRICS
+from app.proxy import StatusCache, start_proxy
+
+XML = b"""<current_status api_version="0.2.5"><updated><datetime>2026-01-01T00:00:00+0000</datetime></updated><site_status alerting="true" project_id="project:AWN" site_id="site:AWN:SUM" site_url="http://aurorawatch-api.lancs.ac.uk/0.2.5/project/awn/sum.xml" status_id="amber"/></current_status>"""
+
+
+@pytest.fixture
+def proxy():
+    cache = StatusCache()
+    server = start_proxy(cache, 0)
+    yield cache, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url, headers=None):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {})) as r:
+            return r.status, r.headers, r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, b""
+
+
+def test_proxy_before_first_fetch(proxy):
+    cache, base = proxy
+    assert get(base + "/status.json")[0] == 503
+    assert get(base + "/moo")[0] == 404
+
+
+def test_proxy_serves_xml_and_json_with_validators(proxy):
+    cache, base = proxy
+    record = {"updated": 1767225600.0, "sites": [{"site_id": "site:AWN:SUM", "alerting": True}]}
+    cache.update(XML, record, 2, time.time() + 300)
+
+    status, headers, body = get(base + "/all-site-status.xml")
+    assert status == 200
+    assert body == XML
+    assert 295 <= int(headers["Cache-Control"].removeprefix("max-age=")) <= 300
+
+    status, headers, body = get(base + "/status.json")
+    summary = json.loads(body)
+    assert summary["status"] == 2
+    assert summary["status_text"] == "AMBER"
+    assert summary["updated"] == 1767225600.0
+
+    # Conditional request for the same representation.
+    status, _, body = get(base + "/status.json", {"If-None-Match": headers["ETag"]})
+    assert status == 304
+    assert body == b""
+
+    # Fetched again unchanged, the ETag still matches.
+    cache.update(XML, record, 2, time.time() + 300, fetched=time.time() + 60)
+    status, _, body = get(base + "/status.json", {"If-None-Match": headers["ETag"]})
+    assert status == 304
+
+    # New snapshot, old ETag no longer matches.
+    cache.update(XML, record, 3, time.time() + 300)
+    status, _, body = get(base + "/status.json", {"If-None-Match": headers["ETag"]})
+    assert status == 200
+    assert json.loads(body)["status_text"] == "RED"
+
+
+def test_proxy_serves_metrics(proxy):
+    cache, base = proxy
+    METRICS.incr("fetch_wire_bytes_total", 123, {"source": "status"})
+    status, headers, body = get(base + "/metrics")
+    assert status == 200
+    assert b'fetch_wire_bytes_total{source="status"}' in body
@@ -0,0 +1,77 @@
+from app.receipts import ReceiptTracker
+
+
+class MockResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+# ReceiptTracker tests.
+def test_receipt_polling_backs_off(mocker):
+    tracker = ReceiptTracker("a" * 30, min_interval=5, max_interval=20, max_rate=0)
+    get = mocker.patch.object(
+        tracker._session, "get", return_value=MockResponse({"acknowledged": 0, "expired": 0})
+    )
+    tracker.add("r1", expire=3600, now=0)
+    assert tracker.due(now=4) == []
+    assert tracker.poll(now=5) == []
+    assert tracker.receipts["r1"]["next_poll"] == 15
+    tracker.poll(now=15)
+    assert tracker.receipts["r1"]["next_poll"] == 35
+    # Capped at max_interval.
+    tracker.poll(now=35)
+    assert tracker.receipts["r1"]["next_poll"] == 55
+    assert get.call_count == 3
+
+
+def test_receipt_acknowledged_removed(mocker):
+    tracker = ReceiptTracker("a" * 30, max_rate=0)
+    mocker.patch.object(
+        tracker._session,
+        "get",
+        side_effect=[
+            MockResponse({"acknowledged": 1, "acknowledged_by_device": "phone"}),
+            MockResponse({"acknowledged": 0, "expired": 0}),
+        ],
+    )
+    tracker.add("r1", expire=3600, now=0)
+    tracker.add("r2", expire=3600, now=1)
+    finished = tracker.poll(now=10)
+    assert [r for r, _ in finished] == ["r1"]
+    assert tracker.outstanding() == 1
+
+
+def test_receipt_cancel_by_tag_one_request(mocker):
+    tracker = ReceiptTracker("a" * 30)
+    post = mocker.patch.object(tracker._session, "post", return_value=MockResponse({}))
+    tracker.add("r1", expire=3600, tag="red", now=0)
+    tracker.add("r2", expire=3600, tag="red", now=0)
+    tracker.add("r3", expire=3600, tag="other", now=0)
+    assert tracker.cancel("red") == True
+    assert post.call_count == 1
+    assert post.call_args.args[0].endswith("/cancel_by_tag/red.json")
+    assert tracker.outstanding("red") == 0
+    assert tracker.outstanding() == 1
+    # Nothing outstanding, nothing sent.
+    tracker.cancel("red")
+    assert post.call_count == 1
+
+
+def test_receipt_tracker_thread(mocker):
+    tracker = ReceiptTracker("a" * 30, min_interval=5)
+    tracker.min_interval = 0
+    mocker.patch.object(tracker._session, "get", return_value=MockResponse({"acknowledged": 1}))
+    tracker.start()
+    tracker.add("r1", expire=3600)
+    for _ in range(100):
+        if not tracker.outstanding():
+            break
+        tracker._stop.wait(0.01)
+    tracker.stop()
+    assert tracker.outstanding() == 0
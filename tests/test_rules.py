@@ -0,0 +1,92 @@
+import pytest
+from app.rules import Masks, RuleSet, SiteIndex, compile_rule, normalise
+
+
+def sites(*statuses, alerting=0):
+    # Sites site:AWN:S0, site:AWN:S1... with the given statuses, site number 'alerting' is the alerting site.
+    return [
+        {"site_id": f"site:AWN:S{i}", "status_id": s, "alerting": i == alerting}
+        for i, s in enumerate(statuses)
+    ]
+
+
+def check(text, site_list, now=0, index=None):
+    index = index or SiteIndex()
+    return compile_rule(text, index)(Masks(index, site_list), now)
+
+
+# Predicate tests.
+def test_rule_at_least():
+    assert check("at least 2 sites amber", sites("amber", "red", "green")) == True
+    assert check("at least 2 sites amber", sites("amber", "yellow", "green")) == False
+
+
+def test_rule_any_all_alerting():
+    assert check("any site red", sites("green", "red")) == True
+    assert check("all sites yellow", sites("yellow", "red")) == True
+    assert check("all sites yellow", sites("yellow", "green")) == False
+    assert check("alerting site amber", sites("amber", "green", alerting=0)) == True
+    assert check("alerting amber", sites("amber", "green", alerting=1)) == False
+
+
+def test_rule_site_by_short_name_and_ignore():
+    assert check("site S1 red", sites("green", "red")) == True
+    assert check("site site:AWN:S0 red", sites("green", "red")) == False
+    # S1 is ignored, the rest are all amber.
+    assert check("all sites amber; ignore site S1", sites("amber", "green", "red")) == True
+    assert check("any site red; ignore sites S1, S2", sites("amber", "green", "red")) == False
+
+
+def test_rule_and_or_not_parentheses():
+    s = sites("amber", "green")
+    assert check("any site amber and not any site red", s) == True
+    assert check("any site red or alerting site amber", s) == True
+    assert check("(any site red or any site amber) and all sites yellow", s) == False
+
+
+def test_rule_unknown_status_not_counted():
+    assert check("all sites green", sites("green", "purple")) == False
+    assert check("at least 1 site green", sites("purple")) == False
+
+
+# Duration tests.
+def test_rule_for_duration():
+    index = SiteIndex()
+    rule = compile_rule("alerting site red or any site red for 10 minutes", index)
+    red = Masks(index, sites("green", "red"))
+    green = Masks(index, sites("green", "green"))
+    assert rule(red, 0) == False
+    assert rule(red, 599) == False
+    assert rule(red, 600) == True
+    # Condition broken, the clock starts again.
+    assert rule(green, 700) == False
+    assert rule(red, 800) == False
+    assert rule(red, 1400) == True
+    assert rule(Masks(index, sites("red", "green")), 1401) == True
+
+
+# Syntax tests.
+@pytest.mark.parametrize(
+    "text",
+    ["", "any site purple", "at least many sites red", "any site red for ever", "(any site red", "any site red moo"],
+)
+def test_rule_invalid(text):
+    with pytest.raises(ValueError):
+        compile_rule(text, SiteIndex())
+
+
+def test_normalise():
+    assert normalise("Any  SITE red;ignore site SUM") == "any site red ; ignore site sum"
+
+
+# RuleSet tests.
+def test_rule_set_shares_identical_rules():
+    rules = RuleSet()
+    for i in range(1000):
+        rules.add(i, ["any site amber", "ANY site  amber", "at least 2 sites red"][i % 3])
+    assert len(rules) == 1000
+    assert len(rules._rules) == 2
+    result = rules.evaluate(sites("amber", "red"), 0)
+    assert result[0] == True
+    assert result[1] == True
+    assert result[2] == False
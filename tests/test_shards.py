@@ -0,0 +1,98 @@
+from app.shards import ShardPool
+
+USER = "b" * 30
+
+
+def subscribers(n):
+    return [
+        {
+            "id": f"s{i}",
+            "user": USER,
+            "threshold": i % 3 + 1,
+            "alert_interval": 3600,
+            "ttl": 14400,
+            "reduced_sensitivity": i % 2 == 1,
+        }
+        for i in range(n)
+    ]
+
+
+# ShardPool tests.
+def test_shard_pool_evaluates_every_subscriber():
+    pool = ShardPool(subscribers(600), workers=2, backend="null")
+    try:
+        assert pool.workers == 2
+        # Amber normal, yellow reduced.
+        totals = pool.cycle(2, 1, now=1000)
+        assert totals["evaluated"] == 600
+        # Normal: thresholds 1 and 2 of the even ids. Reduced: threshold 1 of the odd ids.
+        assert totals["alerts"] == 200 + 100
+        # Repeat within the alert interval.
+        assert pool.cycle(2, 1, now=1060)["alerts"] == 0
+        # Escalation to red alerts everyone.
+        assert pool.cycle(3, 3, now=1120)["alerts"] == 600
+        # No status, no alerts.
+        assert pool.cycle(None, None, now=1180)["alerts"] == 0
+    finally:
+        pool.close()
+
+
+def test_shard_pool_paused_sends_nothing():
+    pool = ShardPool(subscribers(30), workers=1, backend="null")
+    try:
+        totals = pool.cycle(3, 3, now=1000, paused=True)
+        assert totals["alerts"] == 30
+        assert totals["queued"] + totals["sent"] == 0
+    finally:
+        pool.close()
+
+
+def test_shard_pool_restarts_dead_worker():
+    pool = ShardPool(subscribers(60), workers=2, backend="null")
+    try:
+        pool._procs[0].kill()
+        pool._procs[0].join(5)
+        totals = pool.cycle(3, 3, now=1000)
+        # The live shard still evaluates, the dead one is replaced.
+        assert totals["evaluated"] == 30
+        assert totals["restarts"] == 1
+        assert pool.cycle(3, 3, now=1060)["evaluated"] == 60
+    finally:
+        pool.close()
+
+
+def test_shard_pool_restart_keeps_alert_state():
+    pool = ShardPool(subscribers(60), workers=2, backend="null")
+    try:
+        assert pool.cycle(3, 3, now=1000)["alerts"] == 60
+        pool._procs[0].kill()
+        pool._procs[0].join(5)
+        assert pool.cycle(3, 3, now=1060)["restarts"] == 1
+        # The replacement carries on from the alert state its predecessor reported.
+        assert pool.cycle(3, 3, now=1120)["alerts"] == 0
+        assert pool.cycle(3, 3, now=4600)["alerts"] == 60
+    finally:
+        pool.close()
+
+
+def test_shard_pool_export_load():
+    pool = ShardPool(subscribers(60), workers=2, backend="null")
+    try:
+        assert pool.cycle(2, 2, now=1000)["alerts"] == 40
+        assert pool.changed == True
+        saved = pool.export()
+        assert len(saved["subscribers"]) == 40
+    finally:
+        pool.close()
+    # As a node taking over the lease would, with state persisted by the old one.
+    pool = ShardPool(subscribers(60), workers=3, backend="null")
+    try:
+        pool.load(saved)
+        assert pool.cycle(2, 2, now=1060)["alerts"] == 0
+        # Escalation still alerts everyone.
+        assert pool.cycle(3, 3, now=1120)["alerts"] == 60
+        # Falling to green resets, and nothing is left to export.
+        pool.cycle(0, 0, now=1180)
+        assert pool.export() == {"armed": [], "subscribers": []}
+    finally:
+        pool.close()
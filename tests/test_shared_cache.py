@@ -0,0 +1,57 @@
+from multiprocessing import Pool
+import os
+from app.aurorawatchuk import snapshot_status_ids
+from app.shared_cache import SharedFetchCache
+
+XML = b"""<current_status api_version="0.2.5"><updated><datetime>2026-01-01T00:00:00+0000</datetime></updated><site_status project_id="project:SAMNET" site_id="site:SAMNET:CRK2" site_url="http://aurorawatch-api.lancs.ac.uk/0.2.5/project/samnet/crk2.xml" status_id="red"/><site_status alerting="true" project_id="project:AWN" site_id="site:AWN:SUM" site_url="http://aurorawatch-api.lancs.ac.uk/0.2.5/project/awn/sum.xml" status_id="amber"/></current_status>"""
+
+
+def test_shared_cache_fetches_once_until_stale(tmp_path):
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return XML
+
+    cache = SharedFetchCache(str(tmp_path / "status.cache"), max_age=300)
+    content, record = cache.get(fetch, now=0)
+    assert content == XML
+    assert record["status_normal"] == 2
+    # Another instance reading the same file.
+    other = SharedFetchCache(str(tmp_path / "status.cache"), max_age=300)
+    content, record = other.get(fetch)
+    assert content == XML
+    assert snapshot_status_ids(record, False) == [
+        {
+            "site_id": "site:AWN:SUM",
+            "site_url": "http://aurorawatch-api.lancs.ac.uk/0.2.5/project/awn/sum.xml",
+            "status_id": "amber",
+        }
+    ]
+    assert len(snapshot_status_ids(record, True)) == 2
+    assert len(fetches) == 1
+    # Stale.
+    other.get(fetch, now=10**10)
+    assert len(fetches) == 2
+
+
+def test_shared_cache_failed_fetch(tmp_path):
+    cache = SharedFetchCache(str(tmp_path / "status.cache"), max_age=300)
+    assert cache.get(lambda: None) == (None, None)
+
+
+def _instance(path):
+    # Each fetch leaves a marker file so the test can count them across processes.
+    def fetch():
+        open(f"{path}.fetch.{os.getpid()}", "w").close()
+        return XML
+
+    return SharedFetchCache(path, max_age=300).get(fetch)[0]
+
+
+def test_shared_cache_many_processes_one_fetch(tmp_path):
+    path = str(tmp_path / "status.cache")
+    with Pool(4) as pool:
+        results = pool.map(_instance, [path] * 8)
+    assert results == [XML] * 8
+    assert len(list(tmp_path.glob("status.cache.fetch.*"))) == 1
@@ -0,0 +1,137 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+import pytest
+from app.sources import Aggregator, Source, combine, kp_rank, kp_source
+
+KP_ROWS = [
+    ["time_tag", "Kp", "a_running", "station_count"],
+    ["2026-01-01 00:00:00.000", "3.33", "18", "8"],
+    ["2026-01-01 03:00:00.000", "6.33", "80", "8"],
+]
+
+
+# Headers of each request to kp_server.
+KP_REQUESTS = []
+
+
+@pytest.fixture
+def kp_server():
+    # Local stand-in for the NOAA feed.
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            KP_REQUESTS.append(dict(self.headers))
+            body = json.dumps(KP_ROWS).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/kp.json"
+    server.shutdown()
+    server.server_close()
+
+
+# kp_rank() tests.
+def test_kp_rank_formats():
+    assert kp_rank(json.dumps(KP_ROWS)) == 2
+    assert kp_rank(json.dumps([{"time_tag": "2026-01-01T03:00:00", "Kp": 7.0}])) == 3
+    assert kp_rank(json.dumps([["time_tag", "Kp"], ["2026-01-01", "2.00"]])) == 0
+    assert kp_rank("[]") == None
+
+
+# combine() tests.
+def test_combine_policies():
+    assert combine([1, 3, 2], "max") == 3
+    assert combine([1, 3, 2], "min") == 1
+    assert combine([1, 3, 2, 0], "median") == 1
+    assert combine([1, 3], "primary") == 1
+    assert combine([None, 3, 2], "primary") == 3
+    assert combine([None, None], "max") == None
+
+
+# Source and Aggregator tests.
+def test_kp_source_polls_local_feed(kp_server):
+    source = kp_source(kp_server)
+    assert source.poll(now=100) == 2
+    assert source.reading == (2, 100)
+    # AWUK's referer is for AWUK only.
+    assert "referer" not in {k.lower() for k in KP_REQUESTS[-1]}
+
+
+def test_source_failures_open_breaker():
+    calls = []
+    source = Source("moo", lambda: calls.append(1), lambda raw: 0, interval=60)
+    for t in range(5):
+        source.poll(now=t)
+    # Opened after three failures, backing off rather than fetching every time.
+    assert len(calls) == 3
+
+
+def test_aggregator_stale_readings_ignored():
+    agg = Aggregator([Source("awuk", max_age=600), Source("kp", max_age=600)], "max")
+    agg.record("awuk", 1, now=1000)
+    agg.record("kp", 3, now=100)
+    assert agg.status(now=1000) == 1
+    assert agg.readings(now=1000) == {"awuk": (1, 0), "kp": (3, 900)}
+
+
+def test_aggregator_status_override():
+    agg = Aggregator([Source("awuk", max_age=600), Source("kp", max_age=600)], "max")
+    agg.record("awuk", 1, now=1000)
+    agg.record("kp", 2, now=1000)
+    assert agg.status(now=1000) == 2
+    assert agg.status(now=1000, override={"awuk": 3}) == 3
+    # A stale source stays stale whatever its override.
+    assert agg.status(now=1700, override={"awuk": 3}) == None
+
+
+def test_aggregator_fresh():
+    agg = Aggregator(
+        [Source("awuk", max_age=600, label="AuroraWatch UK"), Source("kp", max_age=600)], "max"
+    )
+    agg.record("awuk", 1, now=100)
+    agg.record("kp", 3, now=1000)
+    assert agg.fresh(now=1000) == {"kp": 3}
+    agg.record("awuk", 0, now=1000)
+    assert agg.fresh(now=1000) == {"AuroraWatch UK": 0, "kp": 3}
+    assert kp_source().label == "NOAA Kp index"
+
+
+def test_aggregator_slow_source_does_not_delay_others():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return "slow"
+
+    agg = Aggregator(
+        [
+            Source("slow", slow, lambda raw: 3, interval=60),
+            Source("fast", lambda: "fast", lambda raw: 2, interval=60),
+        ],
+        "max",
+    )
+    agg.start()
+    try:
+        for _ in range(100):
+            if agg.status() is not None:
+                break
+            time.sleep(0.01)
+        assert agg.status() == 2
+    finally:
+        release.set()
+        agg.stop(timeout=5)
+    assert agg.status() == 3
+
+
+def test_aggregator_unknown_policy():
+    with pytest.raises(ValueError):
+        Aggregator([Source("awuk")], "moo")
@@ -0,0 +1,108 @@
+import socket
+import time
+import pytest
+from app.stream import ChangeStream, change_events
+
+
+# change_events() tests.
+def test_change_events():
+    events = change_events(
+        1,
+        2,
+        {"site:AWN:SUM": "yellow", "site:SAMNET:CRK2": "amber"},
+        {"site:AWN:SUM": "amber", "site:SAMNET:CRK2": "amber", "site:COW:MOO": "green"},
+    )
+    assert events == [
+        ("status", {"from": 1, "to": 2, "status_text": "AMBER"}),
+        ("site", {"site_id": "site:AWN:SUM", "from": "yellow", "to": "amber"}),
+        ("site", {"site_id": "site:COW:MOO", "from": None, "to": "green"}),
+    ]
+
+
+def test_change_events_no_change():
+    assert change_events(0, 0, {"a": "green"}, {"a": "green"}) == []
+
+
+# ChangeStream tests.
+@pytest.fixture
+def stream():
+    s = ChangeStream(client_buffer=2)
+    port = s.start(0)
+    yield s, port
+    s.stop()
+
+
+def subscribe(port, headers=""):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    sock.sendall(f"GET /events HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n".encode())
+    return sock
+
+
+def read_until(sock, marker):
+    data = b""
+    while marker not in data:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def wait_for_clients(s, n):
+    for _ in range(100):
+        if len(s.clients) == n:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"expected {n} clients, have {len(s.clients)}")
+
+
+def test_stream_publish_and_resume(stream):
+    s, port = stream
+    sock = subscribe(port)
+    wait_for_clients(s, 1)
+    s.publish("status", {"from": 0, "to": 1})
+    data = read_until(sock, b"\n\n")
+    assert b"200 OK" in data
+    assert b'id: 1\nevent: status\ndata: {"from": 0, "to": 1}\n\n' in data
+    sock.close()
+
+    s.publish("status", {"from": 1, "to": 2})
+    s.publish("status", {"from": 2, "to": 3})
+    # Resume after event 1, both missed events are replayed.
+    sock = subscribe(port, "Last-Event-ID: 1\r\n")
+    data = read_until(sock, b"id: 3")
+    assert b"id: 1\n" not in data
+    assert b"id: 2\n" in data
+    sock.close()
+
+
+def test_stream_drops_slow_subscriber(stream):
+    s, port = stream
+    sock = subscribe(port)
+    wait_for_clients(s, 1)
+
+    # Publish more events than the subscriber buffer holds in one loop iteration.
+    def burst():
+        for i in range(5):
+            s._publish("status", {"n": i})
+
+    s._loop.call_soon_threadsafe(burst)
+    wait_for_clients(s, 0)
+    assert s.dropped == 1
+    sock.close()
+
+
+def test_stream_unknown_path(stream):
+    s, port = stream
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    sock.sendall(b"GET /moo HTTP/1.1\r\n\r\n")
+    assert b"404" in read_until(sock, b"\r\n\r\n")
+    sock.close()
+
+
+def test_stream_port_in_use():
+    with socket.socket() as busy:
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        with pytest.raises(OSError):
+            ChangeStream().start(busy.getsockname()[1])
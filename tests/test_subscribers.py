@@ -0,0 +1,157 @@
+import json
+import random
+import pytest
+from app.aurorawatchuk_alerts import should_alert
+from app.subscribers import SubscriberIndex, load_subscribers
+
+USER = "b" * 30
+
+
+# load_subscribers() tests.
+def test_load_subscribers_defaults(tmp_path):
+    path = tmp_path / "subscribers.jsonl"
+    path.write_text(
+        json.dumps({"id": "a", "user": USER, "threshold": 2})
+        + "\n\n"
+        + json.dumps({"id": "b", "user": USER, "threshold": 3, "reduced_sensitivity": True})
+        + "\n"
+    )
+    subs = load_subscribers(str(path))
+    assert [s["id"] for s in subs] == ["a", "b"]
+    assert subs[0]["alert_interval"] == 3600
+    assert subs[0]["reduced_sensitivity"] == False
+    assert subs[1]["reduced_sensitivity"] == True
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "moo",
+        json.dumps({"id": "a", "user": "moo", "threshold": 2}),
+        json.dumps({"id": "a", "user": USER, "threshold": 4}),
+        json.dumps({"id": "a", "user": USER, "threshold": 2, "alert_interval": 0}),
+        json.dumps({"user": USER, "threshold": 2}),
+    ],
+)
+def test_load_subscribers_invalid(tmp_path, line):
+    path = tmp_path / "subscribers.jsonl"
+    path.write_text(line + "\n")
+    with pytest.raises(ValueError):
+        load_subscribers(str(path))
+
+
+def test_load_subscribers_duplicate_id(tmp_path):
+    path = tmp_path / "subscribers.jsonl"
+    line = json.dumps({"id": "a", "user": USER, "threshold": 2})
+    path.write_text(line + "\n" + line + "\n")
+    with pytest.raises(ValueError):
+        load_subscribers(str(path))
+
+
+def test_load_subscribers_template(tmp_path):
+    path = tmp_path / "subscribers.jsonl"
+    path.write_text(json.dumps({"id": "a", "user": USER, "threshold": 2, "template": "cy"}) + "\n")
+    assert load_subscribers(str(path))[0]["template"] == "cy"
+    assert load_subscribers(str(path), {"default": [], "cy": []})[0]["template"] == "cy"
+    with pytest.raises(ValueError):
+        load_subscribers(str(path), {"default": []})
+
+
+# SubscriberIndex tests.
+def test_subscriber_index_first_alert_and_reset():
+    subs = [
+        {"threshold": 1, "alert_interval": 3600},
+        {"threshold": 2, "alert_interval": 3600},
+        {"threshold": 3, "alert_interval": 3600},
+    ]
+    index = SubscriberIndex(subs)
+    assert sorted(index.cycle(2, 1000)) == [0, 1]
+    assert index.state(1) == (1000, 2)
+    assert index.state(2) == (0, 0)
+    # Unchanged within the interval.
+    assert index.cycle(2, 1060) == []
+    # Status falls below threshold 2, which resets it but not threshold 1.
+    assert index.cycle(1, 1120) == []
+    assert index.state(0) == (1000, 2)
+    assert index.state(1) == (0, 0)
+    assert index.cycle(2, 1180) == [1]
+
+
+def test_subscriber_index_escalation_and_interval():
+    subs = [
+        {"threshold": 1, "alert_interval": 300},
+        {"threshold": 1, "alert_interval": 3600},
+    ]
+    index = SubscriberIndex(subs)
+    assert sorted(index.cycle(1, 1000)) == [0, 1]
+    assert index.cycle(1, 1299) == []
+    assert index.cycle(1, 1300) == [0]
+    assert sorted(index.cycle(3, 1360)) == [0, 1]
+    assert index.state(1) == (1360, 3)
+    # Back down a level isn't an escalation.
+    assert index.cycle(2, 1420) == []
+
+
+def test_subscriber_index_none_status():
+    index = SubscriberIndex([{"threshold": 1, "alert_interval": 60}])
+    assert index.cycle(1, 1000) == [0]
+    assert index.cycle(None, 2000) == []
+    assert index.state(0) == (1000, 1)
+
+
+def test_subscriber_index_matches_should_alert():
+    rng = random.Random(7)
+    for trial in range(20):
+        subs = [
+            {"threshold": rng.choice((1, 2, 3)), "alert_interval": rng.choice((60, 300, 3600))}
+            for _ in range(30)
+        ]
+        index = SubscriberIndex(subs)
+        states = [{"current_status": None, "last_alert_time": 0, "last_alert_status": 0} for _ in subs]
+        now = 1000
+        for step in range(60):
+            now += rng.choice((30, 60, 300))
+            status = rng.choice((None, 0, 1, 2, 3, 3, 2))
+            expected = []
+            for i, (sub, state) in enumerate(zip(subs, states)):
+                state["current_status"] = status
+                if should_alert(sub, state, now):
+                    expected.append(i)
+            assert sorted(index.cycle(status, now)) == expected
+            assert [index.state(i) for i in range(len(subs))] == [
+                (state["last_alert_time"], state["last_alert_status"]) for state in states
+            ]
+
+
+def test_subscriber_index_restore_carries_on():
+    rng = random.Random(11)
+    subs = [
+        {
+            "id": n,
+            "threshold": rng.choice((1, 2, 3)),
+            "alert_interval": rng.choice((60, 300, 3600)),
+        }
+        for n in range(30)
+    ]
+    index = SubscriberIndex(subs)
+    now = 1000
+    for step in range(60):
+        now += rng.choice((30, 60, 300))
+        status = rng.choice((None, 0, 1, 2, 3, 3, 2))
+        if step % 10 == 5:
+            # As a restarted worker would, from what the old one reported.
+            saved = {sub["id"]: index.state(i) for i, sub in enumerate(subs)}
+            restored = SubscriberIndex(subs)
+            restored.restore(index.armed(), saved)
+            assert sorted(restored.cycle(status, now)) == sorted(index.cycle(status, now))
+            index = restored
+        else:
+            index.cycle(status, now)
+
+
+def test_subscriber_index_restore_new_subscriber_due():
+    subs = [{"id": "a", "threshold": 2, "alert_interval": 3600}]
+    index = SubscriberIndex(subs + [{"id": "b", "threshold": 2, "alert_interval": 3600}])
+    index.restore({2}, {"a": (1000, 2)})
+    assert index.cycle(2, 1060) == [1]
+    assert index.state(1) == (1060, 2)
@@ -0,0 +1,63 @@
+import random
+import pytest
+from app.aurorawatchuk import get_status_ids, parse_snapshot
+from app.synthetic import document, place, snapshot, storm
+
+
+# document() tests.
+def test_document_parses():
+    content = document([0, 2, 3], alerting=1, updated=1767225600)
+    record = parse_snapshot(content)
+    assert record["updated"] == 1767225600
+    assert [s["status_id"] for s in record["sites"]] == ["green", "amber", "red"]
+    assert [s["alerting"] for s in record["sites"]] == [False, True, False]
+    assert record["status_normal"] == 2
+    assert record["status_reduced"] == 0
+    assert get_status_ids(False, content)[0]["site_id"] == "site:SYN:S00001"
+
+
+def test_document_no_alerting_site():
+    assert get_status_ids(False, document([1, 1])) == None
+
+
+# place() tests.
+@pytest.mark.parametrize(
+    "placement, expected",
+    [("first", 0), ("last", 3), ("max", 2), ("none", None)],
+)
+def test_place(placement, expected):
+    assert place([0, 1, 3, 2], placement, random.Random(1)) == expected
+
+
+def test_place_invalid():
+    with pytest.raises(ValueError):
+        place([0], "moo", random.Random(1))
+
+
+# snapshot() tests.
+def test_snapshot_weights():
+    record = parse_snapshot(snapshot(200, weights=(0, 0, 1, 0), seed=1))
+    assert len(record["sites"]) == 200
+    assert {s["status_id"] for s in record["sites"]} == {"amber"}
+    with pytest.raises(ValueError):
+        snapshot(10, weights=(1, 0))
+
+
+# storm() tests.
+def test_storm_rises_and_falls():
+    documents = list(storm(30, cycles=21, peak=3, interval=60, start=1000, placement="max", seed=1))
+    assert [t for t, _ in documents] == [1000 + 60 * n for n in range(21)]
+    statuses = [parse_snapshot(content)["status_normal"] for _, content in documents]
+    assert statuses[10] == 3
+    assert max(statuses[:3]) <= 1
+    assert max(statuses[-3:]) <= 1
+
+
+def test_storm_repeatable():
+    assert list(storm(10, cycles=5, seed=3)) == list(storm(10, cycles=5, seed=3))
+
+
+@pytest.mark.parametrize("kwargs", [{"sites": 0}, {"sites": 5, "cycles": 0}, {"sites": 5, "peak": 4}])
+def test_storm_invalid(kwargs):
+    with pytest.raises(ValueError):
+        list(storm(**kwargs))
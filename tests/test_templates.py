@@ -0,0 +1,87 @@
+import json
+import pytest
+from app.templates import (
+    COMBINED_DEFAULT,
+    LIMITS,
+    compile_template,
+    compile_templates,
+    load_templates,
+)
+
+
+# compile_template() tests.
+def test_compile_template_renders_every_status():
+    rendered = compile_template(
+        "t",
+        {
+            "message": "Status {status}, level {level}.",
+            "title": "AuroraWatch UK",
+            "sound": ["none", "pushover", "pushover", "siren"],
+        },
+    )
+    assert rendered[0] == {"message": "Status GREEN, level 0.", "title": "AuroraWatch UK", "sound": "none"}
+    assert rendered[3]["message"] == "Status RED, level 3."
+    assert rendered[3]["sound"] == "siren"
+
+
+def test_compile_template_status_text():
+    rendered = compile_template(
+        "cy",
+        {"status_text": ["GWYRDD", "MELYN", "OREN", "COCH"], "message": "Statws: {status}."},
+    )
+    assert [r["message"] for r in rendered] == [
+        "Statws: GWYRDD.",
+        "Statws: MELYN.",
+        "Statws: OREN.",
+        "Statws: COCH.",
+    ]
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        "moo",
+        {},
+        {"message": "Status {name}."},
+        {"message": "Status {status"},
+        {"message": "Status {0}."},
+        {"message": "x" * (LIMITS["message"] + 1)},
+        {"message": "{status}" + "x" * (LIMITS["message"] - 4)},
+        {"message": "m", "title": "x" * (LIMITS["title"] + 1)},
+        {"message": "m", "url": "http://example.org"},
+        {"message": "m", "url_title": "Link"},
+        {"message": "m", "url": "https://example.org", "url_title": "x" * (LIMITS["url_title"] + 1)},
+        {"message": "m", "sound": "moo"},
+        {"message": "m", "sound": ["none", "siren"]},
+        {"message": "m", "status_text": ["A", "B", "C"]},
+        {"message": "m", "language": "cy"},
+    ],
+)
+def test_compile_template_invalid(template):
+    with pytest.raises(ValueError):
+        compile_template("t", template)
+
+
+# compile_templates() and load_templates() tests.
+def test_compile_templates_default():
+    templates = compile_templates({})
+    assert templates["default"][2] == {"message": "AuroraWatch UK Status: AMBER."}
+    templates = compile_templates({"default": {"message": "{status}"}})
+    assert templates["default"][1] == {"message": "YELLOW"}
+    # Another built in default, a file's own still wins.
+    templates = compile_templates({}, COMBINED_DEFAULT)
+    assert templates["default"][3] == {"message": "Aurora alert status: RED."}
+    templates = compile_templates({"default": {"message": "{status}"}}, COMBINED_DEFAULT)
+    assert templates["default"][1] == {"message": "YELLOW"}
+
+
+def test_load_templates(tmp_path):
+    path = tmp_path / "templates.json"
+    path.write_text(json.dumps({"short": {"message": "{status}"}}))
+    templates = load_templates(str(path))
+    assert sorted(templates) == ["default", "short"]
+    path.write_text("moo")
+    with pytest.raises(ValueError):
+        load_templates(str(path))
+    with pytest.raises(ValueError):
+        load_templates(str(tmp_path / "missing.json"))
@@ -0,0 +1,67 @@
+import pytest
+from app.backtest import backtest_warnings
+from app.trend import ewma, fit_trend, should_warn, status_eta, time_to_cross
+
+
+# ewma() and fit_trend() tests.
+def test_ewma():
+    assert ewma([0, 2, 2], alpha=0.5) == [0, 1.0, 1.5]
+
+
+def test_fit_trend_straight_line():
+    slope, current = fit_trend([0, 60, 120], [1, 2, 3], alpha=1)
+    assert slope == pytest.approx(1 / 60)
+    assert current == pytest.approx(3)
+
+
+def test_fit_trend_too_few_samples():
+    assert fit_trend([0], [1]) == None
+
+
+# time_to_cross() tests.
+def test_time_to_cross_rising():
+    assert time_to_cross([0, 60, 120], [10, 20, 30], 60, alpha=1) == pytest.approx(180)
+
+
+def test_time_to_cross_flat_falling_or_above():
+    assert time_to_cross([0, 60, 120], [10, 10, 10], 60, alpha=1) == None
+    assert time_to_cross([0, 60, 120], [30, 20, 10], 60, alpha=1) == None
+    assert time_to_cross([0, 60, 120], [50, 60, 70], 60, alpha=1) == None
+
+
+def test_status_eta_uses_window():
+    samples = [(0, 2), (1000, 0), (2000, 1)]
+    # The old amber sample is outside the window, so the trend is rising.
+    assert status_eta(samples, 2, window=1500) is not None
+    assert status_eta(samples, 2, window=3000) == None
+
+
+# should_warn() tests.
+def test_should_warn():
+    config = {"threshold": 2, "alert_interval": 3600, "warning_horizon": 900}
+    state = {"current_status": 1}
+    # Too far away.
+    assert should_warn(config, state, 1200, 1) == False
+    assert should_warn(config, state, 600, 2) == True
+    # Again, but too soon.
+    assert should_warn(config, state, 300, 3) == False
+    # Threshold reached, should_alert() takes over.
+    state["current_status"] = 2
+    assert should_warn(config, state, 0, 4) == False
+    # Back below and rising again.
+    state["current_status"] = 1
+    assert should_warn(config, state, 300, 5) == True
+
+
+# backtest_warnings() tests.
+def test_backtest_warnings_hits_and_false_alarms():
+    ranks = [0, 0, 1, 2, 2, 0, 0, 0, 1, 1, 0, 0, 0]
+    samples = [(t * 300, r, r) for t, r in enumerate(ranks)]
+    result = backtest_warnings(samples, 2, warning_horizon=2400, alert_interval=600)
+    assert result["crossings"] == 1
+    assert result["missed"] == 0
+    # One warning ahead of the amber crossing, one for the yellow rise that came to nothing.
+    assert result["warnings"] == 2
+    assert result["hits"] == 1
+    assert result["false_alarms"] == 1
+    assert result["mean_lead"] == 300